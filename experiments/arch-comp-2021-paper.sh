@@ -6,6 +6,9 @@ cd ..
 export PYTHONPATH=`pwd`
 cd problems/arch-comp-2021
 
+# The specifications can also be run on a shared pool of workers, for example,
+# python3 run_many.py AT:AT1 AT:AT6A F16:F16 AFC:AFC27:normal --n 50 --init-seed 25321 --identifier ARCH_OGAN
+
 python3 run.py AT AT1 '' 50 25321 ARCH_OGAN
 ##python3 run.py AT AT2 '' 50 25321 ARCH_OGAN
 ##python3 run.py AT AT51 '' 50 25321 ARCH_OGAN
@@ -9,6 +9,7 @@ from IPython.display import HTML
 sys.path.append(os.path.join(".."))
 from stgem.generator import STGEM, STGEMResult
 from stgem.budget import Budget
+from stgem.catalog import ReplicaSummary, ResultCatalog
 
 # Color maps
 color_map_falsified = cm.get_cmap("Reds", 8)
@@ -53,17 +54,43 @@ def loadExperiments(path, benchmarks, prefixes):
 
     return experiments
 
+def loadCatalog(path, benchmarks, prefixes, N_workers=None):
+    """Like loadExperiments, but returns replica summaries from the result
+    catalogs of the benchmark directories instead of full results. The
+    catalogs are updated with new result files before querying. The functions
+    falsification_rate, times, mean_min_along, and first_falsification accept
+    summaries in place of results."""
+
+    experiments = {}
+    for benchmark in benchmarks:
+        catalog = ResultCatalog(os.path.join(path, benchmark))
+        catalog.update(N_workers=N_workers)
+        experiments[benchmark] = {}
+        for prefix in prefixes[benchmark]:
+            summaries = catalog.query(prefix)
+            if len(summaries) == 0:
+                raise Exception("Empty experiment for prefix '{}' for benchmark '{}'.".format(prefix, benchmark))
+            experiments[benchmark][prefix] = summaries
+
+    return experiments
+
 def falsification_rate(experiment):
     if len(experiment) == 0:
         return None
 
     c = 0
     for result in experiment:
-        c += 1 if any(step.success for step in result.step_results) else 0
+        if isinstance(result, ReplicaSummary):
+            c += 1 if result.success else 0
+        else:
+            c += 1 if any(step.success for step in result.step_results) else 0
 
     return c/len(experiment)
 
 def times(replica):
+    if isinstance(replica, ReplicaSummary):
+        return replica.total_time
+
     t = 0
     for i in range(replica.test_repository.tests):
         performance = replica.test_repository.performance(i)
@@ -94,11 +121,12 @@ def min_along(X, length=None):
     return A
 
 def mean_min_along(results, length=None):
+    # The results can be STGEMResults or ReplicaSummaries. In both cases, the
+    # curve has one entry per test (the minimum over the objectives).
     A = []
     for i in range(len(results)):
-        _, _, Y = results[i].test_repository.get()
-        Y = np.array(Y).reshape(-1)
-        B = min_along(Y, length=length)
+        summary = results[i] if isinstance(results[i], ReplicaSummary) else ReplicaSummary.from_result(results[i])
+        B = min_along(summary.min_curve, length=length)
         A.append(B)
 
     A = np.array(A)
@@ -107,12 +135,10 @@ def mean_min_along(results, length=None):
     return C
 
 def first_falsification(replica):
-    _, _, Y = replica.test_repository.get()
-    for i in range(len(Y)):
-        if min(Y[i]) <= 0.0:
-            return i
+    if isinstance(replica, ReplicaSummary):
+        return replica.first_falsification
 
-    return None
+    return ReplicaSummary.from_result(replica).first_falsification
 
 def set_boxplot_color(bp, color):
     plt.setp(bp["boxes"], color=color)
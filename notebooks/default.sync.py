@@ -41,7 +41,9 @@ replica_prefixes = {"AFC": ["AFC27"],
                     "AT": ["AT1", "ATX13", "ATX14", "ATX2", "ATX61", "ATX62"],
                     "F16": ["F16"]}
 
-experiments = loadExperiments(output_path_base, benchmarks, replica_prefixes)
+# Summaries of the replicas from the result catalogs. Only new result files
+# are read when the catalogs are updated.
+summaries = loadCatalog(output_path_base, benchmarks, replica_prefixes)
 
 # %% [markdown]
 # # Falsification Rate and First Falsifications
@@ -49,8 +51,8 @@ experiments = loadExperiments(output_path_base, benchmarks, replica_prefixes)
 # %%
 print("Experiment: Falsification rates:")
 for benchmark in benchmarks:
-    for experiment in experiments[benchmark]:
-        FR = falsification_rate(experiments[benchmark][experiment])
+    for experiment in summaries[benchmark]:
+        FR = falsification_rate(summaries[benchmark][experiment])
         print("{}/{}, {}".format(benchmark, experiment, FR))
 
 
@@ -60,8 +62,8 @@ data = []
 labels = []
 for benchmark in benchmarks:
     labels += replica_prefixes[benchmark]
-    for experiment in experiments[benchmark]:
-        FF = np.array([first_falsification(replica) for replica in experiments[benchmark][experiment]])
+    for experiment in summaries[benchmark]:
+        FF = np.array([first_falsification(replica) for replica in summaries[benchmark][experiment]])
         data.append(FF[FF != None])
         print("{}/{}, {}, {}".format(benchmark, experiment, np.mean(data[-1]), np.std(data[-1])))
 
@@ -73,8 +75,8 @@ own_boxplot(data, labels, title="First Falsifications", ylabel="First falsificat
 # %%
 print("Experiment: Mean time:")
 for benchmark in benchmarks:
-    for experiment in experiments[benchmark]:
-        T = np.array([times(replica) for replica in experiments[benchmark][experiment]])
+    for experiment in summaries[benchmark]:
+        T = np.array([times(replica) for replica in summaries[benchmark][experiment]])
         print("{}/{}, {}".format(benchmark, experiment, np.mean(T)))
 
 # %% [markdown]
@@ -93,6 +95,9 @@ Outputs are always the outputs of the SUT unmodified.
 # * Include robustness values in the plots.
 
 # %%
+# Visualization requires the full results.
+experiments = loadExperiments(output_path_base, benchmarks, replica_prefixes)
+
 benchmark = "F16"
 experiment = "F16"
 replica_idx = [0]
@@ -15,7 +15,10 @@ def get_generator_factory(description, sut_factory, objective_factory, objective
                      sut=sut_factory(),
                      objectives=objective_factory(),
                      objective_selector=objective_selector_factory(),
-                     steps=step_factory())
+                     steps=step_factory(),
+                     # Store the piecewise constant inputs and the output
+                     # signals in a compact form.
+                     test_repository_parameters={"compact_inputs": True, "compress_outputs": True})
 
     return generator_factory
 
@@ -55,7 +58,7 @@ def get_sut_objective_factory(benchmark_module, selected_specification, mode):
 
     return sut_factory, objective_factory
 
-def get_experiment_factory(N, benchmark_module, selected_specification, mode, init_seed, callback=None):
+def get_experiment_factory(N, benchmark_module, selected_specification, mode, init_seed, callback=None, result_writer=None):
     sut_factory, objective_factory = get_sut_objective_factory(benchmark_module, selected_specification, mode)
 
     from stgem.experiment import Experiment
@@ -64,7 +67,8 @@ def get_experiment_factory(N, benchmark_module, selected_specification, mode, in
         return Experiment(N=N,
                           stgem_factory=get_generator_factory("", sut_factory, objective_factory, benchmark_module.get_objective_selector_factory(), benchmark_module.get_step_factory()),
                           seed_factory=get_seed_factory(init_seed),
-                          result_callback=callback)
+                          result_callback=callback,
+                          result_writer=result_writer)
 
     return experiment_factory
 
@@ -104,26 +108,30 @@ N_workers = {
 def main(selected_benchmark, selected_specification, mode, n, init_seed, identifier):
     N = n
 
-    # Disable CUDA if multiprocessing is used.
-    if N > 1 and N_workers[selected_benchmark] > 1:
-        os.environ["CUDA_VISIBLE_DEVICES"] = ""
-
     if not selected_specification in specifications[selected_benchmark]:
         raise Exception("No specification '{}' for benchmark {}.".format(selected_specification, selected_benchmark))
 
+    from stgem.result_writer import ResultWriter
+
+    # Write the result files in the background so that the main process can
+    # keep serving the workers.
+    result_writer = ResultWriter(codec="gzip")
+
     def callback(idx, result, done):
         path = os.path.join("..", "..", "output", selected_benchmark)
         time = str(result.timestamp).replace(" ", "_")
-        file_name = "{}{}_{}.pickle.gz".format(selected_specification, "_" + identifier if identifier is not None else "", time)
+        file_name = "{}{}_{}{}".format(selected_specification, "_" + identifier if identifier is not None else "", time, result_writer.file_extension)
         os.makedirs(path, exist_ok=True)
-        result.dump_to_file(os.path.join(path, file_name))
+        result_writer.submit(result, os.path.join(path, file_name))
 
     benchmark_module = importlib.import_module("{}.benchmark".format(selected_benchmark.lower()))
 
-    experiment = get_experiment_factory(N, benchmark_module, selected_specification, mode, init_seed, callback=callback)()
+    experiment = get_experiment_factory(N, benchmark_module, selected_specification, mode, init_seed, callback=callback, result_writer=result_writer)()
 
-    use_gpu = N == 1 or N_workers[selected_benchmark] == 1
-    experiment.run(N_workers=min(N, N_workers[selected_benchmark]), silent=False, use_gpu=use_gpu)
+    experiment.run(N_workers=min(N, N_workers[selected_benchmark]), silent=False)
+    # Use the utilization of the workers to adjust N_workers.
+    print(experiment.metrics.summary())
+    result_writer.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,72 @@
+import importlib, os
+
+import click
+
+from run import get_experiment_factory, benchmarks, specifications, N_workers
+
+@click.command()
+@click.argument("selected", type=str, nargs=-1)
+@click.option("--n", type=int, required=True, help="Number of replicas per specification.")
+@click.option("--init-seed", type=int, required=True)
+@click.option("--identifier", type=str, default="")
+@click.option("--workers", type=int, default=None, help="Number of workers (default: the largest number for the selected benchmarks).")
+@click.option("--catalog", type=str, default=os.path.join("..", "..", "output"), help="Result directory used to estimate the durations of the replicas.")
+def main(selected, n, init_seed, identifier, workers, catalog):
+    """Run several specifications on the same workers. Each specification is
+    given as BENCHMARK:SPECIFICATION or BENCHMARK:SPECIFICATION:MODE, for
+    example, AT:AT1 AFC:AFC27:normal. The replicas expected to take the
+    longest are run first."""
+
+    from stgem.catalog import ResultCatalog
+    from stgem.experiment.group import ExperimentGroup, expected_duration
+    from stgem.result_writer import ResultWriter
+
+    jobs = []
+    for item in selected:
+        parts = item.split(":")
+        if not len(parts) in [2, 3]:
+            raise Exception("Expected BENCHMARK:SPECIFICATION[:MODE], got '{}'.".format(item))
+        benchmark, specification, mode = parts[0].upper(), parts[1], parts[2] if len(parts) == 3 else ""
+        if not benchmark in benchmarks:
+            raise Exception("No benchmark '{}'.".format(benchmark))
+        if not specification in specifications[benchmark]:
+            raise Exception("No specification '{}' for benchmark {}.".format(specification, benchmark))
+        jobs.append((benchmark, specification, mode))
+
+    # Write the result files in the background so that the main process can
+    # keep serving the workers.
+    result_writer = ResultWriter(codec="gzip")
+
+    def get_callback(benchmark, specification):
+        def callback(idx, result, done):
+            path = os.path.join("..", "..", "output", benchmark)
+            time = str(result.timestamp).replace(" ", "_")
+            file_name = "{}{}_{}{}".format(specification, "_" + identifier if identifier is not None else "", time, result_writer.file_extension)
+            os.makedirs(path, exist_ok=True)
+            result_writer.submit(result, os.path.join(path, file_name))
+
+        return callback
+
+    result_catalog = None
+    if catalog is not None and os.path.exists(catalog):
+        result_catalog = ResultCatalog(catalog)
+        result_catalog.update()
+
+    experiments = []
+    durations = []
+    for benchmark, specification, mode in jobs:
+        benchmark_module = importlib.import_module("{}.benchmark".format(benchmark.lower()))
+        experiments.append(get_experiment_factory(n, benchmark_module, specification, mode, init_seed, callback=get_callback(benchmark, specification), result_writer=result_writer)())
+        durations.append(expected_duration(result_catalog, prefix=specification + "_", subdirectory=benchmark) if result_catalog is not None else None)
+
+    if workers is None:
+        workers = max(N_workers[benchmark] for benchmark, _, _ in jobs)
+
+    group = ExperimentGroup(experiments, durations)
+    group.run(N_workers=min(group.N, workers), silent=False)
+    # Use the utilization of the workers to adjust the number of workers.
+    print(group.metrics.summary())
+    result_writer.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,16 @@
+"""
+Modules and data loaded once into the fork server from which the experiment
+workers are forked (see Experiment.run). The data file must be the same as in
+run.py.
+"""
+
+import torch
+
+import stgem.algorithm.ogan.model
+import stgem.algorithm.wogan.model
+import stgem.generator
+import stgem.objective
+
+from sut import load_odroid_data
+
+load_odroid_data("odroid.npy")
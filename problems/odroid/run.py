@@ -119,10 +119,6 @@ def main(n, init_seed, identifier):
 
     N_workers = 5
 
-    # Disable CUDA if multiprocessing is used.
-    if N > 1 and N_workers > 1:
-        os.environ["CUDA_VISIBLE_DEVICES"] = ""
-
     def callback(idx, result, done):
         path = os.path.join("..", "..", "output", "Odroid")
         time = str(result.timestamp).replace(" ", "_")
@@ -132,8 +128,11 @@ def main(n, init_seed, identifier):
 
     experiment = get_experiment_factory(N, init_seed, callback=callback)()
 
-    use_gpu = N == 1 or N_workers == 1
-    experiment.run(N_workers=min(N, N_workers), silent=False, use_gpu=use_gpu)
+    # The workers are forked from a process which has already imported the
+    # modules and loaded the data.
+    experiment.run(N_workers=min(N, N_workers), silent=False, preload=["preload"])
+    # Use the utilization of the workers to adjust N_workers.
+    print(experiment.metrics.summary())
 
 if __name__ == "__main__":
     main()
@@ -2,9 +2,39 @@ import os
 
 import numpy as np
 
+from stgem.experiment import preloaded
 from stgem.sut import SUT, SUTOutput, SUTInput
 from util import generate_odroid_data
 
+def load_odroid_data(data_file):
+    """Return the inputs normalized to [-1, 1] and the outputs of the given
+    Odroid data file. The data is loaded once per process, so workers forked
+    from a process which has loaded the data do not load it again."""
+
+    def loader():
+        # Check if we have a npy file. Otherwise we attempt to generate such a
+        # file from a csv file.
+        if not os.path.exists(data_file):
+            if not data_file.endswith(".npy"):
+                raise Exception("The Odroid data file does not have extension .npy.")
+            csv_file = data_file[:-4] + ".csv"
+            if not os.path.exists(csv_file):
+                raise Exception("No Odroid csv file '{}' available for data generation.".format(csv_file))
+            generate_odroid_data(csv_file)
+
+        data = np.load(data_file)
+
+        dataX = data[:, 0:6]
+        dataY = data[:, 6:]
+
+        # Normalize the inputs to [-1, 1].
+        scaleX = dataX.max(axis=0)
+        dataX = (dataX / scaleX) * 2 - 1
+
+        return dataX, dataY, scaleX
+
+    return preloaded(("odroid", os.path.abspath(data_file)), loader)
+
 class OdroidSUT(SUT):
     """Implements the Odroid system under test.
 
@@ -33,28 +63,21 @@ class OdroidSUT(SUT):
         except:
             raise
 
-    def _load_odroid_data(self):
-        # Check if we have a npy file. Otherwise we attempt to generate such a file
-        # from a csv file.
-        if not os.path.exists(self.data_file):
-            if not self.data_file.endswith(".npy"):
-                raise Exception("The Odroid data file does not have extension .npy.")
-            csv_file = self.data_file[:-4] + ".csv"
-            if not os.path.exists(csv_file):
-                raise Exception("No Odroid csv file '{}' available for data generation.".format(csv_file))
-            generate_odroid_data(csv_file)
+    def __getstate__(self):
+        # The data is not pickled but loaded again (see load_odroid_data).
+        state = self.__dict__.copy()
+        state["dataX"] = state["dataY"] = state["scaleX"] = None
+        return state
 
-        data = np.load(self.data_file)
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._load_odroid_data()
 
+    def _load_odroid_data(self):
         # Set number of input dimensions.
         self.ndimensions = 6
 
-        self.dataX = data[:, 0 : self.ndimensions]
-        self.dataY = data[:, self.ndimensions :]
-
-        # Normalize the inputs to [-1, 1].
-        self.scaleX = self.dataX.max(axis=0)
-        self.dataX = (self.dataX / self.scaleX) * 2 - 1
+        self.dataX, self.dataY, self.scaleX = load_odroid_data(self.data_file)
 
     def _execute_test(self, sut_input):
         """
@@ -14,6 +14,7 @@ from stgem.budget import Budget
 from stgem.experiment import Experiment
 from stgem.objective import Objective
 from stgem.objective_selector import ObjectiveSelectorAll
+from stgem.result_writer import ResultWriter
 
 from sut import SBSTSUT, SBSTSUT_validator
 
@@ -55,6 +56,13 @@ class MaxOOB(Objective):
     def __call__(self, t, r):
         return 1 - max(r.outputs[0])
 
+    def upper_bound(self, t, r):
+        # The maximum can only increase when the simulation continues.
+        return self(t, r)
+
+    def decided(self, t, r):
+        return self(t, r) <= 0
+
 class ScaledDistance(Objective):
     """Objective based on distance to the left and right edges of the lane."""
 
@@ -71,6 +79,12 @@ class ScaledDistance(Objective):
 
         return min(np.min(L), np.min(R))
 
+    def upper_bound(self, t, r):
+        return self(t, r)
+
+    def decided(self, t, r):
+        return self(t, r) <= 0
+
 # These are the settings used to get the results of "Wasserstein Generative
 # Adversarial Networks for Online Test Generation for Cyber Physical Systems".
 mode = "exhaust_budget"
@@ -203,6 +217,9 @@ def main(n, init_seed, identifier):
             budget=CustomBudget(),
             objectives=[objective],
             objective_selector=ObjectiveSelectorAll(),
+            # Keep at most 256 MB of simulated signals in memory during long
+            # runs; the rest is spilled to disk.
+            test_repository_parameters={"compress_outputs": True, "memory_budget": 256*2**20},
             steps=[
                 first_step,
                 Search(mode=mode,
@@ -223,15 +240,19 @@ def main(n, init_seed, identifier):
         g = seed_generator(init_seed)
         return lambda: next(g)
 
+    # Write the result files in the background while the next replica runs.
+    result_writer = ResultWriter(codec="gzip")
+
     def result_callback(idx, result, done):
         path = os.path.join("..", "..", "output", "sbst")
         time = str(result.timestamp).replace(" ", "_").replace(":", "")
-        file_name = "SBST{}_{}_{}.pickle.gz".format("_" + identifier if len(identifier) > 0 else "", time, idx)
+        file_name = "SBST{}_{}_{}{}".format("_" + identifier if len(identifier) > 0 else "", time, idx, result_writer.file_extension)
         os.makedirs(path, exist_ok=True)
-        result.dump_to_file(os.path.join(path, file_name))
+        result_writer.submit(result, os.path.join(path, file_name))
 
-    experiment = Experiment(N, stgem_factory, get_seed_factory(init_seed), result_callback=result_callback)
+    experiment = Experiment(N, stgem_factory, get_seed_factory(init_seed), result_callback=result_callback, result_writer=result_writer)
     experiment.run(N_workers=1)
+    result_writer.close()
 
 if __name__ == "__main__":
     main()
@@ -15,6 +15,9 @@ The parameters dictionary for the SUT has the following parameters:
   map_size (int):          Map size in pixels (total map map_size*map_size).
   max_speed (float):       Maximum speed (km/h) for the vehicle during the
                            simulation.
+  report_period (int):     The partial output is reported every this many
+                           simulation steps for early termination (see
+                           SUT.report_partial_output).
 """
 
 import os, time, traceback
@@ -55,7 +58,8 @@ class SBSTSUT(SUT):
     default_parameters = {"curvature_range": 0.07,
                           "step_length": 15,
                           "map_size": 200,
-                          "max_speed": 70}
+                          "max_speed": 70,
+                          "report_period": 10}
 
     def __init__(self, parameters=None):
         """"""
@@ -142,6 +146,11 @@ class SBSTSUT(SUT):
         self.brewer = None
         self.vehicle = None
 
+    def reset(self):
+        # The BeamNG simulator is kept running.
+        super().reset()
+        self.last_observation = None
+
     def _is_the_car_moving(self, last_state):
         """
         Check if the car moved in the past 10 seconds
@@ -170,13 +179,29 @@ class SBSTSUT(SUT):
         except Exception as ex:
             traceback.print_exception(type(ex), ex, ex.__traceback__)
 
-    def _execute_test_beamng(self, test):
+    def _output_from_states(self, states):
+        """Build a time series for the distances, OOB percentages, and
+        steering angles based on simulation states."""
+
+        timestamps = np.zeros(len(states))
+        signals = np.zeros(shape=(4, len(states)))
+        for i, state in enumerate(states):
+            timestamps[i] = state.timer
+            signals[0, i] = state.oob_percentage
+            signals[1, i] = state.oob_distance_left
+            signals[2, i] = state.oob_distance_right
+            signals[3, i] = state.steering
+
+        return SUTOutput(signals, timestamps, {"simulation_time": timestamps[-1] if len(states) > 0 else 0}, None)
+
+    def _execute_test_beamng(self, test, report=None):
         """Execute a single test on BeamNG.tech and return its input and output
         signals. The input signals is are the interpolated road points as
         series of X and Y coordinates. The output signal is the BOLP (body out
         of lane percentage) and signed distances to the edges of the lane at
         the given time steps. We expect the input to be a sequence of
-        plane points."""
+        plane points. If report is given, it is called periodically with the
+        partial output, and the simulation is stopped if it returns True."""
 
         # This code is mainly from https://github.com/se2p/tool-competition-av/code_pipeline/beamng_executor.py
 
@@ -247,6 +272,7 @@ class SBSTSUT(SUT):
                 brewer.vehicle.ai_drive_in_lane(True)
                 brewer.vehicle.ai_set_waypoint(waypoint_goal.name)
 
+            steps_taken = 0
             while True:
                 # idx += 1
                 # assert idx < iterations_count, "Timeout Simulation " + str(sim_data_collector.name)
@@ -267,6 +293,11 @@ class SBSTSUT(SUT):
                     steering_angle, throttle = predict.predict(img, last_state)
                     self.vehicle.control(throttle=throttle, steering=steering_angle, brake=0)
 
+                steps_taken += 1
+                if report is not None and steps_taken % self.report_period == 0:
+                    if report(self._output_from_states(sim_data_collector.states)):
+                        break
+
                 beamng.step(steps)
 
             sim_data_collector.get_simulation_data().end(success=True)
@@ -292,17 +323,7 @@ class SBSTSUT(SUT):
 
             self.end_iteration()
 
-        # Build a time series for the distances, OOB percentages, and steering
-        # angles based on simulation states.
-        states = sim_data_collector.get_simulation_data().states
-        timestamps = np.zeros(len(states))
-        signals = np.zeros(shape=(4, len(states)))
-        for i, state in enumerate(states):
-            timestamps[i] = state.timer
-            signals[0, i] = state.oob_percentage
-            signals[1, i] = state.oob_distance_left
-            signals[2, i] = state.oob_distance_right
-            signals[3, i] = state.steering
+        output = self._output_from_states(sim_data_collector.get_simulation_data().states)
 
         # Prepare the final input form as well.
         input_signals = np.zeros(shape=(2, len(nodes)))
@@ -310,11 +331,12 @@ class SBSTSUT(SUT):
             input_signals[0, i] = point[0]
             input_signals[1, i] = point[1]
 
-        return input_signals, SUTOutput(signals, timestamps, {"simulation_time": timestamps[-1]}, None)
+        return input_signals, output
 
     def _execute_test(self, test):
         denormalized = self.descale(test.inputs.reshape(1, -1), self.input_range).reshape(-1)
-        input_signals, output = self._execute_test_beamng(test_to_road_points(denormalized, self.step_length, self.map_size))
+        report = lambda partial_output: self.report_partial_output(test, partial_output)
+        input_signals, output = self._execute_test_beamng(test_to_road_points(denormalized, self.step_length, self.map_size), report)
         test.input_denormalized = input_signals
         test.input_timestamps = np.arange(input_signals.shape[1])
 
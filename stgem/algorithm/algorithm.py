@@ -5,6 +5,11 @@ documentation if you make changes to Algorithm!
 
 import copy
 
+import numpy as np
+
+from stgem.algorithm.model import get_object_state, set_object_state
+from stgem.algorithm.test_index import TestIndex
+
 class Algorithm:
     """Base class for all test suite generation algorithms."""
 
@@ -44,7 +49,7 @@ class Algorithm:
         self.search_space = search_space
         self.device = device
         self.logger = logger
-        self.log = lambda msg: (self.logger("algorithm", msg) if logger is not None else None)
+        self.log = lambda msg, *args, **kwargs: (self.logger("algorithm", msg, *args, **kwargs) if logger is not None else None)
 
         # Set input dimension.
         if not "input_dimension" in self.parameters:
@@ -65,6 +70,13 @@ class Algorithm:
         for m in self.models:
             m.setup(self.search_space, self.device, self.logger)
 
+        # Index of executed tests for detecting near-duplicate tests.
+        self.test_index = TestIndex()
+
+        # Fraction of the usual training the step asks for (see
+        # TrainingCadence). With effort 0, models are not trained.
+        self.training_effort = 1.0
+
     def __getattr__(self, name):
         if "parameters" in self.__dict__:
             if name in self.parameters:
@@ -72,6 +84,65 @@ class Algorithm:
 
         raise AttributeError(name)
 
+    def get_state(self):
+        """Return the state of the algorithm and its models for a checkpoint.
+        See stgem.algorithm.model.get_object_state."""
+
+        state = get_object_state(self, exclude=["model", "models", "model_factory"])
+        state["models"] = ("value", [model.get_state() for model in self.models])
+
+        return state
+
+    def set_state(self, state):
+        """Restore the state of an algorithm which has been set up."""
+
+        state = dict(state)
+        for model, model_state in zip(self.models, state.pop("models")[1]):
+            model.set_state(model_state)
+        set_object_state(self, state)
+
+    def duplicate_distances(self, tests, test_repository):
+        """Return the distances of the given tests (a 2D array of normalized
+        inputs) to the nearest test in the test repository."""
+
+        self.test_index.update(test_repository)
+        return self.test_index.distances(tests)
+
+    def filter_duplicates(self, tests, test_repository):
+        """Handle the given candidate tests (a 2D array of normalized inputs)
+        which are within the parameter duplicate_distance from an executed
+        test according to the parameter duplicate_policy. With the policy
+        "reject", such tests are removed, and with "penalize", they get a
+        penalty which increases linearly from 0 to 1 as the distance
+        decreases. Returns the remaining tests, their penalties to be added to
+        their predicted objectives, and the number of near duplicates."""
+
+        penalty = np.zeros(tests.shape[0])
+        if self.duplicate_distance <= 0:
+            return tests, penalty, 0
+
+        distances = self.duplicate_distances(tests, test_repository)
+        near = distances < self.duplicate_distance
+        if self.duplicate_policy == "reject":
+            return tests[~near], penalty[~near], int(np.sum(near))
+        elif self.duplicate_policy == "penalize":
+            penalty = np.clip(1 - distances / self.duplicate_distance, 0, 1)
+            return tests, penalty, int(np.sum(penalty > 0))
+        else:
+            raise Exception("Unknown duplicate policy '{}'.".format(self.duplicate_policy))
+
+    def scaled_train_settings(self, train_settings):
+        """Return a copy of the given model train settings with the epoch
+        counts (keys ending with 'epochs') scaled by the training effort.
+        Positive counts remain at least 1."""
+
+        train_settings = dict(train_settings)
+        for key, value in train_settings.items():
+            if key.endswith("epochs") and value > 0:
+                train_settings[key] = max(1, int(round(value*self.training_effort)))
+
+        return train_settings
+
     def initialize(self):
         """A Step calls this method before the first generate_test call"""
 
@@ -101,6 +172,28 @@ class Algorithm:
     def do_generate_next_test(self, active_outputs, test_repository, budget_remaining):
        raise NotImplementedError
 
+    def generate_next_tests(self, N, active_outputs, test_repository, budget_remaining):
+        """Generate N tests to be executed concurrently (see the batch_size
+        parameter of Search). The generation time of all tests is recorded
+        into the performance record of the current test."""
+
+        performance = test_repository.performance(test_repository.current_test)
+        performance.timer_start("generation")
+        try:
+            r = self.do_generate_next_tests(N, active_outputs, test_repository, budget_remaining)
+        except:
+            raise
+        finally:
+            performance.record("generation_time", performance.timer_reset("generation"))
+
+        return r
+
+    def do_generate_next_tests(self, N, active_outputs, test_repository, budget_remaining):
+        """By default, we simply call do_generate_next_test N times. Algorithms
+        which can propose several tests at once should override this."""
+
+        return [self.do_generate_next_test(active_outputs, test_repository, budget_remaining) for _ in range(N)]
+
     def finalize(self):
         """A Step calls this method after the budget has been exhausted and the
         algorithm will no longer be used."""
@@ -1,4 +1,6 @@
-import copy
+import contextlib, copy
+
+import torch
 
 """
 Currently the use_previous_rng parameter is used so that the setup method can
@@ -9,8 +11,58 @@ learning models, the initial weights or other parameters can be completely
 different.
 
 It is up to the child class to implement RNG saving and restoration.
+
+A model may also have its own torch Generator torch_rng obtained from the
+search space in setup (see SearchSpace.torch_generator). When torch_rng is not
+None, the model should use it instead of the global torch RNG, for example,
+by passing it to torch.rand or by initializing its neural networks within
+the context initialization_rng. Then the random choices of the model do not
+depend on the other users of the global RNG.
 """
 
+# Attributes which are recreated by setup and which are thus not included in
+# the state of an algorithm or a model.
+_transient_attributes = ["search_space", "device", "logger", "log"]
+
+def get_object_state(obj, exclude=None):
+    """Return the state of an algorithm or a model for a checkpoint. Objects
+    having a state dictionary (such as torch modules and optimizers) are
+    saved using their state dictionaries, other objects defined in stgem are
+    saved recursively, and callables are skipped as they are expected to be
+    recreated by setup."""
+
+    exclude = _transient_attributes + ([] if exclude is None else exclude)
+
+    state = {}
+    for key, value in obj.__dict__.items():
+        if key in exclude: continue
+        if hasattr(value, "state_dict") and hasattr(value, "load_state_dict"):
+            state[key] = ("state_dict", value.state_dict())
+        elif isinstance(value, torch.Generator):
+            state[key] = ("generator", value.get_state())
+        elif callable(value):
+            continue
+        elif hasattr(value, "__dict__") and type(value).__module__.startswith("stgem."):
+            state[key] = ("object", get_object_state(value))
+        else:
+            state[key] = ("value", value)
+
+    return state
+
+def set_object_state(obj, state):
+    """Restore a state returned by get_object_state to an object which has
+    been set up."""
+
+    for key, (kind, value) in state.items():
+        if kind == "state_dict":
+            getattr(obj, key).load_state_dict(value)
+        elif kind == "generator":
+            getattr(obj, key).set_state(value)
+        elif kind == "object":
+            set_object_state(getattr(obj, key), value)
+        else:
+            setattr(obj, key, value)
+
 class ModelSkeleton:
     """Base class for a model skeleton. A model skeleton is a snapshot of a
     model that is frozen and stripped of all extraneous information and which
@@ -21,6 +73,8 @@ class ModelSkeleton:
         # This is for handling multiple inheritance.
         if parameters is not None:
             self.parameters = copy.deepcopy(parameters)
+        # The torch Generator of the model or None for the global torch RNG.
+        self.torch_rng = None
 
     def __getattr__(self, name):
         if "parameters" in self.__dict__:
@@ -79,7 +133,34 @@ class Model(ModelSkeleton):
         self.parameters["input_dimension"] = self.search_space.input_dimension
         self.device = device
         self.logger = logger
-        self.log = lambda msg: (self.logger("model", msg) if logger is not None else None)
+        self.log = lambda msg, *args, **kwargs: (self.logger("model", msg, *args, **kwargs) if logger is not None else None)
+
+        # With use_previous_rng, the generator is rewound to its state after
+        # the previous setup.
+        if use_previous_rng:
+            if self.torch_rng is not None:
+                self.torch_rng.set_state(self.previous_torch_rng_state)
+        else:
+            self.torch_rng = search_space.torch_generator() if hasattr(search_space, "torch_generator") else None
+            self.previous_torch_rng_state = self.torch_rng.get_state() if self.torch_rng is not None else None
+
+    def initialization_rng(self):
+        """Return a context within which the global torch RNG (on CPU) is
+        seeded from the generator of the model if it has one. The global RNG
+        is restored when the context exits."""
+
+        if self.torch_rng is None:
+            return contextlib.nullcontext()
+
+        @contextlib.contextmanager
+        def seeded(seed):
+            # Only the CPU RNG is forked, so we must not use
+            # torch.manual_seed which also seeds the CUDA RNGs.
+            with torch.random.fork_rng(devices=[]):
+                torch.default_generator.manual_seed(seed)
+                yield
+
+        return seeded(int(torch.randint(0, 2**62, size=(1,), generator=self.torch_rng)[0]))
 
     @classmethod
     def setup_from_skeleton(C, skeleton, search_space, device, logger=None, use_previous_rng=False):
@@ -90,6 +171,15 @@ class Model(ModelSkeleton):
     def skeletonize(self):
         return ModelSkeleton(self.parameters)
 
+    def get_state(self):
+        """Return the state of the model (e.g., the state dictionaries of its
+        neural networks and optimizers) for a checkpoint."""
+
+        return get_object_state(self)
+
+    def set_state(self, state):
+        set_object_state(self, state)
+
     def reset(self):
         pass
 
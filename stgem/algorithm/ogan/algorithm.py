@@ -3,6 +3,7 @@ import heapq
 import numpy as np
 
 from stgem.algorithm import Algorithm
+from stgem.exceptions import GenerationException
 
 class OGAN(Algorithm):
     """Implements the online generative adversarial network algorithm."""
@@ -13,6 +14,8 @@ class OGAN(Algorithm):
         "train_delay": 1,
         "N_candidate_tests": 1,
         "invalid_threshold": 100,
+        "duplicate_distance": 0.0,
+        "duplicate_policy": "reject",
         "reset_each_training": False
     }
 
@@ -43,20 +46,16 @@ class OGAN(Algorithm):
         # caller to ensure that all models are trained here if so desired.
 
         for i in active_outputs:
-            if self.first_training or self.tests_generated - self.model_trained[i] >= self.train_delay:
+            if self.first_training or (self.training_effort > 0 and self.tests_generated - self.model_trained[i] >= self.train_delay):
                 self.log("Training the OGAN model {}...".format(i + 1))
                 if not self.first_training and self.reset_each_training:
                     # Reset the model.
                     self.models[i].reset()
-                X, _, Y = test_repository.get()
+                X, Y = test_repository.get_inputs_and_objectives()
                 dataX = np.asarray([sut_input.inputs for sut_input in X])
                 dataY = np.array(Y)[:, i].reshape(-1, 1)
-                epochs = self.models[i].train_settings["epochs"] if not self.first_training else self.models[i].train_settings_init["epochs"]
-                for epoch in range(epochs):
-                    if self.first_training:
-                        train_settings = self.models[i].train_settings_init
-                    else:
-                        train_settings = self.models[i].train_settings
+                train_settings = self.scaled_train_settings(self.models[i].train_settings_init if self.first_training else self.models[i].train_settings)
+                for epoch in range(train_settings["epochs"]):
                     D_losses, G_losses = self.models[i].train_with_batch(dataX,
                                                                          dataY,
                                                                          train_settings=train_settings,
@@ -67,18 +66,21 @@ class OGAN(Algorithm):
         self.first_training = False
 
     def do_generate_next_test(self, active_outputs, test_repository, budget_remaining):
+        return self.do_generate_next_tests(1, active_outputs, test_repository, budget_remaining)[0]
+
+    def do_generate_next_tests(self, N, active_outputs, test_repository, budget_remaining):
         heap = []
         target_fitness = 0
         entry_count = 0  # this is to avoid comparing tests when two tests added to the heap have the same predicted objective
         N_generated = 0
         N_invalid = 0
+        N_duplicate = 0
         self.log("Generating using OGAN models {}.".format(",".join(str(m + 1) for m in active_outputs)))
 
         # PerformanceRecordHandler for the current test.
         performance = test_repository.performance(test_repository.current_test)
 
         while True:
-            # TODO: Avoid selecting similar or same tests.
             for i in active_outputs:
                 while True:
                     # If we have already generated many tests and all have been
@@ -86,6 +88,8 @@ class OGAN(Algorithm):
                     # will fix things.
                     if N_invalid >= self.invalid_threshold:
                         raise GenerationException("Could not generate a valid test within {} tests.".format(N_invalid))
+                    if self.duplicate_policy == "reject" and N_duplicate >= self.invalid_threshold:
+                        raise GenerationException("Could not generate a test which is not a near duplicate of an executed test within {} tests.".format(N_duplicate))
 
                     # Generate several tests and pick the one with best
                     # predicted objective function component. We do this as
@@ -103,9 +107,17 @@ class OGAN(Algorithm):
                     if candidate_tests.shape[0] == 0:
                         continue
 
+                    # Handle near duplicates of executed tests.
+                    candidate_tests, penalty, duplicates = self.filter_duplicates(candidate_tests, test_repository)
+                    N_duplicate += duplicates
+                    if candidate_tests.shape[0] == 0:
+                        continue
+
                     # Estimate objective function values and add the tests
                     # to heap.
                     tests_predicted_objective = self.models[i].predict_objective(candidate_tests)
+                    if np.any(penalty > 0):
+                        tests_predicted_objective = np.minimum(1.0, tests_predicted_objective + penalty.reshape(-1, 1))
                     for j in range(tests_predicted_objective.shape[0]):
                         heapq.heappush(heap, (tests_predicted_objective[j,0], entry_count, i, candidate_tests[j]))
                         entry_count += 1
@@ -118,18 +130,20 @@ class OGAN(Algorithm):
             # Check if the best predicted test is good enough.
             # Without eps we could get stuck if prediction is always 1.0.
             eps = 1e-4
-            if heap[0][0] - eps <= target_fitness: break
+            # When generating several tests, we also require that we have
+            # enough candidates.
+            if len(heap) >= N and heap[0][0] - eps <= target_fitness: break
 
         # Save information on how many tests needed to be generated etc.
         # -----------------------------------------------------------------
         performance.record("N_tests_generated", N_generated)
         performance.record("N_invalid_tests_generated", N_invalid)
+        performance.record("N_duplicate_tests_generated", N_duplicate)
 
-        best_test = heap[0][3]
-        best_model = heap[0][2]
-        best_estimated_objective = heap[0][0]
-
-        self.log("Chose test {} with predicted minimum objective {} on OGAN model {}. Generated total {} tests of which {} were invalid.".format(best_test, best_estimated_objective, best_model + 1, N_generated, N_invalid))
+        # Return the N tests with the best predicted objectives.
+        best = heapq.nsmallest(N, heap)
+        for estimated_objective, _, model, test in best:
+            self.log("Chose test {} with predicted minimum objective {} on OGAN model {}. Generated total {} tests of which {} were invalid.", test, estimated_objective, model + 1, N_generated, N_invalid)
 
-        return best_test
+        return [test for _, _, _, test in best]
 
@@ -23,7 +23,7 @@ class OGAN_ModelSkeleton(ModelSkeleton):
 
         training_G = self.modelG.training
         # Generate uniform noise in [-1, 1].
-        noise = (torch.rand(size=(N, self.modelG.input_shape))*2 - 1).to(device)
+        noise = (torch.rand(size=(N, self.modelG.input_shape), generator=self.torch_rng)*2 - 1).to(device)
         self.modelG.train(False)
         result = self.modelG(noise)
 
@@ -130,7 +130,8 @@ class OGAN_Model(Model,OGAN_ModelSkeleton):
             self.previous_rng_state = {}
             self.previous_rng_state["torch"] = torch.random.get_rng_state()
 
-        self._initialize()
+        with self.initialization_rng():
+            self._initialize()
 
         # Restore RNG state.
         if use_previous_rng:
@@ -204,7 +205,8 @@ class OGAN_Model(Model,OGAN_ModelSkeleton):
         return skeleton
 
     def reset(self):
-        self._initialize()
+        with self.initialization_rng():
+            self._initialize()
 
     def train_with_batch(self, dataX, dataY, train_settings=None):
         """Train the OGAN with a batch of training data.
@@ -283,7 +285,7 @@ class OGAN_Model(Model,OGAN_ModelSkeleton):
         inputs = np.zeros(shape=(self.noise_batch_size, self.modelG.input_shape))
         k = 0
         while k < inputs.shape[0]:
-            noise = torch.rand(1, self.modelG.input_shape)*2 - 1
+            noise = torch.rand(1, self.modelG.input_shape, generator=self.torch_rng)*2 - 1
             new_test = self.modelG(noise.to(self.device)).cpu().detach().numpy()
             # TODO: Currently this can cause an infinite loop, so validity
             # check is disabled. On the other hand, it would make sense update
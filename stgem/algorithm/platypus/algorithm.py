@@ -4,6 +4,7 @@ import numpy as np
 from platypus import NSGAII, EpsMOEA, GDE3, SPEA2, Problem, Real
 
 from stgem.algorithm import Algorithm
+from stgem.exceptions import AlgorithmException
 
 class PlatypusOpt(Algorithm):
 
@@ -31,6 +32,9 @@ class PlatypusOpt(Algorithm):
 
         self.first_training = True
 
+    def get_state(self):
+        raise Exception("Checkpoints are not supported for Platypus algorithms as they run in a subprocess.")
+
     def _subprocess(self, queue, algorithm):
         def fitness_func(test):
             self.queue.put(test)
@@ -60,3 +64,11 @@ class PlatypusOpt(Algorithm):
 
         return np.array(test)
 
+    def do_generate_next_tests(self, N, active_outputs, test_repository, budget_remaining):
+        # The Platypus algorithm waits for the objective of each test before
+        # proposing the next one, so it cannot generate tests in batches.
+        if N > 1:
+            raise AlgorithmException("Platypus algorithms do not support generating tests in batches.")
+
+        return super().do_generate_next_tests(N, active_outputs, test_repository, budget_remaining)
+
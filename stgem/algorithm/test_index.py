@@ -0,0 +1,88 @@
+"""
+A spatial index over the inputs of executed tests.
+
+Generative algorithms sometimes propose tests which are extremely close to
+tests already executed, and executing such a test wastes a full SUT
+execution. A TestIndex answers nearest executed test queries in sublinear time
+while new tests are continuously added. We use the logarithmic method of
+Bentley and Saxe: the points are kept in static KD-trees whose sizes are
+distinct powers of two times the buffer size. A new point goes into a small
+buffer searched by brute force, and a full buffer is merged with the trees of
+the smallest sizes into a single new tree. A query thus visits O(log n) trees
+and the amortized insertion cost is O(log^2 n).
+"""
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+class TestIndex:
+
+    def __init__(self, buffer_size=32):
+        if buffer_size < 1:
+            raise Exception("The buffer size must be positive.")
+
+        self.buffer_size = buffer_size
+        self.dimension = None
+        self.buffer = []
+        self.levels = []  # levels[k] is None or a pair (points, tree) of buffer_size*2^k points.
+        self.indexed = 0  # Number of test repository tests added to the index.
+
+    def __len__(self):
+        return len(self.buffer) + sum(len(level[0]) for level in self.levels if level is not None)
+
+    def add(self, point):
+        point = np.asarray(point, dtype=float).reshape(-1)
+        if self.dimension is None:
+            self.dimension = len(point)
+        if len(point) != self.dimension:
+            # Tests of other dimensions (e.g., loaded from elsewhere) are
+            # never close to the generated tests.
+            return
+
+        self.buffer.append(point)
+        if len(self.buffer) < self.buffer_size: return
+
+        # Merge the buffer and the full levels below the first empty level.
+        points = [np.asarray(self.buffer)]
+        self.buffer = []
+        k = 0
+        while k < len(self.levels) and self.levels[k] is not None:
+            points.append(self.levels[k][0])
+            self.levels[k] = None
+            k += 1
+        if k == len(self.levels):
+            self.levels.append(None)
+        points = np.concatenate(points)
+        self.levels[k] = (points, cKDTree(points))
+
+    def update(self, test_repository):
+        """Add the tests of the repository which have not yet been added. The
+        tests whose execution failed are also added."""
+
+        if self.indexed >= test_repository.tests: return
+
+        X, _ = test_repository.get_inputs_and_objectives(list(range(self.indexed, test_repository.tests)), include_all=True)
+        for sut_input in X:
+            self.add(sut_input.inputs)
+        self.indexed = test_repository.tests
+
+    def distances(self, points):
+        """Return the Euclidean distances of the given points (a 2D array) to
+        the nearest indexed point. The distance is infinite if the index is
+        empty."""
+
+        points = np.asarray(points, dtype=float)
+        distances = np.full(points.shape[0], np.inf)
+        if self.dimension is None or points.shape[0] == 0 or points.shape[1] != self.dimension:
+            return distances
+
+        for level in self.levels:
+            if level is None: continue
+            d, _ = level[1].query(points, k=1)
+            np.minimum(distances, d, out=distances)
+
+        if len(self.buffer) > 0:
+            d = np.linalg.norm(points[:, np.newaxis, :] - np.asarray(self.buffer)[np.newaxis, :, :], axis=2).min(axis=1)
+            np.minimum(distances, d, out=distances)
+
+        return distances
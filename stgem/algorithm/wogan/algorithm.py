@@ -3,6 +3,7 @@ import heapq
 import numpy as np
 
 from stgem.algorithm import Algorithm
+from stgem.exceptions import GenerationException
 
 class WOGAN(Algorithm):
     """Implements the test suite generation based on online Wasserstein
@@ -15,6 +16,8 @@ class WOGAN(Algorithm):
         "train_delay": 3,
         "N_candidate_tests": 1,
         "invalid_threshold": 100,
+        "duplicate_distance": 0.0,
+        "duplicate_policy": "reject",
         "shift_function": "linear",
         "shift_function_parameters": {"initial": 0, "final": 3},
     }
@@ -41,6 +44,14 @@ class WOGAN(Algorithm):
 
         self.get_bin = (lambda x: int(x * self.bins) if x < 1.0 else self.bins - 1)
 
+    def set_state(self, state):
+        super().set_state(state)
+
+        # Recreate the shift function.
+        if "shift_coefficients" in self.__dict__:
+            alpha, beta = self.shift_coefficients
+            self.shift = lambda x: alpha * x + beta
+
     def initialize(self):
         self.test_bins = [{i:[] for i in range(self.bins)} for _ in range(self.N_models)] # a dictionary to tell which test is in which bin for each model
         self.model_trained = [0 for _ in range(self.N_models)]                            # keeps track how many tests were generated when a model was previously trained
@@ -121,6 +132,7 @@ class WOGAN(Algorithm):
                 alpha = (self.shift_function_parameters["initial"] - self.shift_function_parameters["final"])/budget_remaining
                 beta = self.shift_function_parameters["final"]
                 self.shift = lambda x: alpha * x + beta
+                self.shift_coefficients = (alpha, beta)
 
         # Take into account how many tests a previous step (usually a random
         # search) has generated.
@@ -133,19 +145,18 @@ class WOGAN(Algorithm):
         idx = test_repository.indices if self.first_training else [test_repository.tests - 1]
         for i in range(self.N_models):
             for j in idx:
-                self.test_bins[i][self.get_bin(test_repository.get(j)[-1][i])].append(j)
+                self.test_bins[i][self.get_bin(test_repository.get_inputs_and_objectives(j)[-1][i])].append(j)
 
         # We train only the models corresponding to active outputs and only if
         # there has been enough delay since the last training. During the first
         # training, we ignore the delay.
         for i in active_outputs:
-            if self.first_training or tests_generated - self.model_trained[i] >= self.train_delay:
-                X, _, Y = test_repository.get()
+            if self.first_training or (self.training_effort > 0 and tests_generated - self.model_trained[i] >= self.train_delay):
+                X, Y = test_repository.get_inputs_and_objectives()
                 dataX = np.asarray([sut_input.inputs for sut_input in X])
                 dataY = np.array(Y)[:,i].reshape(-1, 1)
-                epochs = self.models[i].train_settings_init["epochs"] if self.first_training else self.models[i].train_settings["epochs"]
-                train_settings = self.models[i].train_settings_init if self.first_training else self.models[i].train_settings
-                for _ in range(epochs):
+                train_settings = self.scaled_train_settings(self.models[i].train_settings_init if self.first_training else self.models[i].train_settings)
+                for _ in range(train_settings["epochs"]):
                     self.log("Training analyzer {}...".format(i + 1))
                     losses = self.models[i].train_analyzer_with_batch(dataX,
                                                                       dataY,
@@ -165,12 +176,12 @@ class WOGAN(Algorithm):
                     latest = 0 if self.first_training else self.train_delay
                     c = 0
                     for j in range(latest):
-                        test, _, output = test_repository.get(test_repository.indices[-(j+1)])
+                        test, output = test_repository.get_inputs_and_objectives(test_repository.indices[-(j+1)])
                         if self.get_bin(output[i]) >= self.bin_sample(1, self.shift(budget_remaining))[0]:
                             train_X[c] = test.inputs
                             c += 1
                     train_X[c:] = self.training_sample(BS - c,
-                                                       np.asarray([sut_input.inputs for sut_input in test_repository.get()[0]]),
+                                                       np.asarray([sut_input.inputs for sut_input in test_repository.get_inputs_and_objectives()[0]]),
                                                        self.test_bins[i],
                                                        self.shift(budget_remaining),
                                                       )
@@ -186,6 +197,9 @@ class WOGAN(Algorithm):
         self.first_training = False
 
     def do_generate_next_test(self, active_outputs, test_repository, budget_remaining):
+        return self.do_generate_next_tests(1, active_outputs, test_repository, budget_remaining)[0]
+
+    def do_generate_next_tests(self, N, active_outputs, test_repository, budget_remaining):
         # We generate a new valid test as follows. For each active model, we
         # generate new tests using the model, discard invalid tests, and
         # estimate the corresponding objective function values. The test
@@ -201,13 +215,13 @@ class WOGAN(Algorithm):
         entry_count = 0 # this is to avoid comparing tests when two tests added to the heap have the same predicted objective
         N_generated = 0
         N_invalid = 0
+        N_duplicate = 0
         self.log("Generating using WOGAN models {}.".format(",".join(str(m + 1) for m in active_outputs)))
 
         # PerformanceRecordHandler for the current test.
         performance = test_repository.performance(test_repository.current_test)
 
         while True:
-            # TODO: Avoid selecting similar or same tests.
             for i in active_outputs:
                 while True:
                     # If we have already generated many tests and all have been
@@ -215,6 +229,8 @@ class WOGAN(Algorithm):
                     # will fix things.
                     if N_invalid >= self.invalid_threshold:
                         raise GenerationException("Could not generate a valid test within {} tests.".format(N_invalid))
+                    if self.duplicate_policy == "reject" and N_duplicate >= self.invalid_threshold:
+                        raise GenerationException("Could not generate a test which is not a near duplicate of an executed test within {} tests.".format(N_duplicate))
 
                     # Generate several tests and pick the one with best
                     # predicted objective function component. We do this as
@@ -232,9 +248,17 @@ class WOGAN(Algorithm):
                     if candidate_tests.shape[0] == 0:
                         continue
 
+                    # Handle near duplicates of executed tests.
+                    candidate_tests, penalty, duplicates = self.filter_duplicates(candidate_tests, test_repository)
+                    N_duplicate += duplicates
+                    if candidate_tests.shape[0] == 0:
+                        continue
+
                     # Estimate objective function values and add the tests
                     # to heap.
                     tests_predicted_objective = self.models[i].predict_objective(candidate_tests)
+                    if np.any(penalty > 0):
+                        tests_predicted_objective = np.minimum(1.0, tests_predicted_objective + penalty.reshape(-1, 1))
                     for j in range(tests_predicted_objective.shape[0]):
                         heapq.heappush(heap, (tests_predicted_objective[j,0], entry_count, i, candidate_tests[j]))
                         entry_count += 1
@@ -247,17 +271,19 @@ class WOGAN(Algorithm):
             # Check if the best predicted test is good enough.
             # Without eps we could get stuck if prediction is always 1.0.
             eps = 1e-4
-            if heap[0][0] - eps <= target_fitness: break
+            # When generating several tests, we also require that we have
+            # enough candidates.
+            if len(heap) >= N and heap[0][0] - eps <= target_fitness: break
 
         # Save information on how many tests needed to be generated etc.
         # -----------------------------------------------------------------
         performance.record("N_tests_generated", N_generated)
         performance.record("N_invalid_tests_generated", N_invalid)
+        performance.record("N_duplicate_tests_generated", N_duplicate)
 
-        best_test = heap[0][3]
-        best_model = heap[0][2]
-        best_estimated_objective = heap[0][0]
-
-        self.log("Chose test {} with predicted minimum objective {} on WGAN model {}. Generated total {} tests of which {} were invalid.".format(best_test, best_estimated_objective, best_model + 1, N_generated, N_invalid))
+        # Return the N tests with the best predicted objectives.
+        best = heapq.nsmallest(N, heap)
+        for estimated_objective, _, model, test in best:
+            self.log("Chose test {} with predicted minimum objective {} on WGAN model {}. Generated total {} tests of which {} were invalid.", test, estimated_objective, model + 1, N_generated, N_invalid)
 
-        return best_test
+        return [test for _, _, _, test in best]
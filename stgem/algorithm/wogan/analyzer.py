@@ -19,7 +19,7 @@ class Analyzer:
         self.device = device
 
         self.logger = logger
-        self.log = lambda s: self.logger.model.info(s) if logger is not None else None
+        self.log = lambda msg, *args, **kwargs: (self.logger("model", msg, *args, **kwargs) if logger is not None else None)
 
         self.modelA = None
 
@@ -24,7 +24,7 @@ class WOGAN_ModelSkeleton(ModelSkeleton):
 
         training_G = self.modelG.training
         # Generate uniform noise in [-1, 1].
-        noise = (2*torch.rand(size=(N, self.modelG.input_shape)) - 1).to(device)
+        noise = (2*torch.rand(size=(N, self.modelG.input_shape), generator=self.torch_rng) - 1).to(device)
         self.modelG.train(False)
         result = self.modelG(noise)
 
@@ -138,18 +138,19 @@ class WOGAN_Model(Model,WOGAN_ModelSkeleton):
         self.parameters["generator_mlm_parameters"]["output_shape"] = self.search_space.input_dimension
         self.parameters["critic_mlm_parameters"]["input_shape"] = self.search_space.input_dimension
 
-        # Load the specified analyzer and initialize it.
-        module = importlib.import_module("stgem.algorithm.wogan.analyzer")
-        analyzer_class = getattr(module, self.analyzer)
-        self.modelA = analyzer_class(parameters=self.analyzer_parameters)
-        self.modelA.setup(device=self.device, logger=self.logger)
+        with self.initialization_rng():
+            # Load the specified analyzer and initialize it.
+            module = importlib.import_module("stgem.algorithm.wogan.analyzer")
+            analyzer_class = getattr(module, self.analyzer)
+            self.modelA = analyzer_class(parameters=self.analyzer_parameters)
+            self.modelA.setup(device=self.device, logger=self.logger)
 
-        # Load the specified generator and critic and initialize them.
-        module = importlib.import_module("stgem.algorithm.wogan.mlm")
-        generator_class = getattr(module, self.generator_mlm)
-        critic_class = getattr(module, self.critic_mlm)
-        self.modelG = generator_class(**self.generator_mlm_parameters).to(self.device)
-        self.modelC = critic_class(**self.critic_mlm_parameters).to(self.device)
+            # Load the specified generator and critic and initialize them.
+            module = importlib.import_module("stgem.algorithm.wogan.mlm")
+            generator_class = getattr(module, self.generator_mlm)
+            critic_class = getattr(module, self.critic_mlm)
+            self.modelG = generator_class(**self.generator_mlm_parameters).to(self.device)
+            self.modelC = critic_class(**self.critic_mlm_parameters).to(self.device)
 
         # Load the specified optimizers.
         module = importlib.import_module("torch.optim")
@@ -270,14 +271,14 @@ class WOGAN_Model(Model,WOGAN_ModelSkeleton):
 
             # Loss on generated data.
             # For now we use as much generated data as we have real data.
-            noise = (2*torch.rand(size=(M, self.modelG.input_shape)) - 1).to(self.device)
+            noise = (2*torch.rand(size=(M, self.modelG.input_shape), generator=self.torch_rng) - 1).to(self.device)
             fake_inputs = self.modelG(noise)
             fake_outputs = self.modelC(fake_inputs)
             fake_loss = fake_outputs.mean(0)
 
             # Gradient penalty.
             # Compute interpolated data.
-            e = torch.rand(size=(M, 1)).to(self.device)
+            e = torch.rand(size=(M, 1), generator=self.torch_rng).to(self.device)
             interpolated_inputs = e * real_inputs + (1 - e) * fake_inputs
             # Get critic output on interpolated data.
             interpolated_outputs = self.modelC(interpolated_inputs)
@@ -319,7 +320,7 @@ class WOGAN_Model(Model,WOGAN_ModelSkeleton):
         G_losses = []
         noise_batch_size = self.noise_batch_size
         for m in range(generator_steps):
-            noise = (2*torch.rand(size=(noise_batch_size, self.modelG.input_shape)) - 1).to(self.device)
+            noise = (2*torch.rand(size=(noise_batch_size, self.modelG.input_shape), generator=self.torch_rng) - 1).to(self.device)
             outputs = self.modelC(self.modelG(noise))
 
             G_loss = -outputs.mean(0)
@@ -341,7 +342,7 @@ class WOGAN_Model(Model,WOGAN_ModelSkeleton):
             real_loss = real_outputs.mean(0)
 
             # For now we use as much generated data as we have real data.
-            noise = (2*torch.rand(size=(real_inputs.shape[0], self.modelG.input_shape)) - 1).to(self.device)
+            noise = (2*torch.rand(size=(real_inputs.shape[0], self.modelG.input_shape), generator=self.torch_rng) - 1).to(self.device)
             fake_inputs = self.modelG(noise)
             fake_outputs = self.modelC(fake_inputs)
             fake_loss = fake_outputs.mean(0)
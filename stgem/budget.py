@@ -47,6 +47,22 @@ class Budget:
             else:
                 self.budget_ranges[name][1] = budget_threshold[name]
 
+    def get_state(self):
+        """Return the consumed quantities and the budget ranges for a
+        checkpoint. The elapsed wall time is saved instead of the starting
+        time."""
+
+        return {
+            "quantities": dict(self.quantities),
+            "budget_ranges": {name: list(r) for name, r in self.budget_ranges.items()},
+            "wall_time": time.perf_counter() - self.initial_wall_time if self.initial_wall_time >= 0 else None
+        }
+
+    def set_state(self, state):
+        self.quantities.update(state["quantities"])
+        self.budget_ranges.update({name: list(r) for name, r in state["budget_ranges"].items()})
+        self.initial_wall_time = time.perf_counter() - state["wall_time"] if state["wall_time"] is not None else -1
+
     def remaining(self):
         """Return the minimum amount of budget left among all budget as a
         number in [0,1]."""
@@ -77,6 +93,15 @@ class Budget:
 
         return result
 
+    def remaining_quantity(self, name):
+        """Return how much is left of the given budget in its own units (for
+        example, the number of executions left)."""
+
+        if not name in self.budget_ranges:
+            self.budget_ranges[name] = [0,math.inf]
+
+        return self.budget_ranges[name][1] - self.budgets[name](self.quantities)
+
     def _consume(self, quantity, value=1):
         if quantity in self.quantities:
             self.quantities[quantity] += value
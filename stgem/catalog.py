@@ -0,0 +1,219 @@
+"""
+A catalog of result files for fast experiment analysis.
+
+Analyzing an experiment typically requires only a couple of numbers per
+replica (was the replica successful, when was the first falsification found,
+how much time was used etc.), but obtaining these numbers from the result
+files requires unpickling full test repositories. A ResultCatalog scans a
+directory of result files once (in parallel) and stores a compact summary of
+each replica into a JSON file. On subsequent scans, only new or modified
+result files are summarized, and summaries of removed files are dropped.
+"""
+
+import json, os
+
+from stgem.generator import STGEMResult
+
+def result_times(result):
+    """Return the totals of execution, generation, and training times of the
+    tests of the given STGEMResult."""
+
+    times = {"execution_time": 0, "generation_time": 0, "training_time": 0}
+    for i in range(result.test_repository.tests):
+        performance = result.test_repository.performance(i)
+        for key in times:
+            try:
+                times[key] += float(performance.obtain(key))
+            except:
+                pass
+
+    return times
+
+class ReplicaSummary:
+    """Summary of a single replica (an STGEMResult). Low-fidelity tests (see
+    MultiFidelitySearch) are not included in the test indices and the
+    minimum curves."""
+
+    def __init__(self, file_name, mtime, size, description, sut_name, seed, timestamp, success, tests, first_falsification, min_curves, times):
+        self.file_name = file_name                     # Path relative to the catalog directory.
+        self.mtime = mtime                             # Modification time of the file (ns).
+        self.size = size                               # Size of the file.
+        self.description = description
+        self.sut_name = sut_name
+        self.seed = seed
+        self.timestamp = timestamp
+        self.success = success                         # True if some step was successful.
+        self.tests = tests                             # Number of tests in the repository.
+        self.first_falsification = first_falsification # Index of the first test with objective <= 0 or None.
+        self.min_curves = min_curves                   # For each objective, the minimum observed so far.
+        self.times = times                             # Totals of execution, generation, and training times.
+
+    @property
+    def min_curve(self):
+        """The minimum over all objectives observed so far."""
+
+        if len(self.min_curves) == 0:
+            return []
+        return [min(values) for values in zip(*self.min_curves)]
+
+    @property
+    def total_time(self):
+        return sum(self.times.values())
+
+    @staticmethod
+    def _is_low_fidelity(performance):
+        try:
+            return performance.obtain("fidelity") == "low"
+        except:
+            return False
+
+    @staticmethod
+    def from_result(result, file_name="", mtime=0, size=0):
+        # Low-fidelity tests (see MultiFidelitySearch) are ignored.
+        test_repository = result.test_repository
+        indices = [i for i in test_repository.indices if not ReplicaSummary._is_low_fidelity(test_repository.performance(i))]
+        _, Y = test_repository.get_inputs_and_objectives(indices)
+
+        first_falsification = None
+        for i in range(len(Y)):
+            if min(Y[i]) <= 0.0:
+                first_falsification = i
+                break
+
+        N_objectives = len(Y[0]) if len(Y) > 0 else 0
+        min_curves = []
+        for j in range(N_objectives):
+            m = float("inf")
+            curve = []
+            for y in Y:
+                m = min(m, float(y[j]))
+                curve.append(m)
+            min_curves.append(curve)
+
+        return ReplicaSummary(file_name=file_name,
+                              mtime=mtime,
+                              size=size,
+                              description=result.description,
+                              sut_name=result.sut_name,
+                              seed=result.seed,
+                              timestamp=str(result.timestamp),
+                              success=any(step.success for step in result.step_results),
+                              tests=result.test_repository.tests,
+                              first_falsification=first_falsification,
+                              min_curves=min_curves,
+                              times=result_times(result))
+
+    def to_dict(self):
+        return dict(self.__dict__)
+
+    @staticmethod
+    def from_dict(d):
+        return ReplicaSummary(**d)
+
+def _summarize_file(args):
+    path, file_name, mtime, size = args
+    try:
+        result = STGEMResult.restore_from_file(os.path.join(path, file_name))
+    except Exception as err:
+        return file_name, None, str(err)
+
+    return file_name, ReplicaSummary.from_result(result, file_name, mtime, size).to_dict(), None
+
+class ResultCatalog:
+    """A catalog of the result files found under the given directory
+    (including subdirectories). By default the catalog is stored in the file
+    stgem_catalog.json in the directory."""
+
+    default_catalog_file = "stgem_catalog.json"
+    result_file_extensions = [".pickle", ".pickle.gz", ".pickle.bz2", ".pickle.xz"]
+
+    def __init__(self, path, catalog_file=None):
+        if not os.path.exists(path):
+            raise Exception("No path '{}'.".format(path))
+
+        self.path = path
+        self.catalog_file = os.path.join(path, self.default_catalog_file) if catalog_file is None else catalog_file
+        self.summaries = {}
+        self.errors = {}
+
+        if os.path.exists(self.catalog_file):
+            with open(self.catalog_file) as file:
+                data = json.load(file)
+            self.summaries = {k: ReplicaSummary.from_dict(v) for k, v in data["summaries"].items()}
+
+    def _result_files(self):
+        files = {}
+        for dir, subdirs, file_names in os.walk(self.path):
+            for file_name in file_names:
+                if not any(file_name.endswith(extension) for extension in self.result_file_extensions):
+                    continue
+                full_name = os.path.join(dir, file_name)
+                stat = os.stat(full_name)
+                files[os.path.relpath(full_name, self.path)] = (stat.st_mtime_ns, stat.st_size)
+
+        return files
+
+    def update(self, N_workers=None):
+        """Summarize new and modified result files and drop summaries of
+        removed files. The result files are unpickled in N_workers parallel
+        processes (default: the number of CPUs). Returns the number of newly
+        summarized files."""
+
+        files = self._result_files()
+
+        for file_name in list(self.summaries):
+            if not file_name in files:
+                del self.summaries[file_name]
+
+        jobs = []
+        for file_name, (mtime, size) in files.items():
+            summary = self.summaries.get(file_name)
+            if summary is None or summary.mtime != mtime or summary.size != size:
+                jobs.append((self.path, file_name, mtime, size))
+
+        if N_workers is None:
+            N_workers = os.cpu_count() or 1
+        N_workers = max(1, min(N_workers, len(jobs)))
+
+        if N_workers == 1:
+            summarized = [_summarize_file(job) for job in jobs]
+        else:
+            from multiprocess import Pool
+
+            with Pool(N_workers) as pool:
+                summarized = pool.map(_summarize_file, jobs)
+
+        self.errors = {}
+        for file_name, summary, error in summarized:
+            if summary is None:
+                self.errors[file_name] = error
+            else:
+                self.summaries[file_name] = ReplicaSummary.from_dict(summary)
+
+        self.save()
+
+        return len(summarized) - len(self.errors)
+
+    def save(self):
+        temp_file_name = "{}.tmp".format(self.catalog_file)
+        with open(temp_file_name, "w") as file:
+            json.dump({"summaries": {k: v.to_dict() for k, v in self.summaries.items()}}, file)
+        os.replace(temp_file_name, self.catalog_file)
+
+    def query(self, prefix="", subdirectory=None, description=None):
+        """Return the summaries of the replicas whose file name begins with the
+        given prefix. The search can be restricted to a subdirectory of the
+        catalog directory or to a given STGEM description."""
+
+        results = []
+        for file_name in sorted(self.summaries):
+            summary = self.summaries[file_name]
+            if not os.path.basename(file_name).startswith(prefix):
+                continue
+            if subdirectory is not None and not file_name.startswith(os.path.join(subdirectory, "")):
+                continue
+            if description is not None and summary.description != description:
+                continue
+            results.append(summary)
+
+        return results
@@ -0,0 +1,546 @@
+import gc, importlib, json, os, queue, time, traceback
+from collections import deque
+import multiprocess
+
+from stgem.catalog import result_times
+from stgem.experiment.metrics import ExperimentMetrics
+from stgem.logger import JSONLinesSink, LogListener, QueueSink
+from stgem.storage import attach_shared, export_shared
+
+"""
+Notice that the callbacks need to understand that calls can arrive out of
+order.
+
+The result callback is called with three parameters idx, result, done. The
+variable idx indicates the index of the replica that has just been completed
+and the result variable contains the SUTResult corresponding to this replica.
+The list done indicates what other replicas have completed before, that is,
+it is a list of complete replicas without the current index.
+
+If the result callback writes the results using a ResultWriter (see
+stgem.result_writer), the writer should be given to the Experiment which then
+waits for all pending results to be written at the end of run().
+
+If a log file is given to run(), the log records of all replicas are written
+into it as JSON lines. With several workers, the records are sent to the
+parent process via a queue, so the lines of different workers do not mix.
+
+By default, stgem_factory is called without arguments for each replica and,
+with several workers, the complete STGEM object (SUT included) is pickled to a
+worker which sets the SUT up again. For SUTs whose setup is expensive (such as
+Matlab models), a worker_initializer can be given instead. It is called once
+in each worker (or once in total with a single worker) and returns a SUT
+which is reused for all replicas of the worker. The workers then receive only
+the replica index and seed, and they call stgem_factory(sut) to build each
+generator around their own SUT. The SUT is reset (see SUT.reset) before each
+replica. In this case, stgem_factory is not called for replicas which are
+already done.
+
+With several workers, the results are sent to the parent process through a
+queue by default (result_transfer="queue"), which copies every signal through
+a pipe. With result_transfer="shared", a worker writes its result into a file
+in shared memory (see stgem.storage.export_shared) and sends only the file
+name. The parent maps the file, and the arrays of the result use the mapped
+memory without copying.
+
+The state of each replica (pending, running, done, or failed) and its seed
+are kept in a ReplicaManifest. If a manifest file is given to run(), the
+manifest is saved after each change, and a later run with the same manifest
+file skips the replicas which are done. Thus an interrupted experiment is
+resumed simply by running it again. A replica fails if its generator raises
+an exception, if its worker process dies (for example, due to a segmentation
+fault in a simulator), or if it runs longer than replica_timeout seconds. A
+dead or timed out worker is replaced by a new one. A failed replica is
+retried up to retries times with a new generator from stgem_factory but with
+its original seed. Replicas that still fail are marked failed in the manifest
+and an exception is raised once all other replicas have finished. Failed
+replicas are tried again when the experiment is resumed.
+
+By default, torch and the BLAS libraries of each worker use as many threads
+as there are cores, so several workers training small models oversubscribe
+the CPU. If threads is given to run(), this total budget of threads is
+divided evenly among the workers (see thread_budget and set_thread_budget).
+With pin_workers=True, each worker is also pinned to its own cores (Linux
+only).
+
+The worker processes are started with the given multiprocessing start method
+("fork", "spawn", or "forkserver"). CUDA cannot be used in forked processes
+once it has been initialized, so by default the workers are spawned if CUDA
+is available and forked otherwise. Notice that with "spawn" and "forkserver",
+the main module of the program must be importable without side effects (use
+an if __name__ == "__main__" guard). The parent process does not set up any
+generator, so torch initializes its devices only in the workers. The device
+of each worker can be given with devices, a list of torch devices or strings
+(such as ["cuda:0", "cuda:1", "cpu"]) assigned to the workers in turn;
+otherwise use_gpu decides the device (see STGEM.setup).
+
+While an experiment runs, its throughput metrics (worker utilization, queue
+waits, and the time spent in each phase of each replica) are collected into
+Experiment.metrics, an ExperimentMetrics object (see stgem.experiment.metrics)
+which is saved into metrics_file if given. Use Experiment.metrics.summary() to
+see how busy the workers were when choosing the number of workers.
+
+Starting a worker means importing torch, the algorithms, the SUT modules etc.
+anew, which can take a large share of the time of short replicas. If preload
+is given to run(), it is a list of module names (such as ["__main__"] or
+["problems.odroid.preload"]) which are imported once into a template process,
+the fork server, from which all workers are forked ("forkserver" is then the
+default start method). The modules can also load static data with
+preloaded(key, loader), for example, a SUT can use preloaded to load its data
+tables, so that the forked workers inherit the data instead of loading it
+again. The preloaded modules must not initialize CUDA. Notice that there is a
+single fork server per process and that the list of modules to be preloaded
+has no effect once the server has started. With other start methods, the
+modules are imported into the parent process, which benefits forked workers.
+"""
+
+# Objects loaded by preloaded in this process.
+_preloaded = {}
+
+def preloaded(key, loader):
+    """Return the object returned by loader() and store it under the given key
+    in the current process, so loader is called only once per process. Objects
+    loaded in the fork server or in the parent process before the workers are
+    forked are inherited by the workers (see Experiment.run)."""
+
+    if not key in _preloaded:
+        _preloaded[key] = loader()
+    return _preloaded[key]
+
+# Environment variables read by the BLAS and OpenMP libraries when they are
+# loaded.
+thread_variables = ["OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "BLIS_NUM_THREADS", "VECLIB_MAXIMUM_THREADS", "NUMEXPR_NUM_THREADS"]
+
+def available_cores():
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+def thread_budget(N_workers, threads=None, pin=False):
+    """Divide the total budget of threads (default: the number of available
+    cores) evenly among N_workers workers. Returns a list of pairs (threads,
+    cores) where cores is the list of cores of the worker if pin is True and
+    None otherwise."""
+
+    cores = available_cores()
+    if threads is None:
+        threads = len(cores)
+    if threads < 1:
+        raise ValueError("The thread budget must be positive.")
+
+    per_worker = max(1, threads // N_workers)
+    budget = []
+    for i in range(N_workers):
+        worker_cores = sorted(set(cores[(i*per_worker + j) % len(cores)] for j in range(per_worker))) if pin else None
+        budget.append((per_worker, worker_cores))
+
+    return budget
+
+def set_thread_budget(threads, cores=None):
+    """Limit the threads of torch and the BLAS libraries of the current
+    process and pin it to the given cores (if any). The BLAS libraries already
+    loaded are limited only if the optional package threadpoolctl is
+    installed; otherwise the limit applies to libraries loaded later, for
+    example, in spawned processes."""
+
+    for name in thread_variables:
+        os.environ[name] = str(threads)
+
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(limits=threads)
+    except ImportError:
+        pass
+
+    import torch
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(threads)
+    except RuntimeError:
+        # This can be set only before any inter-op parallel work.
+        pass
+
+    if cores is not None and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+
+class ReplicaManifest:
+    """The states of the replicas of an experiment. If file_name is given, the
+    manifest is loaded from the file if it exists and saved into it (as JSON)
+    after each change."""
+
+    states = ["pending", "running", "done", "failed"]
+
+    def __init__(self, N, file_name=None):
+        self.N = N
+        self.file_name = file_name
+        self.replicas = {idx: {"state": "pending", "seed": None, "attempts": 0, "error": None} for idx in range(N)}
+
+        if file_name is not None and os.path.exists(file_name):
+            with open(file_name) as file:
+                data = json.load(file)
+            if data["N"] != N:
+                raise Exception("The manifest '{}' is for {} replicas, not {}.".format(file_name, data["N"], N))
+            for idx, replica in data["replicas"].items():
+                # Replicas left running were interrupted.
+                if replica["state"] == "running":
+                    replica["state"] = "pending"
+                self.replicas[int(idx)] = replica
+
+    def __getitem__(self, idx):
+        return self.replicas[idx]
+
+    def indices(self, state):
+        return [idx for idx in range(self.N) if self.replicas[idx]["state"] == state]
+
+    def update(self, idx, **fields):
+        if "state" in fields and not fields["state"] in self.states:
+            raise Exception("Unknown replica state '{}'.".format(fields["state"]))
+
+        self.replicas[idx].update(fields)
+        self.save()
+
+    def save(self):
+        if self.file_name is None: return
+
+        temp_file_name = "{}.tmp".format(self.file_name)
+        with open(temp_file_name, "w") as file:
+            json.dump({"N": self.N, "replicas": {str(idx): replica for idx, replica in self.replicas.items()}}, file, indent=1)
+        os.replace(temp_file_name, self.file_name)
+
+def _run_generator(generator, seed, use_gpu, device, silent, generator_callback, log_sink, timing=None):
+    """Set up and run the given generator. If timing is a dictionary, the
+    times of the setup and run phases (see stgem.experiment.metrics) are
+    added to it."""
+
+    start = time.perf_counter()
+    if log_sink is not None:
+        generator.logger.sink = log_sink
+
+    generator.setup(seed=seed, use_gpu=use_gpu, device=device)
+
+    if silent:
+        generator.logger.silent = True
+
+    if not generator_callback is None:
+        generator_callback(generator)
+
+    setup_finished = time.perf_counter()
+    r = generator._run()
+
+    if timing is not None:
+        run_time = time.perf_counter() - setup_finished
+        times = result_times(r)
+        timing["setup"] = timing.get("setup", 0.0) + setup_finished - start
+        timing["execution"] = times["execution_time"]
+        timing["generation"] = times["generation_time"]
+        timing["training"] = times["training_time"]
+        timing["other"] = max(0.0, run_time - sum(times.values()))
+
+    return r
+
+def _worker(worker_id, queue_jobs, queue_results, queue_log, silent, use_gpu, device, generator_callback, worker_initializer, stgem_factory, result_transfer, garbage_collect, budget):
+    if budget is not None:
+        set_thread_budget(*budget)
+
+    # The SUT of the worker is built once and reused.
+    start = time.perf_counter()
+    sut = worker_initializer() if worker_initializer is not None else None
+    initialize_time = time.perf_counter() - start
+
+    while True:
+        wait_start = time.time()
+        msg = queue_jobs.get()
+        if msg == "STOP": break
+
+        idx, generator, seed = msg
+        # The time of receiving the job and the time of sending the result
+        # are absolute, so that the parent can compute the dispatch and
+        # transfer times.
+        timing = {"received": time.time(), "initialize": initialize_time}
+        timing["job_wait"] = timing["received"] - wait_start
+        initialize_time = 0.0
+        try:
+            if generator is None:
+                start = time.perf_counter()
+                sut.reset()
+                generator = stgem_factory(sut)
+                timing["setup"] = time.perf_counter() - start
+
+            r = _run_generator(generator, seed, use_gpu, device, silent, generator_callback, QueueSink(queue_log) if queue_log is not None else None, timing)
+            timing["sent"] = time.time()
+            queue_results.put(("done", worker_id, idx, export_shared(r) if result_transfer == "shared" else r, timing))
+            del r
+        except Exception:
+            timing["sent"] = time.time()
+            queue_results.put(("failed", worker_id, idx, traceback.format_exc(), timing))
+
+        # Delete and garbage collect. See Experiment.run.
+        generator = None
+        if garbage_collect:
+            gc.collect()
+
+class Experiment:
+
+    def __init__(self, N, stgem_factory, seed_factory, generator_callback=None, result_callback=None, result_writer=None, worker_initializer=None):
+        self.N = N
+        self.stgem_factory = stgem_factory
+        self.seed_factory = seed_factory
+        self.worker_initializer = worker_initializer
+        self.generator_callback = generator_callback
+        self.result_callback = result_callback
+        self.result_writer = result_writer
+        # This is because the CI pipeline gets a segmentation fault for calling
+        # garbage collection for some reason.
+        self.garbage_collect = True
+        self.manifest = None
+        self.metrics = None
+
+    def _jobs(self, manifest):
+        """Yield the replicas to be run as triples (idx, generator, seed). The
+        factories are called for all replicas in order, so their state does
+        not depend on which replicas are done. The generator is None if a
+        worker initializer is used."""
+
+        for idx in range(self.N):
+            generator = self.stgem_factory() if self.worker_initializer is None else None
+            seed = self.seed_factory()
+            if manifest[idx]["state"] == "done": continue
+
+            # A resumed replica keeps its original seed.
+            if manifest[idx]["seed"] is None:
+                manifest.update(idx, seed=seed)
+            yield idx, generator, manifest[idx]["seed"]
+
+    def _retry_job(self, idx, manifest):
+        return idx, self.stgem_factory() if self.worker_initializer is None else None, manifest[idx]["seed"]
+
+    def _replica_failed(self, idx, error, manifest, attempts, retries, retry_jobs, failed, worker_id, timing):
+        """Record a failed attempt of a replica and schedule a retry if
+        possible."""
+
+        self.metrics.replica_finished(idx, worker_id, "failed", timing, manifest[idx]["attempts"])
+        attempts[idx] = attempts.get(idx, 0) + 1
+        if attempts[idx] <= retries:
+            manifest.update(idx, state="pending", error=error)
+            retry_jobs.append(self._retry_job(idx, manifest))
+        else:
+            manifest.update(idx, state="failed", error=error)
+            failed.append(idx)
+
+    def _result_callback(self, idx, r, done):
+        if not self.result_callback is None:
+            self.result_callback(idx, r, done)
+
+    def _replica_done(self, idx, r, manifest, done, started, worker_id, timing):
+        start = time.perf_counter()
+        self._result_callback(idx, r, done)
+        timing["callback"] = time.perf_counter() - start
+        done.append(idx)
+        manifest.update(idx, state="done", error=None, time=time.time() - started)
+        self.metrics.replica_finished(idx, worker_id, "done", timing, manifest[idx]["attempts"])
+
+    def run(self, N_workers=1, silent=False, use_gpu=True, log_file=None, result_transfer="queue", manifest_file=None, retries=0, replica_timeout=None, poll_interval=1.0, threads=None, pin_workers=False, start_method=None, devices=None, metrics_file=None, preload=None):
+        if not result_transfer in ["queue", "shared"]:
+            raise Exception("Unknown result transfer method '{}'.".format(result_transfer))
+        if retries < 0:
+            raise ValueError("The number of retries cannot be negative.")
+        if devices is not None and len(devices) == 0:
+            raise ValueError("The list of devices cannot be empty.")
+
+        manifest = ReplicaManifest(self.N, manifest_file)
+        self.manifest = manifest
+        done = manifest.indices("done")
+        failed = []
+        attempts = {}
+        retry_jobs = deque()
+        jobs = self._jobs(manifest)
+
+        def next_job():
+            if len(retry_jobs) > 0:
+                return retry_jobs.popleft()
+            return next(jobs, None)
+
+        log_sink = JSONLinesSink(log_file) if log_file is not None else None
+
+        if N_workers < 1:
+            raise ValueError("The number of workers must be positive.")
+
+        budget = thread_budget(N_workers, threads, pin_workers) if threads is not None or pin_workers else None
+
+        metrics = ExperimentMetrics(N_workers, metrics_file)
+        self.metrics = metrics
+
+        if N_workers == 1:
+            # Do not use multiprocessing.
+            for name in preload if preload is not None else []:
+                importlib.import_module(name)
+            if budget is not None:
+                set_thread_budget(*budget[0])
+            metrics.worker_started(0, 0)
+            sut = None
+            while True:
+                job = next_job()
+                if job is None: break
+                idx, generator, seed = job
+
+                manifest.update(idx, state="running", attempts=manifest[idx]["attempts"] + 1)
+                started = time.time()
+                timing = {}
+                try:
+                    if self.worker_initializer is not None:
+                        start = time.perf_counter()
+                        if sut is None:
+                            sut = self.worker_initializer()
+                            timing["initialize"] = time.perf_counter() - start
+                            start = time.perf_counter()
+                        sut.reset()
+                        generator = self.stgem_factory(sut)
+                        timing["setup"] = time.perf_counter() - start
+
+                    r = _run_generator(generator, seed, use_gpu, devices[0] if devices is not None else None, silent, self.generator_callback, log_sink, timing)
+                except Exception:
+                    self._replica_failed(idx, traceback.format_exc(), manifest, attempts, retries, retry_jobs, failed, 0, timing)
+                else:
+                    self._replica_done(idx, r, manifest, done, started, 0, timing)
+                    del r
+
+                # Delete generator and force garbage collection. This is
+                # especially important when using Matleb SUTs as several
+                # Matlab instances take quite a lot of memory.
+                generator = None
+                if self.garbage_collect:
+                    gc.collect()
+        else:
+            # Use multiprocessing.
+            if start_method is None:
+                # A forked process cannot use CUDA initialized before the
+                # fork, but the fork server does not initialize CUDA.
+                if preload is not None and "forkserver" in multiprocess.get_all_start_methods():
+                    start_method = "forkserver"
+                else:
+                    import torch
+
+                    start_method = "spawn" if torch.cuda.is_available() or not "fork" in multiprocess.get_all_start_methods() else "fork"
+            context = multiprocess.get_context(start_method)
+
+            if preload is not None:
+                if start_method == "forkserver":
+                    context.set_forkserver_preload(list(preload))
+                else:
+                    for name in preload:
+                        importlib.import_module(name)
+
+            queue_results = context.Queue()
+            if log_sink is not None:
+                queue_log = context.Queue()
+                log_listener = LogListener(queue_log, log_sink)
+            else:
+                queue_log = None
+
+            # Each worker has its own job queue, so we know which replica each
+            # worker is running. For each worker id, we store the process, its
+            # job queue, the running replica and its start time (or None), and
+            # its slot in the thread budget. A replacement worker takes the
+            # slot of the worker it replaces.
+            workers = {}
+            worker_count = 0
+
+            def start_worker(slot):
+                nonlocal worker_count
+                worker_id = worker_count
+                worker_count += 1
+                queue_jobs = context.Queue()
+                device = devices[slot % len(devices)] if devices is not None else None
+                process = context.Process(target=_worker, args=[worker_id, queue_jobs, queue_results, queue_log, silent, use_gpu, device, self.generator_callback, self.worker_initializer, self.stgem_factory if self.worker_initializer is not None else None, result_transfer, self.garbage_collect, budget[slot] if budget is not None else None], daemon=True)
+                process.start()
+                workers[worker_id] = [process, queue_jobs, None, None, slot]
+                metrics.worker_started(worker_id, slot)
+
+            for slot in range(N_workers):
+                start_worker(slot)
+
+            def handle(msg):
+                status, worker_id, idx, payload, timing = msg
+                worker = workers.get(worker_id)
+                # Ignore messages of replaced workers.
+                if worker is None or worker[2] != idx: return
+                started = worker[3]
+                worker[2] = worker[3] = None
+
+                timing["dispatch"] = max(0.0, timing.pop("received") - started)
+                if status == "done":
+                    r = attach_shared(payload) if result_transfer == "shared" else payload
+                    timing["transfer"] = max(0.0, time.time() - timing.pop("sent"))
+                    self._replica_done(idx, r, manifest, done, started, worker_id, timing)
+                else:
+                    timing.pop("sent")
+                    self._replica_failed(idx, payload, manifest, attempts, retries, retry_jobs, failed, worker_id, timing)
+
+            while True:
+                # Hand out jobs to idle workers.
+                for worker in workers.values():
+                    if worker[2] is not None: continue
+                    job = next_job()
+                    if job is None: break
+                    idx = job[0]
+                    manifest.update(idx, state="running", attempts=manifest[idx]["attempts"] + 1)
+                    worker[1].put(job)
+                    worker[2] = idx
+                    worker[3] = time.time()
+
+                # If all workers are idle, no jobs are left.
+                if all(worker[2] is None for worker in workers.values()): break
+
+                wait_start = time.time()
+                try:
+                    msg = queue_results.get(timeout=poll_interval)
+                except queue.Empty:
+                    msg = None
+                metrics.waited(time.time() - wait_start)
+                if msg is not None:
+                    handle(msg)
+
+                # Check the liveness of the workers and replace dead and timed
+                # out workers.
+                for worker_id in list(workers):
+                    process, _, idx, started, slot = workers[worker_id]
+                    if not process.is_alive():
+                        # The worker may have sent its result before exiting.
+                        while True:
+                            try:
+                                handle(queue_results.get_nowait())
+                            except queue.Empty:
+                                break
+                        idx = workers[worker_id][2]
+                        error = "The worker process died with exit code {}.".format(process.exitcode)
+                    elif idx is not None and replica_timeout is not None and time.time() - started > replica_timeout:
+                        process.terminate()
+                        process.join()
+                        error = "The replica timed out after {} seconds.".format(replica_timeout)
+                    else:
+                        continue
+
+                    del workers[worker_id]
+                    metrics.worker_stopped(worker_id)
+                    start_worker(slot)
+                    if idx is not None:
+                        self._replica_failed(idx, error, manifest, attempts, retries, retry_jobs, failed, worker_id, {})
+
+            for process, queue_jobs, _, _, _ in workers.values():
+                queue_jobs.put("STOP")
+            for process, _, _, _, _ in workers.values():
+                process.join()
+
+            if log_sink is not None:
+                log_listener.stop()
+
+        if log_sink is not None:
+            log_sink.close()
+
+        if not self.result_writer is None:
+            self.result_writer.flush()
+
+        metrics.finish()
+
+        if len(failed) > 0:
+            raise Exception("The replicas {} failed. See the manifest for the errors.".format(", ".join(str(idx) for idx in sorted(failed))))
@@ -0,0 +1,246 @@
+"""
+Running experiments on several hosts.
+
+A JobBroker listens on a TCP address and hands out jobs to workers which
+connect to it, possibly from other hosts. A job is any picklable object
+describing a replica, typically a tuple (benchmark, specification, seed), so
+that the workers, which have the benchmark code available locally, build and
+run the generators themselves. A worker (see run_worker) repeatedly asks the
+broker for a job, runs it with its job runner function, and sends the result
+back compressed with one of the codecs of stgem.storage. The broker calls its
+result callback for each result in the broker process.
+
+The connections are authenticated with a shared key (see
+multiprocessing.connection), which must be kept secret: the messages are
+pickles and unpickling data from an untrusted peer allows arbitrary code
+execution. The messages are not encrypted.
+
+Job states are tracked in a ReplicaManifest exactly as in Experiment. If a
+worker disconnects (for example, because it crashed) while running a job or
+a job runs longer than job_timeout seconds, the job fails and is retried up
+to retries times on another worker. A late result of a timed out job is
+ignored. With a manifest file, the jobs that are done are skipped when the
+broker is started again.
+"""
+
+import io, socket, threading, time, traceback
+from multiprocessing.connection import Client, Listener
+
+import dill as pickle
+
+from stgem.experiment import ReplicaManifest
+from stgem.storage import compression_codecs
+
+def _send(connection, message):
+    connection.send_bytes(pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL))
+
+def _receive(connection):
+    return pickle.loads(connection.recv_bytes())
+
+def compress_result(result, codec="gzip", level=None):
+    """Return the given result pickled and compressed with the given codec."""
+
+    data = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+    if codec == "none":
+        return data
+    if level is None:
+        level = compression_codecs[codec][3]
+    return compression_codecs[codec][2](data, level)
+
+def decompress_result(data, codec="gzip"):
+    if codec != "none":
+        with compression_codecs[codec][1](io.BytesIO(data), "rb") as file:
+            data = file.read()
+    return pickle.loads(data)
+
+class JobBroker:
+    """Hands out the given jobs to workers connecting to the given address
+    (host, port) with the given authentication key (bytes). Port 0 selects a
+    free port; see the attribute address. The result callback is called as
+    result_callback(idx, job, result) where idx is the index of the job."""
+
+    def __init__(self, jobs, authkey, address=("localhost", 0), result_callback=None, manifest_file=None, retries=0, job_timeout=None, poll_interval=1.0):
+        if retries < 0:
+            raise ValueError("The number of retries cannot be negative.")
+
+        self.jobs = list(jobs)
+        self.result_callback = result_callback
+        self.retries = retries
+        self.job_timeout = job_timeout
+        self.poll_interval = poll_interval
+
+        self.manifest = ReplicaManifest(len(self.jobs), manifest_file)
+        self.pending = self.manifest.indices("pending") + self.manifest.indices("failed")
+        self.running = {}  # Job index -> (connection id, start time).
+        self.failed = []
+        self._attempts = {}
+        self._connections = 0
+        self._lock = threading.Condition()
+        # Result callbacks are called one at a time.
+        self._callback_lock = threading.Lock()
+
+        self.listener = Listener(address, authkey=authkey)
+        self.address = self.listener.address
+        self._accept_thread = None
+        self._closed = False
+
+    @property
+    def finished(self):
+        with self._lock:
+            return len(self.pending) == 0 and len(self.running) == 0
+
+    def _job_failed(self, idx, error):
+        # Call with the lock held.
+        if not idx in self.running: return
+        del self.running[idx]
+        self._attempts[idx] = self._attempts.get(idx, 0) + 1
+        if self._attempts[idx] <= self.retries:
+            self.manifest.update(idx, state="pending", error=error)
+            self.pending.append(idx)
+        else:
+            self.manifest.update(idx, state="failed", error=error)
+            self.failed.append(idx)
+        self._lock.notify_all()
+
+    def _next_job(self, connection_id):
+        """Return the message to be sent to a worker asking for a job."""
+
+        with self._lock:
+            if len(self.pending) > 0:
+                idx = self.pending.pop(0)
+                self.running[idx] = (connection_id, time.time())
+                self.manifest.update(idx, state="running", attempts=self.manifest[idx]["attempts"] + 1, job=repr(self.jobs[idx]))
+                return ("job", idx, self.jobs[idx])
+            if len(self.running) > 0:
+                # A running job may fail and be retried.
+                return ("wait", self.poll_interval)
+            return ("stop",)
+
+    def _serve_connection(self, connection, connection_id):
+        try:
+            while True:
+                message = _receive(connection)
+                if message[0] == "get":
+                    _send(connection, self._next_job(connection_id))
+                elif message[0] in ["done", "failed"]:
+                    _, idx, payload, codec = message
+                    with self._lock:
+                        # Ignore results of jobs which have timed out.
+                        if self.running.get(idx, (None,))[0] != connection_id: continue
+                    if message[0] == "done":
+                        try:
+                            result = decompress_result(payload, codec)
+                            if self.result_callback is not None:
+                                with self._callback_lock:
+                                    self.result_callback(idx, self.jobs[idx], result)
+                        except Exception:
+                            with self._lock:
+                                self._job_failed(idx, traceback.format_exc())
+                            continue
+                        with self._lock:
+                            if self.running.get(idx, (None,))[0] != connection_id: continue
+                            started = self.running.pop(idx)[1]
+                            self.manifest.update(idx, state="done", error=None, time=time.time() - started)
+                            self._lock.notify_all()
+                    else:
+                        with self._lock:
+                            self._job_failed(idx, payload)
+                else:
+                    raise Exception("Unknown message '{}'.".format(message[0]))
+        except (EOFError, OSError):
+            pass
+        finally:
+            connection.close()
+            with self._lock:
+                for idx in [idx for idx, (owner, _) in self.running.items() if owner == connection_id]:
+                    self._job_failed(idx, "The worker disconnected.")
+
+    def _accept(self):
+        while not self._closed:
+            try:
+                connection = self.listener.accept()
+            except Exception:
+                # For example, an authentication failure or the wake-up
+                # connection of close.
+                continue
+            if self._closed:
+                connection.close()
+                break
+
+            with self._lock:
+                connection_id = self._connections
+                self._connections += 1
+            threading.Thread(target=self._serve_connection, args=[connection, connection_id], daemon=True).start()
+
+    def start(self):
+        """Start accepting workers in a background thread."""
+
+        if self._accept_thread is None:
+            self._accept_thread = threading.Thread(target=self._accept, daemon=True)
+            self._accept_thread.start()
+
+    def serve(self):
+        """Accept workers until all jobs are done or have failed. Raises an
+        exception if some jobs failed."""
+
+        self.start()
+        with self._lock:
+            while len(self.pending) > 0 or len(self.running) > 0:
+                self._lock.wait(timeout=self.poll_interval)
+                if self.job_timeout is not None:
+                    now = time.time()
+                    for idx in [idx for idx, (_, started) in self.running.items() if now - started > self.job_timeout]:
+                        self._job_failed(idx, "The job timed out after {} seconds.".format(self.job_timeout))
+
+        # Connected workers are still served and told to stop.
+        self.close()
+
+        if len(self.failed) > 0:
+            raise Exception("The jobs {} failed. See the manifest for the errors.".format(", ".join(str(idx) for idx in sorted(self.failed))))
+
+    def close(self):
+        """Stop accepting new workers. Connected workers are still served."""
+
+        if self._closed: return
+        self._closed = True
+        if self._accept_thread is not None:
+            # Wake up the accepting thread.
+            try:
+                socket.create_connection(self.address, timeout=self.poll_interval).close()
+            except OSError:
+                pass
+            self._accept_thread.join()
+        self.listener.close()
+
+def run_worker(address, authkey, job_runner, codec="gzip", level=None):
+    """Connect to the broker at the given address and run jobs until the
+    broker has no more jobs. The function job_runner is called with a job and
+    it should return an STGEMResult. Returns the number of jobs run."""
+
+    connection = Client(tuple(address), authkey=authkey)
+    jobs_run = 0
+    try:
+        while True:
+            _send(connection, ("get",))
+            message = _receive(connection)
+            if message[0] == "stop":
+                break
+            if message[0] == "wait":
+                time.sleep(message[1])
+                continue
+
+            _, idx, job = message
+            try:
+                payload = compress_result(job_runner(job), codec, level)
+            except Exception:
+                _send(connection, ("failed", idx, traceback.format_exc(), None))
+            else:
+                _send(connection, ("done", idx, payload, codec))
+            jobs_run += 1
+    except (EOFError, OSError):
+        # The broker has finished.
+        pass
+    finally:
+        connection.close()
+
+    return jobs_run
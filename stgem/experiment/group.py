@@ -0,0 +1,121 @@
+"""
+Running several experiments on a single pool of workers.
+
+Replicas of different experiments (for example, different specifications or
+benchmarks) often take very different times. When the experiments are run one
+after another, the workers idle at the end of each experiment waiting for its
+longest replicas. An ExperimentGroup runs the replicas of all its experiments
+on the same workers, so the workers are kept busy until all experiments are
+done.
+
+The replicas are handed out in the order of decreasing expected duration
+(longest processing time first), which keeps the long replicas from being
+left last. The expected duration of a replica of an experiment can be
+given directly or it can be estimated from the replicas of earlier runs of
+the experiment found in a result catalog (see expected_duration and
+stgem.catalog.ResultCatalog). Experiments with unknown durations are assumed
+to take the mean of the known durations, and experiments with equal expected
+durations are run in the given order. The replicas of a single experiment are
+always handed out in their index order.
+
+Each experiment keeps its own factories, result callback, and result writer.
+The result callback of an experiment is called with the index of the replica
+within the experiment, and the list done contains only replicas of the same
+experiment. The factories of an experiment are called in the same order as
+when the experiment is run alone, so the seeds of the replicas do not depend
+on the other experiments of the group. Worker initializers and generator
+callbacks are not supported as the workers are shared by experiments with
+different SUTs; give a generator callback for the whole group instead.
+
+The manifest of a group covers the replicas of all its experiments in the
+order of the experiments, so a group is resumed like a single experiment
+provided that the experiments and their sizes are unchanged.
+"""
+
+from stgem.experiment import Experiment
+
+def expected_duration(catalog, prefix="", subdirectory=None, description=None):
+    """Return the mean total time (execution, generation, and training) of
+    the replicas matching the given query in the given ResultCatalog (see
+    ResultCatalog.query) or None if there are no matching replicas."""
+
+    summaries = catalog.query(prefix=prefix, subdirectory=subdirectory, description=description)
+    if len(summaries) == 0:
+        return None
+
+    return sum(summary.total_time for summary in summaries) / len(summaries)
+
+class ExperimentGroup(Experiment):
+    """Runs the replicas of the given experiments on a single pool of workers
+    in the order of decreasing expected duration. The list expected_durations
+    gives for each experiment the expected duration of a replica (in seconds)
+    or None if the duration is unknown."""
+
+    def __init__(self, experiments, expected_durations=None, generator_callback=None):
+        self.experiments = list(experiments)
+        for experiment in self.experiments:
+            if experiment.worker_initializer is not None:
+                raise Exception("Worker initializers are not supported in an experiment group.")
+            if experiment.generator_callback is not None:
+                raise Exception("Generator callbacks of the experiments are not supported in an experiment group.")
+
+        if expected_durations is None:
+            expected_durations = [None]*len(self.experiments)
+        if len(expected_durations) != len(self.experiments):
+            raise ValueError("Expected {} durations, got {}.".format(len(self.experiments), len(expected_durations)))
+
+        # The replicas of the experiments are numbered consecutively.
+        self.offsets = []
+        N = 0
+        for experiment in self.experiments:
+            self.offsets.append(N)
+            N += experiment.N
+
+        super().__init__(N, None, None, generator_callback=generator_callback)
+
+        known = [duration for duration in expected_durations if duration is not None]
+        default = sum(known) / len(known) if len(known) > 0 else 0.0
+        self.expected_durations = [duration if duration is not None else default for duration in expected_durations]
+        # The order in which the experiments are run. The sort is stable.
+        self.order = sorted(range(len(self.experiments)), key=lambda e: -self.expected_durations[e])
+
+    def _locate(self, idx):
+        """Return the experiment of the given replica of the group and the
+        index of the replica within the experiment."""
+
+        for e in reversed(range(len(self.experiments))):
+            if idx >= self.offsets[e]:
+                return e, idx - self.offsets[e]
+
+    def _jobs(self, manifest):
+        for e in self.order:
+            experiment = self.experiments[e]
+            for i in range(experiment.N):
+                generator = experiment.stgem_factory()
+                seed = experiment.seed_factory()
+                idx = self.offsets[e] + i
+                if manifest[idx]["state"] == "done": continue
+
+                # A resumed replica keeps its original seed.
+                if manifest[idx]["seed"] is None:
+                    manifest.update(idx, seed=seed)
+                yield idx, generator, manifest[idx]["seed"]
+
+    def _retry_job(self, idx, manifest):
+        e, _ = self._locate(idx)
+        return idx, self.experiments[e].stgem_factory(), manifest[idx]["seed"]
+
+    def _result_callback(self, idx, r, done):
+        e, i = self._locate(idx)
+        experiment = self.experiments[e]
+        if experiment.result_callback is not None:
+            end = self.offsets[e] + experiment.N
+            experiment.result_callback(i, r, [j - self.offsets[e] for j in done if self.offsets[e] <= j < end])
+
+    def run(self, *args, **kwargs):
+        try:
+            super().run(*args, **kwargs)
+        finally:
+            for experiment in self.experiments:
+                if experiment.result_writer is not None:
+                    experiment.result_writer.flush()
@@ -0,0 +1,156 @@
+"""
+Throughput metrics of experiments.
+
+An ExperimentMetrics object records where the time of an experiment goes, so
+that the number of workers can be chosen from data. For each worker it
+records its lifetime, the time it was busy running replicas, the time it
+waited for a job on its job queue, and the time its initialization (the
+worker initializer) took. For each replica it records the time spent in the
+following phases:
+
+    dispatch    from handing out the job to the worker starting it (job queue
+                and unpickling of the generator)
+    setup       building the generator (with a worker initializer) and
+                setting it up
+    execution   executing tests on the SUT
+    generation  generating tests
+    training    training models
+    other       the rest of the run of the generator
+    transfer    sending the result to the parent process
+    callback    the result callback in the parent process
+
+The execution, generation, and training times are the totals over the tests
+of the result (see stgem.catalog.result_times). The metrics also include the
+time the parent process waited on the result queue and the throughput in
+replicas per hour.
+
+The metrics are updated while the experiment runs and are available as
+Experiment.metrics. If a metrics file is given, the metrics are saved into it
+(as JSON) after each replica, so a running experiment can be monitored, and
+summary() gives a human-readable summary.
+"""
+
+import json, os, time
+
+phases = ["dispatch", "setup", "execution", "generation", "training", "other", "transfer", "callback"]
+
+class ExperimentMetrics:
+    """Metrics of a single run of an experiment. If file_name is given, the
+    metrics are saved into it (as JSON) after each change."""
+
+    def __init__(self, N_workers, file_name=None):
+        self.N_workers = N_workers
+        self.file_name = file_name
+        self.start = time.time()
+        self.end = None
+        self.workers = {}
+        self.replicas = {}
+        self.result_wait = 0.0
+
+    def worker_started(self, worker_id, slot):
+        self.workers[worker_id] = {"slot": slot,
+                                   "started": time.time(),
+                                   "stopped": None,
+                                   "busy": 0.0,
+                                   "job_wait": 0.0,
+                                   "initialize": 0.0,
+                                   "replicas": 0,
+                                   "failed": 0}
+
+    def worker_stopped(self, worker_id):
+        if self.workers[worker_id]["stopped"] is None:
+            self.workers[worker_id]["stopped"] = time.time()
+
+    def waited(self, seconds):
+        """Record time the parent process waited for results."""
+
+        self.result_wait += seconds
+
+    def replica_finished(self, idx, worker_id, state, timing, attempts):
+        """Record a finished attempt of a replica. The dictionary timing
+        contains the phases known for the attempt and optionally the times
+        job_wait and initialize reported by the worker."""
+
+        timing = dict(timing)
+        worker = self.workers[worker_id]
+        worker["job_wait"] += timing.pop("job_wait", 0.0)
+        worker["initialize"] += timing.pop("initialize", 0.0)
+        # The dispatch and callback phases do not occupy the worker.
+        worker["busy"] += sum(timing.get(phase, 0.0) for phase in phases if not phase in ["dispatch", "callback"])
+        worker["replicas" if state == "done" else "failed"] += 1
+
+        self.replicas[idx] = {"state": state,
+                              "worker": worker_id,
+                              "attempts": attempts,
+                              "phases": {phase: timing[phase] for phase in phases if phase in timing}}
+        self.save()
+
+    def finish(self):
+        self.end = time.time()
+        for worker_id in self.workers:
+            self.worker_stopped(worker_id)
+        self.save()
+
+    @property
+    def elapsed(self):
+        return (self.end if self.end is not None else time.time()) - self.start
+
+    @property
+    def replicas_per_hour(self):
+        done = sum(1 for replica in self.replicas.values() if replica["state"] == "done")
+        return 3600*done/self.elapsed if self.elapsed > 0 else 0.0
+
+    def worker_summary(self, worker_id):
+        """Return a dictionary with the lifetime, busy, and idle times and the
+        utilization (busy time divided by lifetime) of the given worker."""
+
+        worker = self.workers[worker_id]
+        lifetime = (worker["stopped"] if worker["stopped"] is not None else time.time()) - worker["started"]
+        return {"lifetime": lifetime,
+                "busy": worker["busy"],
+                "idle": max(0.0, lifetime - worker["busy"]),
+                "utilization": worker["busy"] / lifetime if lifetime > 0 else 0.0}
+
+    def mean_phases(self):
+        """Return the mean time of each phase over the replicas which are
+        done."""
+
+        done = [replica for replica in self.replicas.values() if replica["state"] == "done"]
+        return {phase: sum(replica["phases"].get(phase, 0.0) for replica in done) / len(done) if len(done) > 0 else 0.0 for phase in phases}
+
+    def to_dict(self):
+        return {"N_workers": self.N_workers,
+                "start": self.start,
+                "end": self.end,
+                "elapsed": self.elapsed,
+                "replicas_per_hour": self.replicas_per_hour,
+                "result_wait": self.result_wait,
+                "workers": {str(worker_id): dict(worker, **self.worker_summary(worker_id)) for worker_id, worker in self.workers.items()},
+                "replicas": {str(idx): replica for idx, replica in sorted(self.replicas.items())},
+                "mean_phases": self.mean_phases()}
+
+    def save(self):
+        if self.file_name is None: return
+
+        temp_file_name = "{}.tmp".format(self.file_name)
+        with open(temp_file_name, "w") as file:
+            json.dump(self.to_dict(), file, indent=1)
+        os.replace(temp_file_name, self.file_name)
+
+    def summary(self):
+        """Return a human-readable summary of the metrics."""
+
+        done = sum(1 for replica in self.replicas.values() if replica["state"] == "done")
+        failed = len(self.replicas) - done
+        lines = ["{} replicas done and {} failed in {:.1f} s with {} workers ({:.1f} replicas/hour).".format(done, failed, self.elapsed, self.N_workers, self.replicas_per_hour)]
+
+        lines.append("{:>6} {:>8} {:>6} {:>10} {:>10} {:>10} {:>10} {:>11}".format("worker", "replicas", "failed", "busy (s)", "idle (s)", "wait (s)", "init (s)", "utilization"))
+        for worker_id, worker in sorted(self.workers.items()):
+            summary = self.worker_summary(worker_id)
+            lines.append("{:>6} {:>8} {:>6} {:>10.1f} {:>10.1f} {:>10.1f} {:>10.1f} {:>10.0f}%".format(worker_id, worker["replicas"], worker["failed"], summary["busy"], summary["idle"], worker["job_wait"], worker["initialize"], 100*summary["utilization"]))
+
+        mean_phases = self.mean_phases()
+        lines.append("Mean replica phases (s): {}.".format(", ".join("{} {:.2f}".format(phase, mean_phases[phase]) for phase in phases)))
+        lines.append("The parent process waited for results {:.1f} s ({:.0f}% of the time).".format(self.result_wait, 100*self.result_wait / self.elapsed if self.elapsed > 0 else 0.0))
+
+        return "\n".join(lines)
@@ -1,4 +1,6 @@
-import copy, datetime, gzip, os, random
+import copy, datetime, math, os, random, threading, time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 
 import torch
 
@@ -8,10 +10,11 @@ import numpy as np
 from stgem.algorithm.algorithm import Algorithm
 from stgem.budget import Budget
 from stgem.exceptions import *
-from stgem.logger import Logger
+from stgem.logger import Logger, DEBUG, WARNING
 from stgem.objective_selector import ObjectiveSelectorAll
+from stgem.storage import codec_from_file_name, open_compressed, open_indexed_result
 from stgem.sut import SearchSpace, SUT, SUTInput
-from stgem.test_repository import TestRepository
+from stgem.test_repository import PerformanceRecordHandler, TestRepository, TestRepositoryView
 
 class StepResult:
 
@@ -36,8 +39,9 @@ class STGEMResult:
 
     @staticmethod
     def restore_from_file(file_name: str):
-        o = gzip.open if file_name.endswith(".gz") else open
-        with o(file_name, "rb") as file:
+        # The file is decompressed according to its extension (.gz, .bz2,
+        # or .xz).
+        with open_compressed(file_name, "rb") as file:
             obj = pickle.load(file)
         return obj
 
@@ -45,19 +49,30 @@ class STGEMResult:
         if os.path.exists(file_name):
             raise FileExistsError(file_name)
 
-        o = gzip.open if file_name.endswith(".gz") else open
         # first create a temporary file
         temp_file_name = "{}.tmp".format(file_name)
-        with o(temp_file_name, "wb") as file:
+        with open_compressed(temp_file_name, "wb", codec=codec_from_file_name(file_name)) as file:
             pickle.dump(self, file)
         # then we rename it to its final name
         os.replace(temp_file_name, file_name)
 
 class Step:
 
+    # A function saving a checkpoint of the generator. This is set by STGEM.
+    checkpoint_callback = None
+
     def run(self) -> StepResult:
         raise NotImplementedError
 
+    def get_state(self):
+        """Return the state of an ongoing step for a checkpoint. Steps that
+        cannot be resumed midway return None."""
+
+        return None
+
+    def set_state(self, state):
+        pass
+
     def setup(self, sut, search_space, test_repository, budget, objective_funcs, objective_selector, device, logger):
         self.sut = sut
         self.search_space = search_space
@@ -67,12 +82,148 @@ class Step:
         self.objective_selector = objective_selector
         self.device = device
         self.logger = logger
-        self.log = lambda msg: (self.logger("step", msg) if logger is not None else None)
+        self.log = lambda msg, *args, **kwargs: (self.logger("step", msg, *args, **kwargs) if logger is not None else None)
+
+class TrainingCadence:
+    """Decides when and how long a Search step trains its algorithm so that
+    the total training time stays at about ratio times the total execution
+    time of the step.
+
+    The algorithm is trained before the next test if the training time spent
+    so far plus the expected cost of the training fits into ratio times the
+    execution time spent so far. The expected cost is the cost of the
+    previous training scaled by the training effort in (0, 1] which is passed
+    to the algorithm (see Algorithm.scaled_train_settings). If training is
+    postponed for max_interval tests, the models are trained anyway with
+    halved effort (but at least min_effort). If the models are trained after
+    every test with plenty of time to spare, the effort is doubled (up to 1).
+    Thus training happens less often and for fewer epochs on cheap SUTs and
+    as usual on expensive SUTs."""
+
+    default_parameters = {"ratio": 1.0,
+                          "max_interval": 10,
+                          "min_effort": 0.1}
+
+    def __init__(self, parameters=None):
+        if parameters is None:
+            parameters = {}
 
-class Search(Step):
-    """A search step."""
+        self.parameters = parameters
+        for key in self.default_parameters:
+            if not key in self.parameters:
+                self.parameters[key] = self.default_parameters[key]
+
+        if self.ratio <= 0:
+            raise ValueError("The target training ratio must be positive.")
+        if self.max_interval < 1:
+            raise ValueError("The maximum training interval must be positive.")
+        if not 0 < self.min_effort <= 1:
+            raise ValueError("The minimum training effort must be in (0, 1].")
+
+        self.setup()
+
+    def __getattr__(self, name):
+        if "parameters" in self.__dict__:
+            if name in self.parameters:
+                return self.parameters.get(name)
+
+        raise AttributeError(name)
+
+    def setup(self):
+        self.effort = 1.0
+        self.cost = None         # Training time per unit effort.
+        self.training_time = 0.0
+        self.execution_time = 0.0
+        self.tests_since_training = 0
+        # For each training, the number of tests in the test repository, the
+        # effort, and the training time.
+        self.schedule = []
+
+    def _slack(self):
+        return self.ratio*self.execution_time - self.training_time
+
+    def should_train(self):
+        if self.cost is None or self.tests_since_training >= self.max_interval:
+            return True
+        return self._slack() >= self.cost*self.effort
+
+    def trained(self, tests, training_time):
+        """Report a training with the current effort which took the given
+        time when the test repository had the given number of tests."""
+
+        self.schedule.append({"tests": tests, "effort": self.effort, "training_time": training_time})
+
+        if self.cost is not None:
+            if self._slack() < self.cost*self.effort:
+                # The training was forced by the interval.
+                self.effort = max(self.min_effort, self.effort / 2)
+            elif self.tests_since_training <= 1 and self._slack() >= 2*training_time:
+                self.effort = min(1.0, 2*self.effort)
+
+        self.cost = training_time / self.schedule[-1]["effort"]
+        self.training_time += training_time
+        self.tests_since_training = 0
+
+    def skipped(self, training_time):
+        """Report the bookkeeping time of a round without model training."""
+
+        self.training_time += training_time
+
+    def executed(self, execution_time, tests=1):
+        self.execution_time += execution_time
+        self.tests_since_training += tests
 
-    def __init__(self, algorithm: Algorithm, budget_threshold, mode="exhaust_budget", results_include_models=False, results_checkpoint_period=1):
+class Search(Step):
+    """A search step.
+
+    By default, the step alternates between training the algorithm,
+    generating a single test, and executing it. If batch_size is k > 1, the
+    algorithm generates k tests after each training phase and these tests are
+    executed concurrently (in threads) on the SUTs of sut_pool. The pool is
+    either a list of SUT objects or a function returning a new SUT object, in
+    which case k SUTs are created. Without a pool, the tests are executed
+    one by one on the SUT of the generator. The results are recorded in the
+    order the tests were generated regardless of which execution finished
+    first. The training time is recorded for the first test of a batch, and
+    the generation time is divided evenly among the tests of the batch.
+
+    Each test of a batch consumes budget when it is recorded, so a test whose
+    execution exceeds the budget is discarded along with the rest of the
+    batch exactly as in the sequential case. A batch never contains more
+    tests than there are executions left in the budget.
+
+    If pipeline is True, the training and generation of the next tests is
+    done in a background thread while the current tests are executed on the
+    SUT. The models are then trained on the tests executed before the current
+    ones. The parameter regenerate decides if such speculatively generated
+    tests are discarded and generated again taking the current results into
+    account. It is either None (never regenerate), "improvement" (regenerate
+    if the current tests decreased the minimum objective by more than
+    regenerate_threshold), or a function taking the test repository and the
+    indices of the current tests and returning a boolean. The pipelined
+    search is deterministic provided that the SUT does not use the global
+    random number generators.
+
+    If checkpoint_period is k > 0, the state of the generator is saved into
+    its checkpoint file (see STGEM.checkpoint) after every k rounds.
+
+    If early_termination is True, SUTs reporting partial outputs (see
+    SUT.report_partial_output) are stopped as soon as the values of all
+    objectives are decided or, in the mode stop_at_first_objective, as soon
+    as some objective is known to be nonpositive. A function taking a test
+    and a partial output can be given instead to decide when to stop. The
+    truncated outputs are stored and marked as truncated, and only the time
+    actually used is charged from the budget.
+
+    If training_ratio is a positive number r, the step adapts how often and
+    how long the algorithm is trained so that the training time is about r
+    times the execution time (see TrainingCadence). A TrainingCadence object
+    can be given instead. In rounds without training, the algorithm is
+    trained with effort 0, that is, it only updates its bookkeeping. The
+    chosen schedule is stored in the step result parameter
+    training_schedule. This is not supported in the pipelined mode."""
+
+    def __init__(self, algorithm: Algorithm, budget_threshold, mode="exhaust_budget", results_include_models=False, results_checkpoint_period=1, batch_size=1, sut_pool=None, pipeline=False, regenerate=None, regenerate_threshold=0.0, checkpoint_period=0, early_termination=False, training_ratio=None):
         self.algorithm = algorithm
         self.budget = None
         self.budget_threshold = budget_threshold
@@ -83,6 +234,32 @@ class Search(Step):
         self.results_include_models = results_include_models
         self.results_checkpoint_period = results_checkpoint_period
 
+        if batch_size < 1:
+            raise ValueError("The batch size must be positive.")
+        self.batch_size = batch_size
+        self.sut_pool = sut_pool
+
+        if regenerate is not None and not callable(regenerate) and regenerate != "improvement":
+            raise Exception("Unknown regeneration policy '{}'.".format(regenerate))
+        self.pipeline = pipeline
+        self.regenerate = regenerate
+        self.regenerate_threshold = regenerate_threshold
+
+        if checkpoint_period < 0:
+            raise ValueError("The checkpoint period cannot be negative.")
+        self.checkpoint_period = checkpoint_period
+        self.early_termination = early_termination
+
+        if training_ratio is None or isinstance(training_ratio, TrainingCadence):
+            self.training_cadence = training_ratio
+        else:
+            self.training_cadence = TrainingCadence({"ratio": training_ratio})
+        if self.training_cadence is not None and self.pipeline:
+            raise Exception("Adaptive training cadence is not supported in the pipelined mode.")
+
+        self._resumed = False
+        self._pending = None
+
     def setup(self, sut, search_space, test_repository, budget, objective_funcs, objective_selector, device, logger):
         super().setup(sut, search_space, test_repository, budget, objective_funcs, objective_selector, device, logger)
 
@@ -91,126 +268,473 @@ class Search(Step):
             device=self.device,
             logger=self.logger)
 
+        self._setup_suts()
+
+    def _setup_suts(self):
+        # Setup the SUTs used for executing the tests.
+        if self.sut_pool is None:
+            self.suts = [self.sut]
+        elif callable(self.sut_pool):
+            self.suts = [self.sut_pool() for _ in range(self.batch_size)]
+        else:
+            self.suts = list(self.sut_pool)
+            if len(self.suts) == 0:
+                raise ValueError("The SUT pool cannot be empty.")
+        # The SUT of the generator has already been set up.
+        for pool_sut in self.suts:
+            if pool_sut is not self.sut:
+                pool_sut.setup()
+
+    def _execute_tests(self, sut_inputs, executor, suts=None):
+        """Execute the given tests and return a list of triples (SUTOutput,
+        execution time, budget cost) in the order of the inputs. Each SUT of
+        the pool (or of the given list of SUTs) executes its share of the
+        tests sequentially. The budget cost is None unless the SUT reports a
+        cost differing from the measured execution (see CachedSUT)."""
+
+        if suts is None:
+            suts = self.suts
+
+        monitor = self._early_termination_monitor()
+
+        def execute(sut, sut_input):
+            sut.set_early_termination_monitor(monitor)
+            start = time.perf_counter()
+            sut_output = sut.execute_test(sut_input)
+            return sut_output, time.perf_counter() - start, getattr(sut, "last_execution_cost", None)
+
+        N = min(len(sut_inputs), len(suts))
+        if N == 1 or executor is None:
+            return [execute(suts[0], sut_input) for sut_input in sut_inputs]
+
+        def execute_share(n):
+            return [execute(suts[n], sut_inputs[j]) for j in range(n, len(sut_inputs), N)]
+
+        futures = [executor.submit(execute_share, n) for n in range(N)]
+        results = [None for _ in range(len(sut_inputs))]
+        for n, future in enumerate(futures):
+            for m, result in enumerate(future.result()):
+                results[n + m*N] = result
+
+        return results
+
+    def _early_termination_monitor(self):
+        if not self.early_termination:
+            return None
+        if callable(self.early_termination):
+            return self.early_termination
+
+        # Objectives are not necessarily thread-safe, so the SUTs of a pool
+        # evaluate them one at a time.
+        lock = threading.Lock()
+
+        def monitor(sut_input, partial_output):
+            with lock:
+                if self.mode == "stop_at_first_objective":
+                    for objective in self.objective_funcs:
+                        bound = objective.upper_bound(sut_input, partial_output)
+                        if bound is not None and bound <= 0:
+                            return True
+
+                return all(objective.decided(sut_input, partial_output) for objective in self.objective_funcs)
+
+        return monitor
+
+    def _current_batch_size(self):
+        # Do not generate more tests than can be executed.
+        N = self.batch_size
+        if self.budget.remaining_quantity("executions") < N:
+            N = max(1, math.ceil(self.budget.remaining_quantity("executions")))
+
+        return N
+
+    def _record_tests(self, performance, sut_inputs, executed, test_idx, fidelity=None):
+        """Record the executed tests into the test repository in order. The
+        given performance record belongs to the first test. Returns False if
+        the budget ran out. If fidelity is given, it is recorded into the
+        performance records. Tests of fidelity "low" do not affect the minimum
+        objective of the test repository or the objective selector, and only
+        tests of fidelity "high" can make the step successful."""
+
+        generation_time = performance.obtain("generation_time") / len(sut_inputs)
+        for j, (sut_input, (sut_output, execution_time, cost)) in enumerate(zip(sut_inputs, executed)):
+            if j > 0:
+                performance = self.test_repository.new_record()
+                performance.record("training_time", 0)
+            performance.record("generation_time", generation_time)
+            performance.record("execution_time", execution_time)
+            if fidelity is not None:
+                performance.record("fidelity", fidelity)
+
+            self.test_repository.record_input(sut_input)
+            self.test_repository.record_output(sut_output)
+
+            if cost is None:
+                cost = {}
+            self.budget.consume("execution_time", cost.get("execution_time", execution_time))
+            self.budget.consume(sut_output)
+            if not self.budget.remaining() > 0:
+                self.log("Ran out of budget during test execution. Discarding the test.")
+                self.test_repository.discard_record()
+                return False
+            self.budget.consume("executions", cost.get("executions", 1))
+            for quantity, value in cost.items():
+                if not quantity in ["execution_time", "executions"]:
+                    self.budget.consume(quantity, value)
+
+            self.log("Input to the SUT: {}", sut_input, level=DEBUG)
+            if sut_output.truncated:
+                self.log("The execution was stopped early.")
+
+            if sut_output.error is None:
+                self.log("Output from the SUT: {}", sut_output, level=DEBUG)
+
+                objectives = [objective(sut_input, sut_output) for objective in self.objective_funcs]
+                self.test_repository.record_objectives(objectives, update_minimum=fidelity != "low")
+
+                self.log("The actual objective: {}", objectives)
+
+                # TODO: Argmin does not take different scales into account.
+                if fidelity != "low":
+                    self.objective_selector.update(np.argmin(objectives))
+            else:
+                self.log("An error '{}' occurred during the test execution. No output available.", sut_output.error, level=WARNING)
+                self.test_repository.record_objectives([])
+
+            idx = self.test_repository.finalize_record()
+            test_idx.append(idx)
+
+            if fidelity is None:
+                falsified = self.test_repository.minimum_objective <= 0.0
+            else:
+                falsified = fidelity == "high" and sut_output.error is None and min(objectives) <= 0.0
+            if not self.success and falsified:
+                self.success = True
+                self.log("First success at test {}.".format(idx + 1))
+
+        return True
+
+    def _model_snapshot(self, i):
+        """Return the skeletons of the models if the models are to be saved
+        for round i and None otherwise."""
+
+        if self.results_include_models and self.results_checkpoint_period != 0 and i % self.results_checkpoint_period == 0:
+            return [model.skeletonize() for model in self.algorithm.models]
+        return None
+
+    def _save_models(self, i, model_skeletons):
+        # Save the models if requested.
+        model_skeletons.append(self._model_snapshot(i))
+
+    def get_state(self):
+        """Return the state of an ongoing search for a checkpoint. In the
+        pipelined mode, we wait for the background work to finish."""
+
+        pending = None
+        if self._pending is not None:
+            record, future = self._pending
+            try:
+                pending = (record, future.result(), None)
+            except AlgorithmException as E:
+                pending = (record, None, E)
+
+        return {
+            "algorithm": self.algorithm.get_state(),
+            "round": self.round,
+            "test_idx": self.test_idx,
+            "model_skeletons": self.model_skeletons,
+            "success": self.success,
+            "trained_tests": self._trained_tests,
+            "training_cadence": copy.deepcopy(self.training_cadence),
+            "pending": pending
+        }
+
+    def set_state(self, state):
+        self.algorithm.set_state(state["algorithm"])
+        self.round = state["round"]
+        self.test_idx = state["test_idx"]
+        self.model_skeletons = state["model_skeletons"]
+        self.success = state["success"]
+        self._trained_tests = state["trained_tests"]
+        self.training_cadence = state["training_cadence"]
+        self._pending = None
+        if state["pending"] is not None:
+            record, tests, error = state["pending"]
+            future = Future()
+            if error is None:
+                future.set_result(tests)
+            else:
+                future.set_exception(error)
+            self._pending = (record, future)
+
+        self._resumed = True
+
+    def _checkpoint(self):
+        if self.checkpoint_period > 0 and self.checkpoint_callback is not None and self.round % self.checkpoint_period == 0:
+            self.checkpoint_callback()
+
     def run(self) -> StepResult:
-        self.budget.update_threshold(self.budget_threshold)
+        if not self._resumed:
+            self.budget.update_threshold(self.budget_threshold)
+
+            # This stores the test indices that were executed during this step.
+            self.test_idx = []
+            # A list for saving model skeletons.
+            self.model_skeletons = []
+            self.round = 0
+            self._trained_tests = -1
+            self._pending = None
+            if self.training_cadence is not None:
+                self.training_cadence.setup()
+
+            # Allow the algorithm to initialize itself.
+            self.algorithm.initialize()
+
+            self.success = self.mode == "stop_at_first_objective" and self.test_repository.minimum_objective <= 0.0
+
+        self._resumed = False
+        test_idx = self.test_idx
+        model_skeletons = self.model_skeletons
+
+        # Threads for executing a batch of tests concurrently.
+        executor = ThreadPoolExecutor(max_workers=min(self.batch_size, len(self.suts))) if self.batch_size > 1 and len(self.suts) > 1 else None
+
+        if not (self.mode == "stop_at_first_objective" and self.success):
+            if self.pipeline:
+                self._run_pipelined(executor, test_idx, model_skeletons)
+            else:
+                self._run_sequential(executor, test_idx, model_skeletons)
 
-        # This stores the test indices that were executed during this step.
-        test_idx = []
-        # A list for saving model skeletons.
-        model_skeletons = []
+        if executor is not None:
+            executor.shutdown()
 
-        # Allow the algorithm to initialize itself.
-        self.algorithm.initialize()
+        # Allow the algorithm to store trained models or other generated data.
+        self.algorithm.finalize()
 
-        self.success = True
-        if not (self.mode == "stop_at_first_objective" and self.test_repository.minimum_objective <= 0.0):
-            self.success = False
+        # Report results.
+        self.log("Step minimum objective component: {}".format(self.test_repository.minimum_objective))
 
-            # Below we omit including a test into the test repository if the
-            # budget was exhausted during training, generation, or test
-            # execution. We do not care for the special case where the budget
-            # is exactly 0 as this is unlikely.
+        result = self._generate_step_result(test_idx, model_skeletons)
 
-            i = 0
-            while self.budget.remaining() > 0:
-                self.log("Budget remaining {}.".format(self.budget.remaining()))
+        return result
 
-                # Create a new test repository record to be filled.
-                performance = self.test_repository.new_record()
+    def _run_sequential(self, executor, test_idx, model_skeletons):
+        # Below we omit including a test into the test repository if the
+        # budget was exhausted during training, generation, or test
+        # execution. We do not care for the special case where the budget
+        # is exactly 0 as this is unlikely.
 
-                self.algorithm.train(self.objective_selector.select(), self.test_repository, self.budget.remaining())
-                self.budget.consume("training_time", performance.obtain("training_time"))
-                if not self.budget.remaining() > 0:
-                    self.log("Ran out of budget during training. Discarding the test.")
-                    self.test_repository.discard_record()
-                    break
+        while self.budget.remaining() > 0:
+            self.log("Budget remaining {}.".format(self.budget.remaining()))
 
-                self.log("Starting to generate test {}.".format(self.test_repository.tests + 1))
-                could_generate = True
-                try:
-                    next_test = self.algorithm.generate_next_test(self.objective_selector.select(), self.test_repository, self.budget.remaining())
-                except AlgorithmException:
-                    # We encountered an algorithm error. There might be many
-                    # reasons such as explosion of gradients. We take this as
-                    # an indication that the algorithm is unable to keep going,
-                    # so we exit.
-                    break
-                except GenerationException:
-                    # We encountered a generation error. We take this as an
-                    # indication that another training phase could correct the
-                    # problem, so we do not exit completely.
-                    could_generate = False
+            # Create a new test repository record to be filled.
+            performance = self.test_repository.new_record()
 
-                self.budget.consume("generation_time", performance.obtain("generation_time"))
-                if not self.budget.remaining() > 0:
-                    self.log("Ran out of budget during test generation. Discarding the test.")
-                    self.test_repository.discard_record()
+            self._train(performance)
+            if not self.budget.remaining() > 0:
+                self.log("Ran out of budget during training. Discarding the test.")
+                self.test_repository.discard_record()
+                break
+
+            N = self._current_batch_size()
+            self.log("Starting to generate test{} {}.".format("s" if N > 1 else "", ", ".join(str(self.test_repository.tests + j + 1) for j in range(N))))
+            could_generate = True
+            try:
+                if N == 1:
+                    next_tests = [self.algorithm.generate_next_test(self.objective_selector.select(), self.test_repository, self.budget.remaining())]
+                else:
+                    next_tests = self.algorithm.generate_next_tests(N, self.objective_selector.select(), self.test_repository, self.budget.remaining())
+            except AlgorithmException:
+                # We encountered an algorithm error. There might be many
+                # reasons such as explosion of gradients. We take this as
+                # an indication that the algorithm is unable to keep going,
+                # so we exit.
+                break
+            except GenerationException:
+                # We encountered a generation error. We take this as an
+                # indication that another training phase could correct the
+                # problem, so we do not exit completely.
+                could_generate = False
+
+            self.budget.consume("generation_time", performance.obtain("generation_time"))
+            if not self.budget.remaining() > 0:
+                self.log("Ran out of budget during test generation. Discarding the test.")
+                self.test_repository.discard_record()
+                break
+            if could_generate:
+                for next_test in next_tests:
+                    self.log("Generated test {}.", next_test)
+                self.log("Executing the test{}...".format("s" if len(next_tests) > 1 else ""))
+
+                sut_inputs = [SUTInput(next_test, None, None) for next_test in next_tests]
+                executed = self._execute_tests(sut_inputs, executor)
+                recorded = len(test_idx)
+                if not self._record_tests(performance, sut_inputs, executed, test_idx):
                     break
-                if could_generate:
-                    self.log("Generated test {}.".format(next_test))
-                    self.log("Executing the test...")
-
-                    performance.timer_start("execution")
-                    sut_input = SUTInput(next_test, None, None)
-                    sut_output = self.sut.execute_test(sut_input)
-                    performance.record("execution_time", performance.timer_reset("execution"))
-
-                    self.test_repository.record_input(sut_input)
-                    self.test_repository.record_output(sut_output)
-
-                    self.budget.consume("execution_time", performance.obtain("execution_time"))
-                    self.budget.consume(sut_output)
-                    if not self.budget.remaining() > 0:
-                        self.log("Ran out of budget during test execution. Discarding the test.")
-                        self.test_repository.discard_record()
-                        break
-                    self.budget.consume("executions")
+                if self.training_cadence is not None:
+                    execution_time = sum(self.test_repository.performance(idx).obtain("execution_time") for idx in test_idx[recorded:])
+                    self.training_cadence.executed(execution_time, len(test_idx) - recorded)
+            else:
+                self.log("Encountered a problem with test generation. Skipping to next training phase.")
 
-                    self.log("Input to the SUT: {}".format(sut_input))
+            self._save_models(self.round, model_skeletons)
 
-                    if sut_output.error is None:
-                        self.log("Output from the SUT: {}".format(sut_output))
+            self.round += 1
+            self._checkpoint()
 
-                        objectives = [objective(sut_input, sut_output) for objective in self.objective_funcs]
-                        self.test_repository.record_objectives(objectives)
+            if self.success and self.mode == "stop_at_first_objective":
+                break
 
-                        self.log("The actual objective: {}".format(objectives))
+    def _train(self, performance):
+        """Train the algorithm for the test of the given performance record
+        following the training cadence (if any) and consume the budget."""
 
-                        # TODO: Argmin does not take different scales into account.
-                        self.objective_selector.update(np.argmin(objectives))
-                    else:
-                        self.log("An error '{}' occurred during the test execution. No output available.".format(sut_output.error))
-                        self.test_repository.record_objectives([])
+        train = self.training_cadence is None or self.training_cadence.should_train()
+        if self.training_cadence is not None:
+            self.algorithm.training_effort = self.training_cadence.effort if train else 0.0
 
-                    idx = self.test_repository.finalize_record()
-                    test_idx.append(idx)
+        self.algorithm.train(self.objective_selector.select(), self.test_repository, self.budget.remaining())
+        training_time = performance.obtain("training_time")
+        self.budget.consume("training_time", training_time)
 
-                    if not self.success and self.test_repository.minimum_objective <= 0.0:
-                        self.success = True
-                        self.log("First success at test {}.".format(i + 1))
-                else:
-                    self.log("Encountered a problem with test generation. Skipping to next training phase.")
+        if self.training_cadence is not None:
+            if train:
+                self.log("Trained with effort {:.3f} in {:.3f}s.", self.training_cadence.effort, training_time)
+                self.training_cadence.trained(self.test_repository.tests, training_time)
+            else:
+                self.training_cadence.skipped(training_time)
 
-                # Save the models if requested.
-                if self.results_include_models and self.results_checkpoint_period != 0 and i % self.results_checkpoint_period == 0:
-                    model_skeletons.append([model.skeletonize() for model in self.algorithm.models])
-                else:
-                    model_skeletons.append(None)
+    def _speculate(self, view, active_outputs, N, budget_remaining):
+        """Train the algorithm on the tests visible in the given view (if
+        there are new tests) and generate the next tests. This is run in a
+        background thread. Returns the generated tests or None if a
+        GenerationException occurred."""
 
-                i += 1
+        if view.tests > self._trained_tests:
+            self.algorithm.train(active_outputs, view, budget_remaining)
+            self._trained_tests = view.tests
+        else:
+            view.performance(view.current_test).record("training_time", 0)
 
-                if self.success and self.mode == "stop_at_first_objective":
+        try:
+            if N == 1:
+                return [self.algorithm.generate_next_test(active_outputs, view, budget_remaining)]
+            else:
+                return self.algorithm.generate_next_tests(N, active_outputs, view, budget_remaining)
+        except GenerationException:
+            return None
+
+    def _should_regenerate(self, previous_minimum, new_idx):
+        if self.regenerate is None:
+            return False
+        if callable(self.regenerate):
+            return self.regenerate(self.test_repository, new_idx)
+
+        # The policy is "improvement".
+        return self.test_repository.minimum_objective < previous_minimum - self.regenerate_threshold
+
+    def _run_pipelined(self, executor, test_idx, model_skeletons):
+        """Like _run_sequential, but the training and generation of the next
+        tests is done in a background thread while the current tests are
+        being executed. The background thread sees only the tests finalized
+        before the current tests, so the training lags one round behind. If
+        the regeneration policy says that the latest results should be taken
+        into account, the speculatively generated tests are discarded, and the
+        next tests are generated after training with the latest results. The
+        training and generation time of discarded tests is still consumed
+        from the budget."""
+
+        trainer = ThreadPoolExecutor(max_workers=1)
+
+        def speculate():
+            # The active outputs are selected here as the objective selector
+            # is updated in this thread.
+            record = {}
+            view = TestRepositoryView(self.test_repository, record)
+            future = trainer.submit(self._speculate, view, self.objective_selector.select(), self._current_batch_size(), self.budget.remaining())
+            return record, future
+
+        try:
+            # The pending work might have been restored from a checkpoint.
+            if self._pending is None:
+                self._pending = speculate()
+            while self.budget.remaining() > 0:
+                self.log("Budget remaining {}.".format(self.budget.remaining()))
+
+                record, future = self._pending
+                try:
+                    next_tests = future.result()
+                except AlgorithmException:
+                    # See _run_sequential.
                     break
 
-        # Allow the algorithm to store trained models or other generated data.
-        self.algorithm.finalize()
+                performance = PerformanceRecordHandler(record)
+                self.budget.consume("training_time", performance.obtain("training_time"))
+                if not self.budget.remaining() > 0:
+                    self.log("Ran out of budget during training. Discarding the test.")
+                    break
+                self.budget.consume("generation_time", performance.obtain("generation_time"))
+                if not self.budget.remaining() > 0:
+                    self.log("Ran out of budget during test generation. Discarding the test.")
+                    break
 
-        # Report results.
-        self.log("Step minimum objective component: {}".format(self.test_repository.minimum_objective))
+                # The models are saved before the background thread starts
+                # training them again.
+                snapshot = self._model_snapshot(self.round)
 
-        result = self._generate_step_result(test_idx, model_skeletons)
+                if next_tests is None:
+                    self.log("Encountered a problem with test generation. Skipping to next training phase.")
+                    self._pending = speculate()
+                else:
+                    # The budget might have been consumed after the generation
+                    # started.
+                    next_tests = next_tests[:self._current_batch_size()]
+
+                    # Record the training and generation times for the first
+                    # test.
+                    performance = self.test_repository.new_record(record)
+
+                    for next_test in next_tests:
+                        self.log("Generated test {}.", next_test)
+                    self.log("Executing the test{}...".format("s" if len(next_tests) > 1 else ""))
+
+                    # Train and generate the next tests while executing.
+                    self._pending = speculate()
+
+                    previous_minimum = self.test_repository.minimum_objective
+                    sut_inputs = [SUTInput(next_test, None, None) for next_test in next_tests]
+                    executed = self._execute_tests(sut_inputs, executor)
+                    first = len(test_idx)
+                    if not self._record_tests(performance, sut_inputs, executed, test_idx):
+                        break
 
-        return result
+                    if self._should_regenerate(previous_minimum, test_idx[first:]):
+                        self.log("Discarding the speculatively generated tests.")
+                        record, future = self._pending
+                        try:
+                            future.result()
+                        except AlgorithmException:
+                            break
+                        discarded = PerformanceRecordHandler(record)
+                        self.budget.consume("training_time", discarded.obtain("training_time"))
+                        if "generation_time" in record:
+                            self.budget.consume("generation_time", discarded.obtain("generation_time"))
+                        if not self.budget.remaining() > 0:
+                            break
+                        self._pending = speculate()
+
+                model_skeletons.append(snapshot)
+
+                self.round += 1
+                self._checkpoint()
+
+                if self.success and self.mode == "stop_at_first_objective":
+                    break
+        finally:
+            # Wait for the background work to finish as the algorithm cannot
+            # be used concurrently.
+            trainer.shutdown(wait=True)
+            self._pending = None
 
     def _generate_step_result(self, test_idx, model_skeletons):
         # Save certain parameters in the StepResult object.
@@ -224,6 +748,12 @@ class Search(Step):
         parameters["objective_selector_name"] = self.objective_selector.__class__.__name__
         parameters["objective_selector"] = copy.deepcopy(self.objective_selector.parameters)
         parameters["executed_tests"] = test_idx
+        parameters["batch_size"] = self.batch_size
+        parameters["pipeline"] = self.pipeline
+        parameters["early_termination"] = bool(self.early_termination)
+        if self.training_cadence is not None:
+            parameters["training_cadence"] = copy.deepcopy(self.training_cadence.parameters)
+            parameters["training_schedule"] = copy.deepcopy(self.training_cadence.schedule)
 
         # Build the StepResult object.
         step_result = StepResult(self.test_repository, self.success, parameters)
@@ -233,13 +763,417 @@ class Search(Step):
 
         return step_result
 
+class MultiFidelitySearch(Search):
+    """A search step which screens tests on a cheap low-fidelity version of
+    the SUT (for example, the same simulator with a larger sampling step).
+
+    After each training phase, the algorithm generates screening_size tests
+    which are executed on low_fidelity_sut. The promote tests with the
+    smallest objective values (minimum over the objectives) are then executed
+    on the SUT of the generator. If record_low_fidelity is True, the
+    low-fidelity tests are recorded into the test repository too, so the
+    algorithm can learn from them. The performance record of each test has
+    the entry fidelity with the value "low" or "high", and only high-fidelity
+    tests make the step successful. Low-fidelity objectives do not change
+    the minimum objective of the test repository or the objective selector,
+    so they do not make later steps successful, and the result catalog
+    ignores them.
+
+    A low-fidelity execution consumes low_fidelity_cost executions from the
+    budget and its measured execution time. The budget quantities
+    low_fidelity_executions and high_fidelity_executions count the
+    executions of each fidelity and can be used in budget thresholds."""
+
+    def __init__(self, algorithm: Algorithm, budget_threshold, low_fidelity_sut, screening_size=10, promote=1, low_fidelity_cost=0.1, record_low_fidelity=True, mode="exhaust_budget", results_include_models=False, results_checkpoint_period=1, checkpoint_period=0, early_termination=False):
+        super().__init__(algorithm=algorithm,
+                         budget_threshold=budget_threshold,
+                         mode=mode,
+                         results_include_models=results_include_models,
+                         results_checkpoint_period=results_checkpoint_period,
+                         checkpoint_period=checkpoint_period,
+                         early_termination=early_termination)
+
+        if screening_size < 1:
+            raise ValueError("The screening size must be positive.")
+        if not 1 <= promote <= screening_size:
+            raise ValueError("The number of promoted tests must be between 1 and the screening size.")
+        if low_fidelity_cost < 0:
+            raise ValueError("The cost of a low-fidelity execution cannot be negative.")
+
+        self.low_fidelity_sut = low_fidelity_sut
+        self.screening_size = screening_size
+        self.promote = promote
+        self.low_fidelity_cost = low_fidelity_cost
+        self.record_low_fidelity = record_low_fidelity
+
+    def setup(self, sut, search_space, test_repository, budget, objective_funcs, objective_selector, device, logger):
+        super().setup(sut, search_space, test_repository, budget, objective_funcs, objective_selector, device, logger)
+
+        self.low_fidelity_sut.setup()
+
+        # Make the executions of each fidelity available as budgets.
+        for quantity in ["low_fidelity_executions", "high_fidelity_executions"]:
+            if not quantity in self.budget.quantities:
+                self.budget.quantities[quantity] = 0
+                self.budget.budgets[quantity] = (lambda q: lambda quantities: quantities[q])(quantity)
+
+    def _fidelity_costs(self, executed, fidelity):
+        """Attach the budget costs of the given fidelity to executed tests."""
+
+        result = []
+        for sut_output, execution_time, cost in executed:
+            cost = {} if cost is None else dict(cost)
+            if fidelity == "low":
+                cost["executions"] = self.low_fidelity_cost*cost.get("executions", 1)
+            cost["{}_fidelity_executions".format(fidelity)] = 1
+            result.append((sut_output, execution_time, cost))
+
+        return result
+
+    def _screening_scores(self, sut_inputs, executed):
+        scores = []
+        for sut_input, (sut_output, _, _) in zip(sut_inputs, executed):
+            if sut_output.error is None:
+                scores.append(min(objective(sut_input, sut_output) for objective in self.objective_funcs))
+            else:
+                scores.append(float("inf"))
+
+        return scores
+
+    def _run_sequential(self, executor, test_idx, model_skeletons):
+        while self.budget.remaining() > 0:
+            self.log("Budget remaining {}.".format(self.budget.remaining()))
+
+            performance = self.test_repository.new_record()
+
+            self.algorithm.train(self.objective_selector.select(), self.test_repository, self.budget.remaining())
+            self.budget.consume("training_time", performance.obtain("training_time"))
+            if not self.budget.remaining() > 0:
+                self.log("Ran out of budget during training. Discarding the test.")
+                self.test_repository.discard_record()
+                break
+
+            N = self.screening_size
+            self.log("Starting to generate {} tests for screening.".format(N))
+            could_generate = True
+            try:
+                if N == 1:
+                    next_tests = [self.algorithm.generate_next_test(self.objective_selector.select(), self.test_repository, self.budget.remaining())]
+                else:
+                    next_tests = self.algorithm.generate_next_tests(N, self.objective_selector.select(), self.test_repository, self.budget.remaining())
+            except AlgorithmException:
+                break
+            except GenerationException:
+                could_generate = False
+
+            self.budget.consume("generation_time", performance.obtain("generation_time"))
+            if not self.budget.remaining() > 0:
+                self.log("Ran out of budget during test generation. Discarding the test.")
+                self.test_repository.discard_record()
+                break
+            if could_generate:
+                if not self._screen_and_promote(performance, next_tests, executor, test_idx):
+                    break
+            else:
+                self.log("Encountered a problem with test generation. Skipping to next training phase.")
+
+            self._save_models(self.round, model_skeletons)
+
+            self.round += 1
+            self._checkpoint()
+
+            if self.success and self.mode == "stop_at_first_objective":
+                break
+
+    def _screen_and_promote(self, performance, next_tests, executor, test_idx):
+        """Execute the given tests on the low-fidelity SUT and the best of them
+        on the high-fidelity SUT. Returns False if the budget ran out."""
+
+        self.log("Executing the tests on the low-fidelity SUT...")
+        sut_inputs = [SUTInput(next_test, None, None) for next_test in next_tests]
+        executed = self._fidelity_costs(self._execute_tests(sut_inputs, None, suts=[self.low_fidelity_sut]), "low")
+        scores = self._screening_scores(sut_inputs, executed)
+
+        if self.record_low_fidelity:
+            if not self._record_tests(performance, sut_inputs, executed, test_idx, fidelity="low"):
+                return False
+            # The training and generation times were recorded already.
+            performance = self.test_repository.new_record()
+            performance.record("training_time", 0)
+            performance.record("generation_time", 0)
+        else:
+            # Only the promoted tests are recorded, so we record the time used
+            # for screening with them.
+            screening_time = sum(execution_time for _, execution_time, _ in executed)
+            performance.record("screening_time", screening_time)
+            self.budget.consume("execution_time", sum(cost.get("execution_time", execution_time) for _, execution_time, cost in executed))
+            self.budget.consume("executions", sum(cost["executions"] for _, _, cost in executed))
+            self.budget.consume("low_fidelity_executions", len(executed))
+            if not self.budget.remaining() > 0:
+                self.log("Ran out of budget during screening. Discarding the test.")
+                self.test_repository.discard_record()
+                return False
+
+        # Promote the best tests to the high-fidelity SUT.
+        promoted = sorted(range(len(sut_inputs)), key=lambda j: scores[j])[:self.promote]
+        self.log("Promoting the tests with low-fidelity objectives {} to the high-fidelity SUT.", [scores[j] for j in promoted])
+        high_inputs = [SUTInput(next_tests[j], None, None) for j in promoted]
+        executed = self._fidelity_costs(self._execute_tests(high_inputs, executor), "high")
+
+        return self._record_tests(performance, high_inputs, executed, test_idx, fidelity="high")
+
+    def _run_pipelined(self, executor, test_idx, model_skeletons):
+        raise Exception("A multi-fidelity search cannot be pipelined.")
+
+    def _generate_step_result(self, test_idx, model_skeletons):
+        step_result = super()._generate_step_result(test_idx, model_skeletons)
+        step_result.parameters["screening_size"] = self.screening_size
+        step_result.parameters["promote"] = self.promote
+        step_result.parameters["low_fidelity_cost"] = self.low_fidelity_cost
+        step_result.parameters["record_low_fidelity"] = self.record_low_fidelity
+
+        return step_result
+
+class PortfolioSchedulerMAB:
+    """A multi-armed bandit choosing which algorithm of a Portfolio step
+    generates the next test. Like ObjectiveSelectorMAB, it selects randomly
+    based on success frequencies: an algorithm succeeds when its test
+    improves the minimum objective observed. During the warm-up, each
+    algorithm is used warm_up times. Afterwards, algorithm i is selected with
+    probability proportional to (s_i + exploration) / (n_i + exploration)
+    where s_i is the number of successes and n_i is the number of tests of
+    the algorithm, so no algorithm is abandoned completely."""
+
+    def __init__(self, warm_up=3, exploration=1.0):
+        if exploration <= 0:
+            raise ValueError("The exploration parameter must be positive.")
+
+        self.parameters = {"warm_up": warm_up, "exploration": exploration}
+        self.tests = []
+        self.successes = []
+        self.rng = None
+
+    def __getattr__(self, name):
+        if "parameters" in self.__dict__:
+            if name in self.parameters:
+                return self.parameters.get(name)
+
+        raise AttributeError(name)
+
+    def setup(self, N, rng=None):
+        # A NumPy Generator for random selections or None for the global
+        # NumPy RNG.
+        self.rng = rng
+        self.tests = [0 for _ in range(N)]
+        self.successes = [0 for _ in range(N)]
+        self.selections = [0 for _ in range(N)]
+
+    def select(self, available):
+        """Select one of the available algorithm indices."""
+
+        # Selections are used in the warm-up because tests are recorded only
+        # after they have been executed.
+        warm = [i for i in available if self.selections[i] < self.warm_up]
+        if len(warm) > 0:
+            idx = min(warm, key=lambda i: self.selections[i])
+        else:
+            w = np.array([(self.successes[i] + self.exploration) / (self.tests[i] + self.exploration) for i in available])
+            rng = self.rng if self.rng is not None else np.random
+            idx = available[rng.choice(len(available), p=w/w.sum())]
+
+        self.selections[idx] += 1
+        return idx
+
+    def update(self, idx, success):
+        self.tests[idx] += 1
+        if success:
+            self.successes[idx] += 1
+
+    def get_state(self):
+        return {"tests": list(self.tests),
+                "successes": list(self.successes),
+                "selections": list(self.selections),
+                "rng": self.rng.bit_generator.state if self.rng is not None else None}
+
+    def set_state(self, state):
+        self.tests = list(state["tests"])
+        self.successes = list(state["successes"])
+        self.selections = list(state["selections"])
+        if state["rng"] is not None:
+            self.rng.bit_generator.state = state["rng"]
+
+class Portfolio(Search):
+    """A step which races several algorithms on a shared test repository.
+
+    Tests are executed concurrently on the SUTs of sut_pool (a list of SUTs
+    or a function returning a new SUT, in which case slots SUTs are created;
+    by default one per algorithm). Whenever a SUT is free, the scheduler (by
+    default PortfolioSchedulerMAB) chooses an algorithm which trains on all
+    tests recorded so far and generates a test for the SUT. Training and
+    generation happen in the main thread while the SUTs execute. The tests
+    are recorded in the order they were generated, so a portfolio run is
+    deterministic like a batched Search. The index of the algorithm which
+    generated a test is recorded in its performance record as
+    portfolio_algorithm.
+
+    An algorithm raising an AlgorithmException is removed from the
+    portfolio. Checkpointing a portfolio step is not supported."""
+
+    def __init__(self, algorithms, budget_threshold, mode="exhaust_budget", sut_pool=None, slots=None, scheduler=None, early_termination=False):
+        if len(algorithms) == 0:
+            raise ValueError("A portfolio needs at least one algorithm.")
+        if slots is not None and slots < 1:
+            raise ValueError("The number of slots must be positive.")
+
+        super().__init__(algorithm=None,
+                         budget_threshold=budget_threshold,
+                         mode=mode,
+                         batch_size=slots if slots is not None else len(algorithms),
+                         sut_pool=sut_pool,
+                         early_termination=early_termination)
+
+        self.algorithms = algorithms
+        self.scheduler = scheduler if scheduler is not None else PortfolioSchedulerMAB()
+
+    def setup(self, sut, search_space, test_repository, budget, objective_funcs, objective_selector, device, logger):
+        Step.setup(self, sut, search_space, test_repository, budget, objective_funcs, objective_selector, device, logger)
+
+        for algorithm in self.algorithms:
+            algorithm.setup(
+                search_space=self.search_space,
+                device=self.device,
+                logger=self.logger)
+
+        self._setup_suts()
+        self.scheduler.setup(len(self.algorithms), rng=self.search_space.numpy_generator())
+
+    def get_state(self):
+        raise Exception("Checkpointing a portfolio step is not supported.")
+
+    def _generate(self, idx):
+        """Train the given algorithm on the recorded tests and generate a
+        test. Returns the performance record dictionary and the test or None
+        if no test could be generated."""
+
+        algorithm = self.algorithms[idx]
+        record = {}
+        view = TestRepositoryView(self.test_repository, record)
+        performance = view.performance(view.current_test)
+
+        algorithm.train(self.objective_selector.select(), view, self.budget.remaining())
+        self.budget.consume("training_time", performance.obtain("training_time"))
+        if not self.budget.remaining() > 0:
+            self.log("Ran out of budget during training.")
+            return record, None
+
+        try:
+            test = algorithm.generate_next_test(self.objective_selector.select(), view, self.budget.remaining())
+        except GenerationException:
+            self.log("Algorithm {} could not generate a test.".format(idx + 1))
+            test = None
+        finally:
+            self.budget.consume("generation_time", performance.obtain("generation_time"))
+
+        if not self.budget.remaining() > 0:
+            self.log("Ran out of budget during test generation.")
+            return record, None
+
+        return record, test
+
+    def run(self) -> StepResult:
+        self.budget.update_threshold(self.budget_threshold)
+
+        test_idx = []
+        for algorithm in self.algorithms:
+            algorithm.initialize()
+
+        self.success = self.mode == "stop_at_first_objective" and self.test_repository.minimum_objective <= 0.0
+
+        available = list(range(len(self.algorithms)))
+        free = deque(self.suts)
+        in_flight = deque()
+        executor = ThreadPoolExecutor(max_workers=len(self.suts))
+
+        def can_schedule():
+            return self.budget.remaining() > 0 \
+                   and not (self.success and self.mode == "stop_at_first_objective") \
+                   and len(available) > 0 \
+                   and len(in_flight) < self.budget.remaining_quantity("executions")
+
+        while True:
+            # Give a test to each free SUT.
+            while len(free) > 0 and can_schedule():
+                idx = self.scheduler.select(available)
+                self.log("Algorithm {} generates test {}.".format(idx + 1, self.test_repository.tests + len(in_flight) + 1))
+                try:
+                    record, test = self._generate(idx)
+                except AlgorithmException:
+                    self.log("Algorithm {} failed and is removed from the portfolio.".format(idx + 1))
+                    available.remove(idx)
+                    continue
+                if test is None: continue
+
+                self.log("Generated test {}.", test)
+                sut = free.popleft()
+                sut_input = SUTInput(test, None, None)
+                future = executor.submit(lambda sut, sut_input: self._execute_tests([sut_input], None, suts=[sut])[0], sut, sut_input)
+                in_flight.append((idx, record, sut_input, future, sut))
+
+            if len(in_flight) == 0: break
+
+            # Record the oldest test.
+            idx, record, sut_input, future, sut = in_flight.popleft()
+            executed = future.result()
+            free.append(sut)
+
+            previous_minimum = self.test_repository.minimum_objective
+            performance = self.test_repository.new_record(record)
+            performance.record("portfolio_algorithm", idx)
+            if not self._record_tests(performance, [sut_input], [executed], test_idx):
+                break
+            self.scheduler.update(idx, self.test_repository.minimum_objective < previous_minimum)
+
+        # Wait for the executions whose results are discarded.
+        for _, _, _, future, _ in in_flight:
+            future.result()
+        executor.shutdown()
+
+        for algorithm in self.algorithms:
+            algorithm.finalize()
+
+        self.log("Step minimum objective component: {}".format(self.test_repository.minimum_objective))
+
+        return self._generate_step_result(test_idx, [])
+
+    def _generate_step_result(self, test_idx, model_skeletons):
+        parameters = {}
+        parameters["algorithm_name"] = [algorithm.__class__.__name__ for algorithm in self.algorithms]
+        parameters["algorithm"] = [copy.deepcopy(algorithm.parameters) for algorithm in self.algorithms]
+        parameters["objective_name"] = [objective.__class__.__name__ for objective in self.objective_funcs]
+        parameters["objective"] = [copy.deepcopy(objective.parameters) for objective in self.objective_funcs]
+        parameters["objective_selector_name"] = self.objective_selector.__class__.__name__
+        parameters["objective_selector"] = copy.deepcopy(self.objective_selector.parameters)
+        parameters["executed_tests"] = test_idx
+        parameters["slots"] = len(self.suts)
+        parameters["scheduler"] = copy.deepcopy(self.scheduler.parameters)
+        parameters["algorithm_tests"] = list(self.scheduler.tests)
+        parameters["algorithm_successes"] = list(self.scheduler.successes)
+        parameters["early_termination"] = bool(self.early_termination)
+
+        return StepResult(self.test_repository, self.success, parameters)
+
 class Load(Step):
     """Step which simply loads pregenerated data from a file. By default we
     record every loaded test into the test repository and consume the budget
     based on the information found in the data file. The budget consumption can
     be disabled by setting consume_budget to False. This can be useful if the
     user wants to populate the test repository with prior data which is not
-    meant to consume any budget."""
+    meant to consume any budget.
+
+    The data file is accessed through an index (see stgem.storage) so that
+    only the selected tests are read from the file. The index is built when
+    the file is loaded for the first time and it is shared by all replicas
+    run in the same process."""
 
     def __init__(self, file_name, mode="initial", load_range=None, consume_budget=True, recompute_objective=False):
         self.file_name = file_name
@@ -247,7 +1181,7 @@ class Load(Step):
             raise Exception("Pregenerated date file '{}' does not exist.".format(self.file_name))
         if mode not in ["initial", "random"]:
             raise ValueError("Unknown load mode '{}'.".format(mode))
-        if load_range < 0:
+        if load_range is not None and load_range < 0:
             raise ValueError("The load range {} cannot be negative.".format(load_range))
         self.mode = mode
         self.load_range = load_range
@@ -272,7 +1206,7 @@ class Load(Step):
         test_idx = []
 
         try:
-            raw_data = STGEMResult.restore_from_file(self.file_name)
+            raw_data = open_indexed_result(self.file_name)
         except:
             raise Exception("Error loading STGEMResult object from file '{}'.".format(self.file_name))
 
@@ -281,7 +1215,7 @@ class Load(Step):
         either the budget is consumed or we have loaded load_range many tests.
         """
 
-        range_max = raw_data.test_repository.tests
+        range_max = raw_data.tests
         if self.load_range is None:
             self.load_range = range_max
         elif self.load_range > range_max:
@@ -293,11 +1227,10 @@ class Load(Step):
         elif self.mode == "initial":
             idx = range(self.load_range)
 
-        for i in idx:
+        # Read all selected tests with a single pass over the file.
+        for X, Z, Y, old_performance in raw_data.get_many(idx):
             if self.budget.remaining() == 0: break
             self.log("Budget remaining {}.".format(self.budget.remaining()))
-            X, Z, Y = raw_data.test_repository.get(i)
-            old_performance = raw_data.test_repository.performance(i)
 
             if len(X.inputs) != self.search_space.input_dimension:
                 raise ValueError("Loaded sample input dimension {} does not match SUT input dimension {}".format(len(X.inputs), self.search_space.input_dimension))
@@ -334,14 +1267,14 @@ class Load(Step):
             idx = self.test_repository.finalize_record()
             test_idx.append(idx)
 
-            self.log("Loaded randomly a test with input")
-            self.log(str(X))
+            self.log("Loaded randomly a test with input", level=DEBUG)
+            self.log(lambda: str(X), level=DEBUG)
             if Z.error is not None:
-                self.log("and output")
-                self.log(str(Z))
-                self.log("and objective {}.".format(Y))
+                self.log("and output", level=DEBUG)
+                self.log(lambda: str(Z), level=DEBUG)
+                self.log("and objective {}.", Y, level=DEBUG)
             else:
-                self.log("which failed to execute and produce output.")
+                self.log("which failed to execute and produce output.", level=DEBUG)
 
         if self.mode == "initial":
             self.log("Loaded initial {} tests from the result file {}.".format(self.load_range, self.file_name))
@@ -364,9 +1297,34 @@ class Load(Step):
 
         return step_result
 
+class _CheckpointPickler(pickle.Pickler):
+    """Pickler which stores references to the given objects (the SUT, the
+    search space, etc.) instead of the objects themselves."""
+
+    def __init__(self, file, references):
+        super().__init__(file)
+        self.references = {id(obj): key for key, obj in references.items()}
+
+    def persistent_id(self, obj):
+        return self.references.get(id(obj))
+
+class _CheckpointUnpickler(pickle.Unpickler):
+
+    def __init__(self, file, references):
+        super().__init__(file)
+        self.references = references
+
+    def persistent_load(self, key):
+        if not key in self.references:
+            raise Exception("The checkpoint refers to an unknown object '{}'.".format(key))
+        return self.references[key]
+
 class STGEM:
 
-    def __init__(self, description, sut: SUT, objectives, objective_selector=None, budget: Budget = None, steps=None):
+    # Version of the checkpoint file format.
+    CHECKPOINT_VERSION = 1
+
+    def __init__(self, description, sut: SUT, objectives, objective_selector=None, budget: Budget = None, steps=None, test_repository_parameters=None, checkpoint_file=None, reproducibility="strict"):
         self.description = description
         # The description might be used as a file name, so we check for some
         # nongood characters.
@@ -390,39 +1348,86 @@ class STGEM:
         self.steps = [] if steps is None else steps
         self.device = None
 
+        # Parameters for the test repository created in setup. See the class
+        # TestRepository for the available parameters.
+        self.test_repository_parameters = {} if test_repository_parameters is None else test_repository_parameters
+
+        # If set, the steps save checkpoints into this file periodically and
+        # a checkpoint is saved after each step. See the method checkpoint.
+        self.checkpoint_file = checkpoint_file
+        self.current_step = 0
+
+        # How a seeded run is made reproducible. See the method setup_seed.
+        if not reproducibility in ["fast", "strict"]:
+            raise Exception("Unknown reproducibility mode '{}'.".format(reproducibility))
+        self.reproducibility = reproducibility
+        self.seed_sequence = None
+        self._step_running = False
+        self._resume_step = None
+
         self.logger = Logger()
-        self.log = lambda msg: (self.logger("stgem", msg) if self.logger is not None else None)
+        self.log = lambda msg, *args, **kwargs: (self.logger("stgem", msg, *args, **kwargs) if self.logger is not None else None)
 
     def setup_seed(self, seed=None):
+        """Seed the random number generators. We use a random seed unless it
+        is specified.
+
+        In the strict reproducibility mode, the global RNGs of Python, NumPy,
+        and torch are seeded with the seed and, if the seed is given, torch is
+        made to use deterministic algorithms only. This makes runs
+        reproducible also on GPUs, but it makes torch a lot slower.
+
+        In the fast mode, the seed is expanded with a NumPy SeedSequence into
+        independent streams for the global RNGs, the search space RNG, the
+        objective selector, and the models and steps, each of which gets its
+        own generator (see SearchSpace.numpy_generator and
+        SearchSpace.torch_generator). Deterministic algorithms are
+        disabled, so runs are reproducible on CPU but not necessarily on GPU.
+        The two modes give different results for the same seed, and the
+        strict mode, which is the default, gives the same results as earlier
+        versions."""
+
         self.seed = seed
-        # We use a random seed unless it is specified.
-        # Notice that making Pytorch deterministic makes it a lot slower.
-        if self.seed is not None:
-            torch.use_deterministic_algorithms(mode=True)
-            os.environ["CUBLAS_WORKSPACE_CONFIG"] = ":4096:8"
-        else:
+        if self.seed is None:
             self.seed = random.randint(0, 2**15)
 
-        random.seed(self.seed)
-        np.random.seed(self.seed)
-        torch.manual_seed(self.seed)
+        strict = self.reproducibility == "strict"
+        # Notice that making Pytorch deterministic makes it a lot slower. The
+        # flag is global, so we also reset it in case an earlier run in the
+        # same process (e.g., an earlier replica on an Experiment worker) set
+        # it.
+        torch.use_deterministic_algorithms(mode=strict and seed is not None)
+        if strict and seed is not None:
+            os.environ["CUBLAS_WORKSPACE_CONFIG"] = ":4096:8"
 
-        # A random source for SUT for deterministic random samples from the
-        # input space.
-        self.search_space_rng = np.random.RandomState(seed=self.seed)
+        if strict:
+            random.seed(self.seed)
+            np.random.seed(self.seed)
+            torch.manual_seed(self.seed)
+
+            # A random source for SUT for deterministic random samples from
+            # the input space.
+            self.search_space_rng = np.random.RandomState(seed=self.seed)
+            self.seed_sequence = None
+        else:
+            python_sequence, numpy_sequence, torch_sequence, search_space_sequence, self.seed_sequence = np.random.SeedSequence(self.seed).spawn(5)
+            random.seed(int(python_sequence.generate_state(1, dtype=np.uint64)[0]))
+            np.random.seed(numpy_sequence.generate_state(4))
+            torch.manual_seed(int(torch_sequence.generate_state(1, dtype=np.uint64)[0]))
+            self.search_space_rng = np.random.RandomState(np.random.MT19937(search_space_sequence))
 
     def setup_sut(self):
         self.sut.setup()
 
     def setup_search_space(self):
         self.search_space = SearchSpace()
-        self.search_space.setup(sut=self.sut, objectives=self.objectives, rng=self.search_space_rng)
+        self.search_space.setup(sut=self.sut, objectives=self.objectives, rng=self.search_space_rng, seed_sequence=self.seed_sequence)
 
     def setup_objectives(self):
         for o in self.objectives:
             o.setup(self.sut)
 
-        self.objective_selector.setup(self.objectives)
+        self.objective_selector.setup(self.objectives, rng=self.search_space.numpy_generator())
 
     def setup_steps(self):
         for step in self.steps:
@@ -435,16 +1440,23 @@ class STGEM:
                 objective_selector=self.objective_selector,
                 device=self.device,
                 logger=self.logger)
+            step.checkpoint_callback = self._step_checkpoint
+
+    def setup(self, seed=None, use_gpu=True, device=None):
+        """Set up the generator for running. The torch device is the given
+        device (a torch.device or a string like 'cuda:1') if any, and
+        otherwise a CUDA device if use_gpu is True and CUDA is available."""
 
-    def setup(self, seed=None, use_gpu=True):
-        if use_gpu:
+        if device is not None:
+            self.device = torch.device(device)
+        elif use_gpu:
             self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
             if self.device.type != "cuda":
-                self.log("Warning: requested torch device 'cuda' but got '{}'.".format(self.device.type))
+                self.log("Warning: requested torch device 'cuda' but got '{}'.", self.device.type, level=WARNING)
         else:
             self.device = torch.device("cpu")
 
-        self.test_repository = TestRepository()
+        self.test_repository = TestRepository(copy.deepcopy(self.test_repository_parameters))
 
         self.setup_seed(seed=seed)
         self.setup_sut()
@@ -458,13 +1470,131 @@ class STGEM:
     def _run(self) -> STGEMResult:
         # Running this assumes that setup has been run.
 
-        # Setup and run steps sequentially.
-        self.step_results = []
-        for step in self.steps:
-            self.step_results.append(step.run())
+        # Setup and run steps sequentially. When resuming from a checkpoint,
+        # we continue from the step that was running.
+        if self._resume_step is None:
+            self.step_results = []
+            first_step = 0
+        else:
+            first_step = self._resume_step
+            self._resume_step = None
+
+        for self.current_step in range(first_step, len(self.steps)):
+            self._step_running = True
+            self.step_results.append(self.steps[self.current_step].run())
+            self._step_running = False
+
+            if self.checkpoint_file is not None:
+                self.current_step += 1
+                self.checkpoint(self.checkpoint_file)
 
         return self._generate_result(self.step_results)
 
+    def _step_checkpoint(self):
+        if self.checkpoint_file is not None:
+            self.checkpoint(self.checkpoint_file)
+
+    def _checkpoint_references(self):
+        """Objects which are not saved into a checkpoint but are recreated by
+        setup. References to them are restored to point to the new
+        objects."""
+
+        references = {
+            "sut": self.sut,
+            "search_space": self.search_space,
+            "logger": self.logger,
+            "budget": self.budget,
+            "objective_selector": self.objective_selector
+        }
+        for i, objective in enumerate(self.objectives):
+            references["objective_{}".format(i)] = objective
+        for i, step in enumerate(self.steps):
+            for j, sut in enumerate(getattr(step, "suts", [])):
+                references["step_{}_sut_{}".format(i, j)] = sut
+
+        return references
+
+    def checkpoint(self, file_name):
+        """Save the state of a running generator into the given file. The
+        state consists of the index of the current step and its state (see
+        Step.get_state), the test repository, the step results, the budget,
+        the objective selector, and the states of all random number
+        generators. The SUT, the objectives, and other objects created by
+        setup are not saved. The checkpoint is written into a temporary file
+        which is then renamed.
+
+        Notice that torch tensors are saved on their current device."""
+
+        state = {
+            "step": self.current_step,
+            "step_state": self.steps[self.current_step].get_state() if self._step_running else None,
+            "step_results": self.step_results,
+            "test_repository": self.test_repository,
+            "budget": self.budget.get_state(),
+            "objective_selector": self.objective_selector.get_state(),
+            "rng": {
+                "python": random.getstate(),
+                "numpy": np.random.get_state(),
+                "torch": torch.get_rng_state(),
+                "cuda": torch.cuda.get_rng_state_all() if torch.cuda.is_available() else None,
+                "search_space": self.search_space_rng.get_state()
+            }
+        }
+
+        header = {
+            "version": self.CHECKPOINT_VERSION,
+            "description": self.description,
+            "sut_name": self.sut.__class__.__name__,
+            "seed": self.seed
+        }
+
+        temp_file_name = "{}.tmp".format(file_name)
+        with open(temp_file_name, "wb") as file:
+            pickle.dump(header, file)
+            _CheckpointPickler(file, self._checkpoint_references()).dump(state)
+        os.replace(temp_file_name, file_name)
+
+        self.log("Saved a checkpoint into '{}'.".format(file_name))
+
+    def resume(self, file_name, use_gpu=True, device=None) -> STGEMResult:
+        """Set up the generator with the seed found in the given checkpoint
+        file, restore the saved state, and continue running. The generator
+        must be constructed in the same way as the generator that saved the
+        checkpoint."""
+
+        with open(file_name, "rb") as file:
+            header = pickle.load(file)
+            if header["version"] != self.CHECKPOINT_VERSION:
+                raise Exception("Unsupported checkpoint version {}.".format(header["version"]))
+            if header["description"] != self.description or header["sut_name"] != self.sut.__class__.__name__:
+                raise Exception("The checkpoint '{}' was saved by a different generator.".format(file_name))
+
+            self.setup(seed=header["seed"], use_gpu=use_gpu, device=device)
+
+            state = _CheckpointUnpickler(file, self._checkpoint_references()).load()
+
+        self.test_repository = state["test_repository"]
+        for step in self.steps:
+            step.test_repository = self.test_repository
+        self.step_results = state["step_results"]
+        self.budget.set_state(state["budget"])
+        self.objective_selector.set_state(state["objective_selector"])
+
+        self._resume_step = state["step"]
+        if state["step_state"] is not None:
+            self.steps[self._resume_step].set_state(state["step_state"])
+
+        random.setstate(state["rng"]["python"])
+        np.random.set_state(state["rng"]["numpy"])
+        torch.set_rng_state(state["rng"]["torch"])
+        if state["rng"]["cuda"] is not None and torch.cuda.is_available():
+            torch.cuda.set_rng_state_all(state["rng"]["cuda"])
+        self.search_space_rng.set_state(state["rng"]["search_space"])
+
+        self.log("Resuming from step {} of the checkpoint '{}'.".format(self._resume_step + 1, file_name))
+
+        return self._run()
+
     def run(self, seed=None) -> STGEMResult:
         self.setup(seed)
         return self._run()
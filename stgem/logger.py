@@ -1,13 +1,155 @@
 # Multiprocessing does not support Python's logging module as concurrent
-# handling of log file writes is complex. Thus we need our own logger. We use
-# a very simple approach without continuous logging to files.
+# handling of log file writes is complex. Thus we need our own logger. Log
+# records are passed to a sink which prints them (the default), writes them as
+# JSON lines into a file, or puts them into a multiprocess queue from which a
+# LogListener in the parent process forwards them to another sink.
+#
+# Messages are constructed lazily: a message can be a format string with
+# arguments or a callable returning the message, and neither is evaluated
+# unless the record passes the level filters. Thus logging of large objects
+# costs next to nothing when the logger is silent.
+
+import json, os, threading, time
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+OFF = 100
+
+level_names = {"debug": DEBUG, "info": INFO, "warning": WARNING, "error": ERROR, "off": OFF}
+
+def _level(level):
+    if level is None:
+        return OFF
+    if isinstance(level, str):
+        if not level.lower() in level_names:
+            raise Exception("Unknown log level '{}'.".format(level))
+        return level_names[level.lower()]
+    return level
+
+def _level_name(level):
+    for name, value in level_names.items():
+        if value == level:
+            return name
+    return str(level)
+
+class PrintSink:
+    """Print records as 'component: message' to the standard output."""
+
+    def emit(self, record):
+        print("{}: {}".format(record["component"], record["message"]))
+
+    def close(self):
+        pass
+
+class JSONLinesSink:
+    """Append records as JSON objects, one per line, into the given file. The
+    file is opened on first use, so the sink can be pickled to another
+    process, but use a QueueSink if several processes log concurrently."""
+
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self._file = None
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        return {"file_name": self.file_name}
+
+    def __setstate__(self, state):
+        self.__init__(state["file_name"])
+
+    def emit(self, record):
+        line = json.dumps(record, default=str) + "\n"
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.file_name, mode="a")
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+class QueueSink:
+    """Put records into a (multiprocess) queue. Use a LogListener to forward
+    the records to another sink."""
+
+    def __init__(self, queue):
+        self.queue = queue
+
+    def emit(self, record):
+        self.queue.put(record)
+
+    def close(self):
+        pass
+
+class LogListener:
+    """Forward the records of a queue into the given sink in a background
+    thread until stop() is called."""
+
+    def __init__(self, queue, sink):
+        self.queue = queue
+        self.sink = sink
+        self._thread = threading.Thread(target=self._worker, daemon=True)
+        self._thread.start()
+
+    def _worker(self):
+        while True:
+            record = self.queue.get()
+            if record is None: break
+            self.sink.emit(record)
+
+    def stop(self):
+        self.queue.put(None)
+        self._thread.join()
+        self.sink.close()
 
 class Logger:
+    """A logger called as logger(component, message, *args, level=INFO,
+    **fields). If args are given, the message is formatted with them, and if
+    the message is callable, it is called to obtain the message. Additional
+    keyword arguments are included as fields of the record. A record is
+    emitted only if the logger is not silent and the level is at least the
+    level of the component given in components or the default level."""
 
-    def __init__(self):
+    def __init__(self, level=INFO, components=None, sink=None):
         self.silent = False
+        self.level = _level(level)
+        self.components = {} if components is None else {name: _level(value) for name, value in components.items()}
+        self.sink = sink if sink is not None else PrintSink()
+
+    def set_level(self, level, component=None):
+        """Set the default level or the level of the given component."""
+
+        if component is None:
+            self.level = _level(level)
+        else:
+            self.components[component] = _level(level)
+
+    def enabled(self, component, level=INFO):
+        """Return True if a record of the given component and level would be
+        emitted."""
+
+        return not self.silent and level >= self.components.get(component, self.level)
+
+    def __call__(self, component, message, *args, level=INFO, **fields):
+        if self.silent or level < self.components.get(component, self.level): return
+
+        if callable(message):
+            message = message()
+        elif len(args) > 0:
+            message = message.format(*args)
 
-    def __call__(self, name, log):
-        if not self.silent:
-            print("{}: {}".format(name, log))
+        record = {"time": time.time(),
+                  "pid": os.getpid(),
+                  "level": _level_name(level),
+                  "component": component,
+                  "message": message}
+        record.update(fields)
+        self.sink.emit(record)
 
+    def close(self):
+        self.sink.close()
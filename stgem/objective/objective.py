@@ -3,11 +3,23 @@ All objectives must output a single number. If several outputs are required
 for a single input, multiple objectives must be specified.
 """
 
+import copy
+
 import numpy as np
 
 import stl.robustness as STL
 from stl.parser import parse
 
+# Parsed specifications by the arguments of parse. Parsing is slow, so a
+# specification is parsed once per process and the parse is copied.
+_parsed_specifications = {}
+
+def parse_specification(specification, ranges=None, nu=None):
+    key = (specification, repr(sorted(ranges.items())) if ranges is not None else None, nu)
+    if not key in _parsed_specifications:
+        _parsed_specifications[key] = parse(specification, ranges=ranges, nu=nu)
+    return copy.deepcopy(_parsed_specifications[key])
+
 class Objective:
 
     def __init__(self):
@@ -26,6 +38,19 @@ class Objective:
     def __call__(self, t, r):
         raise NotImplementedError
 
+    def upper_bound(self, t, r):
+        """Return an upper bound for the objective value of every complete
+        output extending the partial output r (see
+        SUT.report_partial_output) or None if no bound is known."""
+
+        return None
+
+    def decided(self, t, r):
+        """Return True if the objective value is the same for every complete
+        output extending the partial output r."""
+
+        return False
+
 class Minimize(Objective):
     """Objective function which selects the minimum of the specified components
     for vector outputs and minimum value of the selected signals for signal
@@ -67,6 +92,20 @@ class Minimize(Objective):
         else:
             return min(output)
 
+    def upper_bound(self, t, r):
+        # The minimum of a signal can only decrease when the signal is
+        # extended. This does not hold with inversion.
+        if r.output_timestamps is None or self.invert:
+            return None
+
+        return self(t, r)
+
+    def decided(self, t, r):
+        if not self.clip: return False
+
+        bound = self.upper_bound(t, r)
+        return bound is not None and bound <= 0
+
 class FalsifySTL(Objective):
     """Objective function to falsify an STL specification. By default the
     robustness is not scaled, but if scale is True and variable ranges have
@@ -94,7 +133,7 @@ class FalsifySTL(Objective):
         if isinstance(specification, STL.STL):
             self.specification = specification
         else:
-            self.specification = parse(specification, ranges=ranges, nu=nu)
+            self.specification = parse_specification(specification, ranges=ranges, nu=nu)
 
         self.parameters["epsilon"] = epsilon
         self.parameters["scale"] = scale
@@ -123,6 +162,14 @@ class FalsifySTL(Objective):
                 self.time_bounded.append(node)
                 self.time_bounded.append(node.formula_robustness.formulas[0])
 
+        # If the specification is of the form always[a,b] phi where phi has no
+        # temporal operators, then the robustness computed from a signal
+        # prefix reaching time a is an upper bound for the robustness of any
+        # extension of the signal. This allows stopping executions early.
+        self.prefix_monotone = False
+        if isinstance(self.specification, STL.Global):
+            self.prefix_monotone = not any(isinstance(node, (STL.Global, STL.Finally, STL.Until, STL.Next)) for node in self.specification.formulas[0])
+
         """
         One problem with STL usage is that the differences between timestamps
         (input or output) from the used Simulink models can be very small and
@@ -197,7 +244,7 @@ class FalsifySTL(Objective):
 
         return robustness_signal[0], effective_range_signal[0] if effective_range_signal is not None else None
 
-    def _evaluate_signal(self, test, result):
+    def _evaluate_signal(self, test, result, strict_horizon_check=True):
         input_timestamps = test.input_timestamps
         output_timestamps = result.output_timestamps
         input_signals = test.input_denormalized
@@ -239,7 +286,7 @@ class FalsifySTL(Objective):
         trajectories.timestamps = np.arange(len(trajectories.timestamps))
 
         # Allow slight inaccuracy in horizon check.
-        if self.strict_horizon_check and self.horizon - 1e-2 > trajectories.timestamps[-1]:
+        if strict_horizon_check and self.horizon - 1e-2 > trajectories.timestamps[-1]:
             raise Exception("The horizon {} of the formula is too long compared to signal length {}. The robustness cannot be computed.".format(self.horizon, trajectories.timestamps[-1]))
 
         # Adjust time bounds.
@@ -256,8 +303,28 @@ class FalsifySTL(Objective):
         if r.output_timestamps is None:
             robustness, range = self._evaluate_vector(t.inputs, r.outputs)
         else:
-            robustness, range = self._evaluate_signal(t, r)
+            # The horizon of a truncated output is too short by design.
+            robustness, range = self._evaluate_signal(t, r, self.strict_horizon_check and not r.truncated)
+
+        return self._scale_robustness(robustness, range)
+
+    def upper_bound(self, t, r):
+        if r.output_timestamps is None or not self.prefix_monotone: return None
+        if len(r.output_timestamps) == 0 or r.output_timestamps[-1] < self.specification.lower_time_bound: return None
+        # Input signals can extend beyond the partial output, and the
+        # augmented output values would then affect the robustness.
+        if any(not var in self.sut.outputs for var in self.formula_variables): return None
+
+        robustness, range = self._evaluate_signal(t, r, strict_horizon_check=False)
+        return self._scale_robustness(robustness, range)
+
+    def decided(self, t, r):
+        if not self.scale: return False
+
+        bound = self.upper_bound(t, r)
+        return bound is not None and bound <= 0
 
+    def _scale_robustness(self, robustness, range):
         # Scale the robustness to [0,1] if required.
         # TODO: Should epsilon be added even if no scaling is applied?
         if self.scale:
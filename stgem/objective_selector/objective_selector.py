@@ -7,9 +7,27 @@ class ObjectiveSelector:
     def __init__(self):
         self.parameters = {}
         self.dim = 0
+        # A NumPy Generator for random selections or None for the global
+        # NumPy RNG.
+        self.rng = None
 
-    def setup(self, objectives):
+    def setup(self, objectives, rng=None):
         self.dim = len(objectives)
+        self.rng = rng
+
+    def get_state(self):
+        """Return the state of the selector for a checkpoint."""
+
+        state = dict(self.__dict__)
+        state["rng"] = self.rng.bit_generator.state if self.rng is not None else None
+        return state
+
+    def set_state(self, state):
+        state = dict(state)
+        rng_state = state.pop("rng")
+        self.__dict__.update(state)
+        if rng_state is not None:
+            self.rng.bit_generator.state = rng_state
 
     def __getattr__(self, name):
         if "parameters" in self.__dict__:
@@ -48,8 +66,8 @@ class ObjectiveSelectorMAB(ObjectiveSelector):
         self.total_calls = 0
         self.model_successes = []
 
-    def setup(self, objectives):
-        super().setup(objectives)
+    def setup(self, objectives, rng=None):
+        super().setup(objectives, rng)
         self.model_successes = [0 for _ in range(self.dim)]
 
     def select(self):
@@ -57,7 +75,8 @@ class ObjectiveSelectorMAB(ObjectiveSelector):
             return self.select_all()
         else:
             p = [s / self.total_calls for s in self.model_successes]
-            return [np.random.choice(range(0, self.dim), p=p)]
+            rng = self.rng if self.rng is not None else np.random
+            return [rng.choice(range(0, self.dim), p=p)]
 
     def update(self, idx):
         try:
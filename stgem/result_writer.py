@@ -0,0 +1,145 @@
+"""
+Background writer for result files.
+
+Writing a compressed result file in an Experiment result callback blocks the
+parent process which then cannot hand out new work or receive results from
+the workers. A ResultWriter moves pickling, compression, and writing to a
+background thread. The pickled result is split into chunks which are
+compressed in parallel by a thread pool (the compressors release the GIL), and
+the compressed chunks are written as consecutive streams which are read back
+as a single stream by STGEMResult.restore_from_file.
+
+The queue of pending results is bounded, so submit() blocks if the writer
+cannot keep up. Call flush() to wait for all pending results to be written;
+Experiment.run does this automatically for the writer given to it. Errors
+occurring in the background are raised by the next call of submit() or
+flush().
+"""
+
+import os, queue, threading
+from concurrent.futures import ThreadPoolExecutor
+
+import dill as pickle
+
+from stgem.storage import compression_codecs, temporary_file
+
+class ResultWriter:
+
+    def __init__(self, codec="gzip", level=None, max_pending=4, compression_threads=None, chunk_size=4*2**20):
+        if not codec in compression_codecs:
+            raise Exception("Unknown codec '{}'. The available codecs are {}.".format(codec, ", ".join(compression_codecs)))
+        if max_pending < 1:
+            raise Exception("The number of pending results must be positive.")
+        if chunk_size < 1:
+            raise Exception("The chunk size must be positive.")
+
+        self.codec = codec
+        self.extension, _, self._compress, default_level = compression_codecs[codec]
+        self.level = level if level is not None else default_level
+        self.compression_threads = compression_threads if compression_threads is not None else min(4, os.cpu_count() or 1)
+        self.chunk_size = chunk_size
+
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.errors = []
+        # Absolute paths of the submitted files which have not been written.
+        self._pending = set()
+        self._pending_lock = threading.Lock()
+        self.files_written = 0
+        self.bytes_written = 0
+
+        self._executor = ThreadPoolExecutor(max_workers=self.compression_threads) if self._compress is not None else None
+        self._thread = threading.Thread(target=self._worker, daemon=True)
+        self._thread.start()
+        self._closed = False
+
+    @property
+    def file_extension(self):
+        """The extension of result files written with the codec."""
+
+        return ".pickle{}".format(self.extension)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _raise_errors(self):
+        if len(self.errors) > 0:
+            file_name, error = self.errors[0]
+            self.errors = []
+            raise Exception("Writing the result file '{}' failed.".format(file_name)) from error
+
+    def submit(self, result, file_name):
+        """Queue the given STGEMResult to be written into the given file. The
+        result must not be modified after it has been submitted. Raises
+        FileExistsError if the file exists or another result is pending to be
+        written into it."""
+
+        if self._closed:
+            raise Exception("The result writer has been closed.")
+        self._raise_errors()
+
+        key = os.path.abspath(file_name)
+        with self._pending_lock:
+            if key in self._pending or os.path.exists(file_name):
+                raise FileExistsError(file_name)
+            self._pending.add(key)
+
+        self.queue.put((result, file_name))
+
+    def flush(self):
+        """Wait until all submitted results have been written."""
+
+        self.queue.join()
+        self._raise_errors()
+
+    def close(self):
+        if self._closed: return
+
+        self.queue.join()
+        self.queue.put(None)
+        self._thread.join()
+        if self._executor is not None:
+            self._executor.shutdown()
+        self._closed = True
+        self._raise_errors()
+
+    def _worker(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                break
+
+            result, file_name = item
+            try:
+                self._write(result, file_name)
+            except Exception as E:
+                self.errors.append((file_name, E))
+            finally:
+                with self._pending_lock:
+                    self._pending.discard(os.path.abspath(file_name))
+                del result, item
+                self.queue.task_done()
+
+    def _write(self, result, file_name):
+        data = memoryview(pickle.dumps(result))
+        chunks = [data[i:i + self.chunk_size] for i in range(0, len(data), self.chunk_size)]
+        if self._executor is not None:
+            chunks = self._executor.map(lambda chunk: self._compress(chunk, self.level), chunks)
+
+        # First write into a temporary file which is then renamed.
+        temp_file_name, file = temporary_file(file_name)
+        try:
+            with file:
+                for chunk in chunks:
+                    file.write(chunk)
+                    self.bytes_written += len(chunk)
+            os.replace(temp_file_name, file_name)
+        except:
+            if os.path.exists(temp_file_name):
+                os.remove(temp_file_name)
+            raise
+
+        self.files_written += 1
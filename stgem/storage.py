@@ -0,0 +1,552 @@
+"""
+Helpers for storing test repositories and results on disk.
+
+A pickled STGEMResult needs to be unpickled as a whole even if only a couple
+of its tests are needed. This is wasteful when a large pregenerated result
+file is used as a source of initial tests (see the Load step). Here we provide
+an indexed result file format where each test is pickled separately and an
+offset table at the end of the file allows reading individual tests directly.
+
+The file layout is as follows:
+
+    MAGIC | record 0 | record 1 | ... | index | offset of index (8 bytes)
+
+Each record is a compressed pickle of the tuple (SUTInput, SUTOutput,
+objectives, performance record) of a single test. The index is a compressed
+pickle of a dictionary containing the record offsets and lengths and some
+metadata of the original result.
+
+Many SUTs produce signals whose storage dominates the size of a test
+repository. For example, all tests of a Simulink model with a fixed-step
+solver have identical input and output timestamps and piecewise constant
+input signals consist of long runs of equal values. We thus provide the
+following (lossless) encodings which are used by TestRepository:
+
+* ArrayInterner: identical arrays (e.g., timestamps) are stored only once.
+* RunLengthArray: piecewise constant signals are stored as their piece values
+  and the positions where the pieces begin.
+* CompressedArray: signals are delta encoded (on the bit patterns of the
+  values, so this is exact also for floats) and compressed with zlib.
+
+Finally, SpillFile is a temporary file where a TestRepository with a memory
+budget moves output signals that do not fit into memory.
+
+Results of Experiment workers can be transferred to the parent process via a
+shared file (see export_shared and attach_shared). The object is pickled with
+protocol 5 so that the data of large numpy arrays is written out of band into
+the file (in shared memory if available). The parent maps the file into memory
+and the unpickled arrays use the mapped data without copying.
+"""
+
+import bz2, copy, gzip, hashlib, io, lzma, mmap, os, struct, tempfile, threading, weakref, zlib
+
+import dill as pickle
+import numpy as np
+
+# Compression codecs for result files. For each codec, we give the file
+# extension, a function opening a file, a function compressing a bytes object
+# with a given level, and the default level. Each compressed chunk is a
+# complete stream, and the concatenation of the streams is decompressed by the
+# corresponding open function.
+compression_codecs = {
+    "none": ("",     open,      None,                                                None),
+    "gzip": (".gz",  gzip.open, lambda data, level: gzip.compress(data, level),     6),
+    "bz2":  (".bz2", bz2.open,  lambda data, level: bz2.compress(data, level),      9),
+    "xz":   (".xz",  lzma.open, lambda data, level: lzma.compress(data, preset=level), 6)
+}
+
+def codec_from_file_name(file_name):
+    for codec, (extension, _, _, _) in compression_codecs.items():
+        if len(extension) > 0 and file_name.endswith(extension):
+            return codec
+
+    return "none"
+
+def open_compressed(file_name, mode="rb", codec=None):
+    """Open the given file using the given codec. By default, the codec is
+    determined by the file extension."""
+
+    if codec is None:
+        codec = codec_from_file_name(file_name)
+
+    return compression_codecs[codec][1](file_name, mode)
+
+# The umask can only be read by setting it, so we read it once at import when
+# no other threads are creating files.
+_umask = os.umask(0)
+os.umask(_umask)
+
+def temporary_file(file_name):
+    """Create a uniquely named temporary file in the directory of the given
+    file and return its name and the file opened for binary writing. Rename
+    the temporary file to file_name with os.replace when it is complete, so
+    concurrent writers of the same file do not interfere. mkstemp creates the
+    file with mode 0o600, so we give it the usual mode of a new file (0o666
+    with the process umask applied)."""
+
+    fd, temp_file_name = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(file_name)), prefix=os.path.basename(file_name) + ".", suffix=".tmp")
+    try:
+        os.chmod(temp_file_name, 0o666 & ~_umask)
+        return temp_file_name, os.fdopen(fd, "wb")
+    except:
+        os.close(fd)
+        os.remove(temp_file_name)
+        raise
+
+class ArrayInterner:
+    """Maps equal numpy arrays to a single array object. Only weak references
+    are kept, so interning does not keep otherwise unused arrays alive."""
+
+    def __init__(self):
+        self.pool = weakref.WeakValueDictionary()
+
+    def intern(self, array):
+        if not isinstance(array, np.ndarray) or array.dtype.hasobject:
+            return array
+
+        digest = hashlib.blake2b(np.ascontiguousarray(array).tobytes(), digest_size=16).digest()
+        key = (array.dtype.str, array.shape, digest)
+        interned = self.pool.get(key)
+        if interned is None:
+            self.pool[key] = array
+            interned = array
+
+        return interned
+
+class EncodedArray:
+    """Base class for the encoded array representations."""
+
+    @staticmethod
+    def can_encode(array):
+        # We only encode numeric arrays of sufficient size. Other arrays are
+        # left untouched.
+        return isinstance(array, np.ndarray) \
+               and array.dtype.kind in "fiub" \
+               and array.dtype.itemsize in [1, 2, 4, 8] \
+               and array.ndim > 0 \
+               and array.size >= 16
+
+    def decode(self):
+        raise NotImplementedError
+
+class CompressedArray(EncodedArray):
+    """Lossless delta and zlib compressed array. The values are reinterpreted
+    as unsigned integers of the same size and the differences of consecutive
+    values along the last axis are computed using wrapping integer
+    arithmetic. The bytes of the differences are then shuffled so that bytes
+    of equal significance are adjacent and compressed."""
+
+    def __init__(self, array, level=6):
+        array = np.ascontiguousarray(array, dtype=array.dtype.newbyteorder("="))
+        self.dtype = array.dtype.str
+        self.shape = array.shape
+
+        itemsize = array.dtype.itemsize
+        rows = array.reshape(-1, array.shape[-1]).view("u{}".format(itemsize))
+        delta = rows.copy()
+        delta[:, 1:] = rows[:, 1:] - rows[:, :-1]
+        shuffled = delta.view(np.uint8).reshape(-1, itemsize).T
+        self.data = zlib.compress(np.ascontiguousarray(shuffled).tobytes(), level)
+
+    def decode(self):
+        dtype = np.dtype(self.dtype)
+        utype = np.dtype("u{}".format(dtype.itemsize))
+        shuffled = np.frombuffer(zlib.decompress(self.data), dtype=np.uint8).reshape(dtype.itemsize, -1)
+        delta = np.ascontiguousarray(shuffled.T).view(utype).reshape(-1, self.shape[-1])
+        rows = np.cumsum(delta, axis=1, dtype=utype)
+
+        return rows.view(dtype).reshape(self.shape)
+
+class RunLengthArray(EncodedArray):
+    """Run-length encoding along the last axis. For a piecewise constant signal
+    this stores only the piece values and the indices where the pieces
+    begin. Values are compared bitwise, so the encoding is lossless also for
+    signed zeros and NaNs."""
+
+    def __init__(self, array):
+        self.dtype = array.dtype.str
+        self.shape = array.shape
+
+        rows = array.reshape(-1, array.shape[-1])
+        change = np.ones(rows.shape, dtype=bool)
+        change[:, 1:] = RunLengthArray._changes(rows)
+        self.runs = change.sum(axis=1)
+        self.starts = np.nonzero(change)[1].astype(np.int64)
+        self.values = rows[change]
+
+    @staticmethod
+    def _changes(rows):
+        """Return a boolean array telling which elements of the rows differ
+        bitwise from their predecessors."""
+
+        bits = np.ascontiguousarray(rows).view("u{}".format(rows.dtype.itemsize))
+        return bits[:, 1:] != bits[:, :-1]
+
+    @staticmethod
+    def is_beneficial(array):
+        rows = array.reshape(-1, array.shape[-1])
+        runs = 1 + np.count_nonzero(RunLengthArray._changes(rows))
+        return 4*runs < array.size
+
+    def decode(self):
+        length = self.shape[-1]
+        rows = np.empty(shape=(len(self.runs), length), dtype=np.dtype(self.dtype))
+        offset = 0
+        for i, runs in enumerate(self.runs):
+            starts = self.starts[offset:offset + runs]
+            rows[i] = np.repeat(self.values[offset:offset + runs], np.diff(np.append(starts, length)))
+            offset += runs
+
+        return rows.reshape(self.shape)
+
+def _encode(array, memo, run_length=False):
+    """Encode the array if possible. The memo dictionary maps ids of already
+    encoded arrays to their encodings so that shared (interned) arrays have
+    shared encodings."""
+
+    if not EncodedArray.can_encode(array):
+        return array
+    if id(array) in memo:
+        return memo[id(array)][1]
+
+    if run_length and RunLengthArray.is_beneficial(array):
+        encoded = RunLengthArray(array)
+    else:
+        encoded = CompressedArray(array)
+    # Keep a reference to the array so that its id is not reused.
+    memo[id(array)] = (array, encoded)
+
+    return encoded
+
+def _decode(value, memo):
+    if not isinstance(value, EncodedArray):
+        return value
+    if id(value) not in memo:
+        memo[id(value)] = (value, value.decode())
+
+    return memo[id(value)][1]
+
+def pack_input(sut_input, compact_inputs, memo):
+    """Return a copy of the SUTInput whose timestamps and denormalized input are
+    encoded. Piecewise constant signals are run-length encoded."""
+
+    if not compact_inputs:
+        return sut_input
+
+    packed = copy.copy(sut_input)
+    packed.input_timestamps = _encode(sut_input.input_timestamps, memo)
+    packed.input_denormalized = _encode(sut_input.input_denormalized, memo, run_length=True)
+
+    return packed
+
+def pack_output(sut_output, compress_outputs, memo):
+    """Return a copy of the SUTOutput whose signals and timestamps are delta
+    encoded and compressed."""
+
+    if not compress_outputs or sut_output.output_timestamps is None:
+        return sut_output
+
+    packed = copy.copy(sut_output)
+    packed.outputs = _encode(sut_output.outputs, memo)
+    packed.output_timestamps = _encode(sut_output.output_timestamps, memo)
+
+    return packed
+
+def unpack_input(sut_input, memo):
+    if not isinstance(sut_input.input_timestamps, EncodedArray) and not isinstance(sut_input.input_denormalized, EncodedArray):
+        return sut_input
+
+    unpacked = copy.copy(sut_input)
+    unpacked.input_timestamps = _decode(sut_input.input_timestamps, memo)
+    unpacked.input_denormalized = _decode(sut_input.input_denormalized, memo)
+
+    return unpacked
+
+def unpack_output(sut_output, memo):
+    if not isinstance(sut_output.outputs, EncodedArray) and not isinstance(sut_output.output_timestamps, EncodedArray):
+        return sut_output
+
+    unpacked = copy.copy(sut_output)
+    unpacked.outputs = _decode(sut_output.outputs, memo)
+    unpacked.output_timestamps = _decode(sut_output.output_timestamps, memo)
+
+    return unpacked
+
+class SpillFile:
+    """An append-only temporary file for storing objects (signals) which are
+    evicted from memory. The file is removed when closed or when the object is
+    garbage collected."""
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.file = tempfile.TemporaryFile(prefix="stgem_spill_", dir=directory)
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def store(self, obj):
+        """Append the given object to the file and return its (offset,
+        length) pair."""
+
+        data = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+        with self.lock:
+            offset = self.size
+            self.file.seek(offset)
+            self.file.write(data)
+            self.size += len(data)
+
+        return offset, len(data)
+
+    def load(self, offset, length):
+        with self.lock:
+            self.file.seek(offset)
+            data = self.file.read(length)
+
+        return pickle.loads(data)
+
+    def close(self):
+        self.file.close()
+
+class IndexedResultFile:
+    """Random-access reader (and writer) for indexed result files."""
+
+    MAGIC = b"STGEMIDX"
+    VERSION = 1
+
+    def __init__(self, file_name):
+        self.file_name = file_name
+
+        with open(self.file_name, "rb") as file:
+            if file.read(len(self.MAGIC)) != self.MAGIC:
+                raise Exception("The file '{}' is not an indexed result file.".format(self.file_name))
+            file.seek(-8, os.SEEK_END)
+            index_offset = struct.unpack("<Q", file.read(8))[0]
+            file.seek(index_offset)
+            index_end = os.path.getsize(self.file_name) - 8
+            index = pickle.loads(zlib.decompress(file.read(index_end - index_offset)))
+
+        if index["version"] != self.VERSION:
+            raise Exception("Unsupported indexed result file version {}.".format(index["version"]))
+
+        self.offsets = index["offsets"]
+        self.lengths = index["lengths"]
+        self.metadata = index["metadata"]
+        self.tests = len(self.offsets)
+
+    @staticmethod
+    def is_indexed(file_name):
+        with open(file_name, "rb") as file:
+            return file.read(len(IndexedResultFile.MAGIC)) == IndexedResultFile.MAGIC
+
+    @staticmethod
+    def write(result, file_name, compression_level=6):
+        """Write the tests of the given STGEMResult into an indexed result
+        file. The file is first written into a uniquely named temporary file
+        in the same directory which is then renamed, so several processes can
+        build the same file concurrently."""
+
+        test_repository = result.test_repository
+
+        memo = {}
+        offsets = []
+        lengths = []
+        temp_file_name, file = temporary_file(file_name)
+        try:
+            with file:
+                file.write(IndexedResultFile.MAGIC)
+                for i in range(test_repository.tests):
+                    X, Z, Y = test_repository.get(i, include_all=True)
+                    X = pack_input(X, test_repository.compact_inputs, memo)
+                    Z = pack_output(Z, test_repository.compress_outputs, memo)
+                    record = test_repository.performance(i)._record
+                    data = zlib.compress(pickle.dumps((X, Z, Y, record)), compression_level)
+                    offsets.append(file.tell())
+                    lengths.append(len(data))
+                    file.write(data)
+
+                index = {
+                    "version": IndexedResultFile.VERSION,
+                    "offsets": offsets,
+                    "lengths": lengths,
+                    "metadata": {
+                        "description": result.description,
+                        "sut_name": result.sut_name,
+                        "sut_parameters": result.sut_parameters,
+                        "seed": result.seed,
+                        "timestamp": result.timestamp
+                    }
+                }
+                index_offset = file.tell()
+                file.write(zlib.compress(pickle.dumps(index), compression_level))
+                file.write(struct.pack("<Q", index_offset))
+
+            os.replace(temp_file_name, file_name)
+        except:
+            if os.path.exists(temp_file_name):
+                os.remove(temp_file_name)
+            raise
+
+    def get(self, i):
+        """Return the test input, output, objectives, and performance record
+        of the test with the given index."""
+
+        return self.get_many([i])[0]
+
+    def get_many(self, indices):
+        """Return a list of tuples (X, Z, Y, performance) for the given test
+        indices. The file is opened only once and the records are read in file
+        order."""
+
+        for i in indices:
+            if i >= self.tests or i < -self.tests:
+                raise IndexError("Index {} out of bounds.".format(i))
+
+        from stgem.test_repository import PerformanceRecordHandler
+
+        # We open the file for each call instead of keeping it open. This way
+        # the object can be shared by several replicas and forked processes
+        # without the processes interfering with each others file positions.
+        memo = {}
+        results = {}
+        with open(self.file_name, "rb") as file:
+            for i in sorted(set(indices), key=lambda i: self.offsets[i]):
+                file.seek(self.offsets[i])
+                X, Z, Y, record = pickle.loads(zlib.decompress(file.read(self.lengths[i])))
+                results[i] = (unpack_input(X, memo), unpack_output(Z, memo), Y, PerformanceRecordHandler(record))
+
+        return [results[i] for i in indices]
+
+# Cache of opened indexed result files. The key is the absolute path of the
+# original file and the value is the tuple (modification time, size, object).
+# This makes the index available to all replicas run in the same process.
+_indexed_result_cache = {}
+_indexed_result_cache_lock = threading.Lock()
+
+def _index_file_name(file_name):
+    """Return the name of the index file built for the given result file. We
+    prefer to store the index next to the original file, but if this is not
+    possible, we use the temporary directory."""
+
+    index_file_name = "{}.index".format(file_name)
+    if os.access(os.path.dirname(os.path.abspath(file_name)), os.W_OK):
+        return index_file_name
+
+    digest = hashlib.sha1(os.path.abspath(file_name).encode("utf-8")).hexdigest()
+    return os.path.join(tempfile.gettempdir(), "stgem_{}.index".format(digest))
+
+def open_indexed_result(file_name):
+    """Return an IndexedResultFile for the given result file. If the file is a
+    plain pickled STGEMResult, an index file is built on the first call (which
+    requires unpickling the whole result once) and reused afterwards. The
+    opened index is cached for the lifetime of the process."""
+
+    key = os.path.abspath(file_name)
+    stat = os.stat(file_name)
+
+    with _indexed_result_cache_lock:
+        if key in _indexed_result_cache:
+            mtime, size, indexed = _indexed_result_cache[key]
+            if mtime == stat.st_mtime_ns and size == stat.st_size:
+                return indexed
+
+        if IndexedResultFile.is_indexed(file_name):
+            indexed = IndexedResultFile(file_name)
+        else:
+            index_file_name = _index_file_name(file_name)
+            if not os.path.exists(index_file_name) or os.stat(index_file_name).st_mtime_ns < stat.st_mtime_ns:
+                # Import here to avoid a circular import.
+                from stgem.generator import STGEMResult
+
+                IndexedResultFile.write(STGEMResult.restore_from_file(file_name), index_file_name)
+
+            indexed = IndexedResultFile(index_file_name)
+
+        _indexed_result_cache[key] = (stat.st_mtime_ns, stat.st_size, indexed)
+
+    return indexed
+
+class _OutOfBandPickler(pickle.Pickler):
+    """A pickler which passes the data of large numpy arrays out of band to
+    the buffer callback (pickle protocol 5)."""
+
+    min_size = 4096
+
+    def reducer_override(self, obj):
+        if type(obj) is np.ndarray and not obj.dtype.hasobject and obj.nbytes >= self.min_size:
+            return obj.__reduce_ex__(5)
+        return NotImplemented
+
+SHARED_MAGIC = b"STGEMSHM"
+SHARED_ALIGNMENT = 64
+
+def shared_directory():
+    """Return the directory for shared files: /dev/shm if available and
+    otherwise the temporary directory."""
+
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+        return "/dev/shm"
+    return tempfile.gettempdir()
+
+def export_shared(obj, directory=None):
+    """Pickle the given object into a new file in the given directory (default
+    shared_directory()) for attach_shared and return the file name.
+
+    The file layout is as follows:
+
+        MAGIC | buffer 0 | buffer 1 | ... | pickle | table | offset of table (8 bytes)
+
+    The buffers hold the data of the large numpy arrays and are aligned to 64
+    bytes. The table is a pickle of the offsets and lengths of the buffers and
+    the pickle."""
+
+    buffers = []
+    data = io.BytesIO()
+    _OutOfBandPickler(data, protocol=5, buffer_callback=buffers.append).dump(obj)
+
+    with tempfile.NamedTemporaryFile(prefix="stgem_result_", suffix=".shared", dir=directory if directory is not None else shared_directory(), delete=False) as file:
+        file.write(SHARED_MAGIC)
+        offset = len(SHARED_MAGIC)
+        table = {"buffers": []}
+        for buffer in buffers:
+            raw = buffer.raw()
+            padding = -offset % SHARED_ALIGNMENT
+            file.write(b"\0"*padding)
+            offset += padding
+            file.write(raw)
+            table["buffers"].append((offset, raw.nbytes))
+            offset += raw.nbytes
+            buffer.release()
+
+        data = data.getbuffer()
+        file.write(data)
+        table["pickle"] = (offset, data.nbytes)
+        offset += data.nbytes
+
+        file.write(pickle.dumps(table, protocol=pickle.HIGHEST_PROTOCOL))
+        file.write(struct.pack("<Q", offset))
+
+        return file.name
+
+def attach_shared(file_name, remove=True):
+    """Return the object stored by export_shared into the given file. The
+    file is mapped into memory copy-on-write, and the numpy arrays stored out
+    of band refer to the mapped data, so they are not copied unless modified.
+    By default the file is removed; the mapping remains valid."""
+
+    with open(file_name, "rb") as file:
+        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_COPY)
+
+    if mapped[:len(SHARED_MAGIC)] != SHARED_MAGIC:
+        mapped.close()
+        raise Exception("The file '{}' is not a shared result file.".format(file_name))
+
+    view = memoryview(mapped)
+    table_offset = struct.unpack("<Q", view[-8:])[0]
+    table = pickle.loads(view[table_offset:-8])
+    buffers = [view[offset:offset + length] for offset, length in table["buffers"]]
+    offset, length = table["pickle"]
+    obj = pickle.loads(view[offset:offset + length], buffers=buffers)
+
+    if remove:
+        os.remove(file_name)
+
+    return obj
@@ -27,6 +27,8 @@ class SUTOutput:
     output_timestamps: ...
     features: ...
     error: ...
+    # True if the execution was stopped early (see SUT.report_partial_output).
+    truncated: bool = False
 
 
 class SearchSpace:
@@ -36,13 +38,17 @@ class SearchSpace:
         self.output_dimension = 0
         self.objectives = 0
         self.rng = None
+        self.seed_sequence = None
 
-    def setup(self, sut, objectives, rng):
+    def setup(self, sut, objectives, rng, seed_sequence=None):
         self.sut = sut
         self.input_dimension = self.sut.idim
         self.output_dimension = self.sut.odim
         self.objectives = len(objectives)
         self.rng = rng
+        # A NumPy SeedSequence for the torch generators of the models or None
+        # if the models use the global torch RNG.
+        self.seed_sequence = seed_sequence
 
     def is_valid(self, test) -> bool:
         # This is here until valid tests are changed to preconditions. This
@@ -53,6 +59,29 @@ class SearchSpace:
     def sample_input_space(self):
         return self.rng.uniform(-1, 1, size=self.input_dimension)
 
+    def numpy_generator(self):
+        """Return a new NumPy Generator with its own random stream or None if
+        the global NumPy RNG should be used. See torch_generator."""
+
+        if self.seed_sequence is None:
+            return None
+
+        return np.random.default_rng(self.seed_sequence.spawn(1)[0])
+
+    def torch_generator(self):
+        """Return a new CPU torch Generator with its own random stream or
+        None if the models should use the global torch RNG. The streams depend
+        only on the order in which the generators are requested."""
+
+        if self.seed_sequence is None:
+            return None
+
+        import torch
+
+        generator = torch.Generator()
+        generator.manual_seed(int(self.seed_sequence.spawn(1)[0].generate_state(1, dtype=np.uint64)[0]))
+        return generator
+
 
 class SUT:
     """Base class implementing a system under test. """
@@ -77,6 +106,7 @@ class SUT:
             self.parameters["output_type"] = None
 
         self.base_has_been_setup = False
+        self.early_termination_monitor = None
 
     def __getattr__(self, name):
         if "parameters" in self.__dict__:
@@ -236,6 +266,36 @@ class SUT:
 
         return y
 
+    def reset(self):
+        """Reset the SUT before it is reused for another replica (see
+        Experiment). Expensive resources (such as a Matlab engine) are kept,
+        but any state depending on previous executions must be cleared.
+        Derived classes should always call this super class reset method."""
+
+        self.early_termination_monitor = None
+        self._terminated_early = False
+
+    def set_early_termination_monitor(self, monitor):
+        """Set a function which is called with a test and a partial output
+        during the execution of the test and which returns True if the
+        execution can be stopped. The value None removes the monitor."""
+
+        self.early_termination_monitor = monitor
+
+    def report_partial_output(self, test: SUTInput, output: SUTOutput) -> bool:
+        """A SUT which produces its output incrementally (like a simulator)
+        can report the output produced so far during the execution of the
+        given test. If True is returned, the execution should be stopped and
+        the partial output returned. The returned output is then marked as
+        truncated. Reporting is cheap when no monitor has been set."""
+
+        monitor = self.__dict__.get("early_termination_monitor")
+        if monitor is None or not monitor(test, output):
+            return False
+
+        self._terminated_early = True
+        return True
+
     def _execute_test(self, test: SUTInput) -> SUTOutput:
         raise NotImplementedError()
 
@@ -250,11 +310,15 @@ class SUT:
                     raise Exception("Vector input given for vector input SUT.")
 
         # TODO: Check for output.error.
+        self._terminated_early = False
         try:
             output = self._execute_test(test)
         except:
             raise
 
+        if self._terminated_early:
+            output.truncated = True
+
         # Check for correct output type if specified.
         if self.output_type is not None:
             if self.output_type == "vector":
@@ -0,0 +1,295 @@
+"""
+Caching of SUT executions.
+
+Deterministic SUTs are often executed several times on the same input, for
+example, when a Load step is followed by a Search step on the same SUT or when
+a search algorithm proposes the same test again. A CachedSUT wraps a SUT and
+returns a stored output for an input that has been executed before.
+
+The cache key is computed from the SUT class, the SUT parameters, and the
+input quantized to the grid with spacing given by the parameter quantum (with
+quantum None, inputs must be bit-equal). The stored results are kept in a
+SUTCache which has an in-memory tier with least recently used eviction and an
+optional on-disk tier (a directory of files) which can be shared between
+processes and runs. A single SUTCache can be shared by several CachedSUTs,
+for example, by the SUTs of a Search SUT pool.
+
+A cache hit is charged the fraction hit_cost of the budget of the original
+execution (executions and execution time). The default is to charge the full
+cost, so enabling a cache does not change the results of a search. Notice that
+with hit_cost 0 and a budget based only on executions, a search algorithm that
+keeps proposing a cached test never runs out of budget.
+"""
+
+import copy, hashlib, os, threading, time
+from collections import OrderedDict
+
+import dill as pickle
+import numpy as np
+
+from stgem.sut import SUT
+
+class SUTCache:
+    """Storage of SUT execution results with an in-memory tier and an
+    optional on-disk tier. The memory tier holds at most memory_size entries
+    and the least recently used entries are evicted first. If directory is
+    given, entries are also stored on disk. If disk_size is not None, at most
+    disk_size entries are kept on disk evicting the least recently used
+    ones."""
+
+    default_parameters = {"memory_size": 1024,
+                          "directory": None,
+                          "disk_size": None}
+
+    def __init__(self, parameters=None):
+        if parameters is None:
+            parameters = {}
+
+        self.parameters = parameters
+        for key in self.default_parameters:
+            if not key in self.parameters:
+                self.parameters[key] = self.default_parameters[key]
+
+        if self.memory_size < 0:
+            raise Exception("The memory size of a cache cannot be negative.")
+        if self.disk_size is not None and self.disk_size < 0:
+            raise Exception("The disk size of a cache cannot be negative.")
+
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        self.reset_statistics()
+
+        if self.directory is not None:
+            os.makedirs(self.directory, exist_ok=True)
+
+    def __getattr__(self, name):
+        if "parameters" in self.__dict__:
+            if name in self.parameters:
+                return self.parameters.get(name)
+
+        raise AttributeError(name)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def reset_statistics(self):
+        with self._lock:
+            self.hits = 0
+            self.disk_hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    @property
+    def statistics(self):
+        """A dictionary of hit and miss counts. The count hits includes the
+        hits in the disk tier counted also in disk_hits."""
+
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"hits": self.hits,
+                    "disk_hits": self.disk_hits,
+                    "misses": self.misses,
+                    "evictions": self.evictions,
+                    "hit_rate": self.hits / lookups if lookups > 0 else 0.0,
+                    "entries": len(self._entries)}
+
+    def _file_name(self, key):
+        return os.path.join(self.directory, "{}.pickle".format(key))
+
+    def get(self, key):
+        """Return the entry for the given key or None if there is no such
+        entry."""
+
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+
+            if self.directory is not None:
+                file_name = self._file_name(key)
+                try:
+                    with open(file_name, mode="rb") as file:
+                        entry = pickle.load(file)
+                    # Mark the file recently used for disk eviction.
+                    os.utime(file_name)
+                except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+                    entry = None
+
+                if entry is not None:
+                    self.hits += 1
+                    self.disk_hits += 1
+                    self._store_memory(key, entry)
+                    return entry
+
+            self.misses += 1
+            return None
+
+    def put(self, key, entry):
+        with self._lock:
+            self._store_memory(key, entry)
+
+            if self.directory is not None:
+                # Write into a temporary file which is renamed so that
+                # concurrent readers never see partial entries.
+                file_name = self._file_name(key)
+                temp_file_name = "{}.{}.tmp".format(file_name, os.getpid())
+                with open(temp_file_name, mode="wb") as file:
+                    pickle.dump(entry, file)
+                os.replace(temp_file_name, file_name)
+                self._evict_disk()
+
+    def _store_memory(self, key, entry):
+        if self.memory_size == 0: return
+
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.memory_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _evict_disk(self):
+        if self.disk_size is None: return
+
+        files = []
+        for file_name in os.listdir(self.directory):
+            if not file_name.endswith(".pickle"): continue
+            full_name = os.path.join(self.directory, file_name)
+            try:
+                files.append((os.stat(full_name).st_mtime_ns, full_name))
+            except FileNotFoundError:
+                pass
+
+        if len(files) <= self.disk_size: return
+
+        files.sort()
+        for _, full_name in files[:len(files) - self.disk_size]:
+            try:
+                os.remove(full_name)
+                self.evictions += 1
+            except FileNotFoundError:
+                pass
+
+    def clear(self, disk=False):
+        """Remove all entries from memory and optionally from disk."""
+
+        with self._lock:
+            self._entries.clear()
+            if disk and self.directory is not None:
+                for file_name in os.listdir(self.directory):
+                    if file_name.endswith(".pickle"):
+                        os.remove(os.path.join(self.directory, file_name))
+
+class CachedSUT(SUT):
+    """A SUT which wraps the given SUT and caches its executions. All
+    attributes other than the cache parameters are looked up from the wrapped
+    SUT. The cache can be shared between several CachedSUTs; by default a new
+    SUTCache is created."""
+
+    default_parameters = {"quantum": None,
+                          "hit_cost": 1.0}
+
+    def __init__(self, sut, cache=None, parameters=None):
+        if parameters is None:
+            parameters = {}
+
+        # We do not call the parent __init__ as it would set input_type and
+        # output_type which must come from the wrapped SUT.
+        self.parameters = parameters
+        for key in self.default_parameters:
+            if not key in self.parameters:
+                self.parameters[key] = self.default_parameters[key]
+
+        if self.quantum is not None and self.quantum <= 0:
+            raise Exception("The quantum of a cache must be positive.")
+        if not 0 <= self.hit_cost <= 1:
+            raise Exception("The budget cost of a cache hit must be in [0, 1].")
+
+        self.sut = sut
+        self.cache = cache if cache is not None else SUTCache()
+        self.last_execution_cost = None
+        self._sut_key = None
+
+    def __getattr__(self, name):
+        if "parameters" in self.__dict__ and name in self.parameters:
+            return self.parameters.get(name)
+        if "sut" in self.__dict__:
+            return getattr(self.__dict__["sut"], name)
+
+        raise AttributeError(name)
+
+    def setup(self):
+        self.sut.setup()
+
+    def reset(self):
+        # The cache is kept, so later replicas can use it.
+        self.sut.reset()
+        self.last_execution_cost = None
+
+    def set_early_termination_monitor(self, monitor):
+        self.sut.set_early_termination_monitor(monitor)
+
+    def _sut_identifier(self):
+        if self._sut_key is None:
+            h = hashlib.blake2b(digest_size=16)
+            h.update("{}.{}".format(self.sut.__class__.__module__, self.sut.__class__.__name__).encode())
+            try:
+                h.update(pickle.dumps(sorted(self.sut.parameters.items(), key=lambda item: item[0])))
+            except Exception:
+                h.update(repr(sorted(self.sut.parameters.items(), key=lambda item: item[0])).encode())
+            self._sut_key = h.digest()
+
+        return self._sut_key
+
+    def _quantize(self, x):
+        x = np.asarray(x, dtype=float)
+        if self.quantum is None:
+            # Make 0.0 and -0.0 equal.
+            return x + 0.0
+        return np.round(x / self.quantum).astype(np.int64)
+
+    def key(self, test):
+        """Return the cache key of the given SUTInput."""
+
+        # The input timestamps are set by the execution (e.g., for signal
+        # inputs), so only the inputs are used.
+        h = hashlib.blake2b(digest_size=20)
+        h.update(self._sut_identifier())
+        inputs = self._quantize(test.inputs)
+        h.update(str(inputs.shape).encode())
+        h.update(np.ascontiguousarray(inputs).tobytes())
+
+        return h.hexdigest()
+
+    def execute_test(self, test):
+        key = self.key(test)
+        entry = self.cache.get(key)
+        if entry is None:
+            start = time.perf_counter()
+            output = self.sut.execute_test(test)
+            execution_time = time.perf_counter() - start
+            # Errors can be transient, so we do not cache them. Truncated
+            # outputs depend on the monitor, so they are not cached either.
+            if output.error is None and not output.truncated:
+                self.cache.put(key, copy.deepcopy((test.input_denormalized, test.input_timestamps, output, execution_time)))
+            self.last_execution_cost = None
+        else:
+            input_denormalized, input_timestamps, output, execution_time = copy.deepcopy(entry)
+            test.input_denormalized = input_denormalized
+            test.input_timestamps = input_timestamps
+            self.last_execution_cost = {"executions": self.hit_cost,
+                                        "execution_time": self.hit_cost*execution_time}
+
+        return output
+
+    def validity(self, test):
+        return self.sut.validity(test)
@@ -1,10 +1,62 @@
-import time
+import copy, threading, time
+from collections import OrderedDict
 
 import numpy as np
 
+from stgem.storage import ArrayInterner, SpillFile, pack_input, pack_output, unpack_input, unpack_output
+
 class TestRepository:
+    """A repository of executed tests, their outputs, objectives, and
+    performance records.
+
+    The parameters control how signals are stored (see stgem.storage):
+
+    intern_timestamps: Identical input and output timestamp arrays are stored
+                       only once in memory and in result files.
+    compact_inputs:    Denormalized inputs (e.g., piecewise constant signals)
+                       and input timestamps are encoded when the repository is
+                       pickled.
+    compress_outputs:  Output signals and timestamps are delta encoded and
+                       compressed when the repository is pickled.
+
+    All encodings are lossless and the repository is decoded when
+    unpickled.
+
+    The memory used by output signals can be limited:
+
+    memory_budget:     Maximum number of bytes of output signals kept in
+                       memory (None means no limit). When the budget is
+                       exceeded, the signals of the least recently used
+                       outputs are spilled to a temporary file. Inputs,
+                       objectives, features, and errors always stay in memory.
+    spill_directory:   Directory for the spill file (None means the system
+                       temporary directory).
+    spill_cache_size:  Number of spilled outputs kept in memory after they
+                       have been reloaded.
+
+    Spilled signals are transparently reloaded by get(). Use
+    get_inputs_and_objectives() when the outputs are not needed (e.g., for
+    training) as it never reloads spilled signals."""
+
+    default_parameters = {
+        "intern_timestamps": True,
+        "compact_inputs": False,
+        "compress_outputs": False,
+        "memory_budget": None,
+        "spill_directory": None,
+        "spill_cache_size": 8
+    }
+
+    def __init__(self, parameters=None):
+        if parameters is None:
+            parameters = {}
+
+        # Merge default_parameters and parameters, the latter takes priority if a key appears in both dictionaries.
+        self.parameters = parameters
+        for key in self.default_parameters:
+            if not key in self.parameters:
+                self.parameters[key] = self.default_parameters[key]
 
-    def __init__(self):
         self._tests = []               # SUTInput objects.
         self._outputs = []             # SUTOutput objects.
         self._objectives = []          # Objectives for the SUTOutput.
@@ -15,49 +67,208 @@ class TestRepository:
         self.tests = 0
         self.minimum_objective = float("inf")
 
+        self._interner = ArrayInterner()
+        self._init_spilling()
+
+        # The lock allows reading the repository from another thread (see the
+        # pipelined Search step). All methods modifying the repository hold
+        # it.
+        self._lock = threading.RLock()
+
+    def _init_spilling(self):
+        self._spill_file = None
+        self._resident = OrderedDict() # Test index -> bytes of resident signals in LRU order.
+        self._resident_bytes = 0
+        self._spilled = {}             # Test index -> location in the spill file.
+        self._reloaded = OrderedDict() # Test index -> reloaded SUTOutput in LRU order.
+
+    def __getattr__(self, name):
+        if "parameters" in self.__dict__:
+            if name in self.parameters:
+                return self.parameters.get(name)
+
+        raise AttributeError(name)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for key in ["_interner", "_spill_file", "_resident", "_resident_bytes", "_spilled", "_reloaded", "_lock"]:
+            del state[key]
+
+        with self._lock:
+            memo = {}
+            state["_tests"] = [pack_input(sut_input, self.compact_inputs, memo) for sut_input in self._tests]
+            if self._outputs is not None:
+                # Spilled signals are included in the pickle.
+                state["_outputs"] = [pack_output(self._output(i), self.compress_outputs, memo) for i in range(len(self._outputs))]
+
+        return state
+
+    def __setstate__(self, state):
+        # Repositories pickled before the parameters were introduced lack
+        # them, so we use the defaults.
+        if not "parameters" in state:
+            state["parameters"] = {}
+        for key in self.default_parameters:
+            if not key in state["parameters"]:
+                state["parameters"][key] = self.default_parameters[key]
+        self.__dict__.update(state)
+
+        memo = {}
+        self._tests = [unpack_input(sut_input, memo) for sut_input in self._tests]
+        self._interner = ArrayInterner()
+        self._init_spilling()
+        self._lock = threading.RLock()
+        # The outputs can be None if they have been removed to save memory.
+        if self._outputs is not None:
+            self._outputs = [unpack_output(sut_output, memo) for sut_output in self._outputs]
+            for i in range(len(self._outputs)):
+                self._track_output(i)
+            self._enforce_memory_budget()
+
+    def _spilled_fields(self):
+        # Interned timestamps are shared by many outputs, so spilling them
+        # would not free memory.
+        return ["outputs"] if self.intern_timestamps else ["outputs", "output_timestamps"]
+
+    def _signal_bytes(self, sut_output):
+        return sum(getattr(sut_output, field).nbytes for field in self._spilled_fields() if isinstance(getattr(sut_output, field), np.ndarray))
+
+    def _track_output(self, i):
+        """Account for the signals of the resident output with index i."""
+
+        if self.memory_budget is None: return
+
+        if i in self._resident:
+            self._resident_bytes -= self._resident.pop(i)
+        self._spilled.pop(i, None)
+        self._reloaded.pop(i, None)
+
+        n = self._signal_bytes(self._outputs[i])
+        self._resident[i] = n
+        self._resident_bytes += n
+
+    def _enforce_memory_budget(self):
+        """Spill the signals of least recently used outputs until the
+        resident signals fit into the memory budget. The output of an
+        unfinalized test is never spilled."""
+
+        if self.memory_budget is None: return
+
+        for i in list(self._resident):
+            if self._resident_bytes <= self.memory_budget: break
+            if self.unfinalized and i == self.current_test: continue
+            if self._resident[i] == 0: continue
+
+            if self._spill_file is None:
+                self._spill_file = SpillFile(self.spill_directory)
+
+            sut_output = self._outputs[i]
+            fields = self._spilled_fields()
+            self._spilled[i] = self._spill_file.store([getattr(sut_output, field) for field in fields])
+            # We replace the output by a copy without the signals instead of
+            # modifying the object as it might be referenced elsewhere.
+            stub = copy.copy(sut_output)
+            for field in fields:
+                setattr(stub, field, None)
+            self._outputs[i] = stub
+            self._resident_bytes -= self._resident.pop(i)
+
+    def _output(self, i):
+        """Return the output with index i reloading spilled signals if
+        necessary."""
+
+        if i < 0:
+            i += len(self._outputs)
+
+        if not i in self._spilled:
+            if i in self._resident:
+                self._resident.move_to_end(i)
+            return self._outputs[i]
+
+        if i in self._reloaded:
+            self._reloaded.move_to_end(i)
+            return self._reloaded[i]
+
+        sut_output = copy.copy(self._outputs[i])
+        for field, value in zip(self._spilled_fields(), self._spill_file.load(*self._spilled[i])):
+            setattr(sut_output, field, value)
+
+        self._reloaded[i] = sut_output
+        while len(self._reloaded) > self.spill_cache_size:
+            self._reloaded.popitem(last=False)
+
+        return sut_output
+
+    @property
+    def memory_usage(self):
+        """Return the bytes of resident output signals and the number of
+        spilled outputs. Only tracked when a memory budget is set."""
+
+        return self._resident_bytes, len(self._spilled)
+
     @property
     def indices(self):
         return list(range(self.tests))
 
-    def new_record(self):
-        self._performance_records.append({})
-        self.unfinalized = True
-        self.current_test += 1
-        return PerformanceRecordHandler(self._performance_records[-1])
+    def new_record(self, record=None):
+        """Start a new record. A performance record dictionary already filled
+        (e.g., using a TestRepositoryView) can be given."""
+
+        with self._lock:
+            self._performance_records.append({} if record is None else record)
+            self.unfinalized = True
+            self.current_test += 1
+            return PerformanceRecordHandler(self._performance_records[-1])
 
     def record_input(self, sut_input):
-        if not self.unfinalized: return
-        if len(self._tests) <= self.current_test:
-            self._tests.append(sut_input)
-        else:
-            self._tests[-1] = sut_input
+        with self._lock:
+            if not self.unfinalized: return
+            if self.intern_timestamps:
+                sut_input.input_timestamps = self._interner.intern(sut_input.input_timestamps)
+            if len(self._tests) <= self.current_test:
+                self._tests.append(sut_input)
+            else:
+                self._tests[-1] = sut_input
 
     def record_output(self, sut_output):
-        if not self.unfinalized: return
-        if len(self._outputs) <= self.current_test:
-            self._outputs.append(sut_output)
-        else:
-            self._outputs[-1] = sut_output
-
-    def record_objectives(self, objectives):
-        if not self.unfinalized: return
-        if len(self._objectives) <= self.current_test:
-            self._objectives.append(objectives)
-        else:
-            self._objectives[-1] = objectives
-
-        # TODO: This does not work correctly if this method is called twice.
-        # Save minimum objective component observed.
-        m = min(objectives)
-        if m < self.minimum_objective:
-            self.minimum_objective = m
+        with self._lock:
+            if not self.unfinalized: return
+            if self.intern_timestamps:
+                sut_output.output_timestamps = self._interner.intern(sut_output.output_timestamps)
+            if len(self._outputs) <= self.current_test:
+                self._outputs.append(sut_output)
+            else:
+                self._outputs[-1] = sut_output
+            self._track_output(len(self._outputs) - 1)
+
+    def record_objectives(self, objectives, update_minimum=True):
+        """Record the objectives of the current test. If update_minimum is
+        False, the objectives do not affect minimum_objective (used for
+        low-fidelity tests, see MultiFidelitySearch)."""
+
+        with self._lock:
+            if not self.unfinalized: return
+            if len(self._objectives) <= self.current_test:
+                self._objectives.append(objectives)
+            else:
+                self._objectives[-1] = objectives
+
+            if not update_minimum: return
+
+            # TODO: This does not work correctly if this method is called
+            # twice. Save minimum objective component observed.
+            m = min(objectives)
+            if m < self.minimum_objective:
+                self.minimum_objective = m
 
     def discard_record(self):
         pass
 
     def finalize_record(self):
-        self.unfinalized = False
-        self.tests += 1
+        with self._lock:
+            self.unfinalized = False
+            self.tests += 1
+            self._enforce_memory_budget()
 
         return self.current_test
 
@@ -73,6 +284,15 @@ class TestRepository:
         the failed executions can be obtained by passing the keyword argument
         include_all=True."""
 
+        return self._get(args, kwargs, include_outputs=True)
+
+    def get_inputs_and_objectives(self, *args, **kwargs):
+        """As get, but return only the tests and their objectives. Spilled
+        output signals are not reloaded."""
+
+        return self._get(args, kwargs, include_outputs=False)
+
+    def _get(self, args, kwargs, include_outputs):
         return_list = True
 
         if len(args) == 0:
@@ -90,25 +310,80 @@ class TestRepository:
         # Return multiple tests.
         include_all = "include_all" in kwargs and kwargs["include_all"]
         X = []; Z = []; Y = []
-        for i in args:
-            if i >= self.tests or (i < 0 and i < -self.tests):
-                raise IndexError("Index {} out of bounds.".format(i))
-            if self._outputs[i].error is not None and not include_all: continue
-            X.append(self._tests[i])
-            Z.append(self._outputs[i])
-            Y.append(self._objectives[i])
+        with self._lock:
+            for i in args:
+                if i >= self.tests or (i < 0 and i < -self.tests):
+                    raise IndexError("Index {} out of bounds.".format(i))
+                if self._outputs[i].error is not None and not include_all: continue
+                X.append(self._tests[i])
+                if include_outputs:
+                    Z.append(self._output(i))
+                Y.append(self._objectives[i])
 
         if not return_list:
             if len(X) == 0:
                 raise Exception("The test with index {} failed to execute, so it is not returned. Set include_all=True to obtain it.".format(args[0]))
             X = X[0]
-            Z = Z[0]
+            Z = Z[0] if include_outputs else None
             Y = Y[0]
 
-        return X, Z, Y
+        return (X, Z, Y) if include_outputs else (X, Y)
+
+    def performance(self, test_idx):
+        with self._lock:
+            return PerformanceRecordHandler(self._performance_records[test_idx])
+
+class TestRepositoryView:
+    """A read-only view of the tests of a TestRepository that were finalized
+    when the view was created. Tests added later are not visible, so the view
+    can be used from another thread while the repository is being filled.
+    The view has its own performance record for the test being generated,
+    that is, for the index current_test. The record can later be given to
+    TestRepository.new_record."""
+
+    def __init__(self, test_repository, record=None):
+        self.test_repository = test_repository
+        self.tests = test_repository.tests
+        self.current_test = self.tests
+        self.minimum_objective = test_repository.minimum_objective
+        self._performance = PerformanceRecordHandler({} if record is None else record)
+
+    @property
+    def indices(self):
+        return list(range(self.tests))
+
+    def get(self, *args, **kwargs):
+        """See TestRepository.get."""
+
+        return self._get(self.test_repository.get, args, kwargs)
+
+    def get_inputs_and_objectives(self, *args, **kwargs):
+        """See TestRepository.get_inputs_and_objectives."""
+
+        return self._get(self.test_repository.get_inputs_and_objectives, args, kwargs)
+
+    def _get(self, get, args, kwargs):
+        if len(args) == 0:
+            args = [self.indices]
+
+        def check(i):
+            if i >= self.tests or i < -self.tests:
+                raise IndexError("Index {} out of bounds.".format(i))
+            return i if i >= 0 else self.tests + i
+
+        if len(args) == 1 and isinstance(args[0], (int, np.integer)):
+            return get(check(args[0]), **kwargs)
+
+        indices = args[0] if len(args) == 1 else args
+        return get([check(i) for i in indices], **kwargs)
 
     def performance(self, test_idx):
-        return PerformanceRecordHandler(self._performance_records[test_idx])
+        if test_idx == self.current_test:
+            return self._performance
+        if test_idx >= self.tests:
+            raise IndexError("Index {} out of bounds.".format(test_idx))
+
+        return self.test_repository.performance(test_idx)
 
 class PerformanceRecordHandler:
 
@@ -0,0 +1,29 @@
+"""
+Generators shared by the tests.
+"""
+
+from stgem.generator import STGEM, Search
+from stgem.algorithm.random.algorithm import Random
+from stgem.algorithm.random.model import Uniform
+from stgem.objective import Minimize
+from stgem.sut.mo3d import MO3D
+
+def mo3d_generator(description, steps, warm_up=0, sut=None, **kwargs):
+    """Return an STGEM which minimizes each output of MO3D (or of the given
+    SUT with three outputs) separately. If warm_up is positive, the given
+    steps are preceded by a random search step with a budget of warm_up
+    executions. Other keyword arguments are passed to STGEM."""
+
+    if warm_up > 0:
+        steps = [Search(budget_threshold={"executions": warm_up},
+                        algorithm=Random(model_factory=(lambda: Uniform())))] + steps
+
+    return STGEM(
+        description=description,
+        sut=sut if sut is not None else MO3D(),
+        objectives=[Minimize(selected=[0], scale=True),
+                    Minimize(selected=[1], scale=True),
+                    Minimize(selected=[2], scale=True)],
+        steps=steps,
+        **kwargs
+    )
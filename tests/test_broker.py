@@ -0,0 +1,93 @@
+import os, tempfile, threading, unittest
+
+from multiprocess import Process
+
+from stgem.experiment.broker import JobBroker, compress_result, decompress_result, run_worker
+from stgem.generator import STGEM, Search
+from stgem.algorithm.random.algorithm import Random
+from stgem.algorithm.random.model import Uniform
+from stgem.objective import Minimize
+from stgem.sut.mo3d import MO3D
+
+AUTHKEY = b"stgem-test"
+
+def job_runner(job):
+    benchmark, specification, seed = job
+    if specification == "crash" and seed == 1:
+        # Crash the worker process on its first attempt.
+        marker = os.environ["STGEM_TEST_MARKER"]
+        if not os.path.exists(marker):
+            open(marker, "w").close()
+            os._exit(1)
+
+    generator = STGEM(
+        description="{}-{}".format(benchmark, specification),
+        sut=MO3D(),
+        objectives=[Minimize(selected=[0], scale=True)],
+        steps=[
+            Search(budget_threshold={"executions": 5},
+                   algorithm=Random(model_factory=(lambda: Uniform())))
+        ]
+    )
+    generator.setup(seed=seed)
+    generator.logger.silent = True
+    return generator._run()
+
+def worker(address):
+    run_worker(address, AUTHKEY, job_runner)
+
+class TestJobBroker(unittest.TestCase):
+    def test_compression(self):
+        result = job_runner(("mo3d", "plain", 3))
+        for codec in ["none", "gzip", "xz"]:
+            restored = decompress_result(compress_result(result, codec), codec)
+            self.assertEqual(restored.seed, 3)
+            self.assertEqual(restored.test_repository.get()[2], result.test_repository.get()[2])
+
+    def test_broker(self):
+        with tempfile.TemporaryDirectory() as directory:
+            os.environ["STGEM_TEST_MARKER"] = os.path.join(directory, "marker")
+            jobs = [("mo3d", specification, seed) for specification in ["plain", "crash"] for seed in range(3)]
+            results = {}
+            def result_callback(idx, job, result):
+                results[idx] = (job, result)
+
+            manifest_file = os.path.join(directory, "manifest.json")
+            broker = JobBroker(jobs, AUTHKEY, result_callback=result_callback, manifest_file=manifest_file, retries=1, poll_interval=0.1)
+            broker.start()
+
+            # Two local workers stand in for other hosts. The crashed worker
+            # is not restarted, so the other worker runs the retry.
+            workers = [Process(target=worker, args=[broker.address]) for _ in range(2)]
+            for process in workers:
+                process.start()
+            broker.serve()
+            for process in workers:
+                process.join()
+
+            self.assertEqual(sorted(results), list(range(6)))
+            for idx, (job, result) in results.items():
+                self.assertEqual(job, jobs[idx])
+                self.assertEqual(result.seed, job[2])
+                self.assertEqual(result.test_repository.tests, 5)
+            self.assertEqual(broker.manifest.indices("done"), list(range(6)))
+            self.assertEqual(broker.manifest[4]["attempts"], 2)
+
+            # A restarted broker has nothing to do.
+            broker = JobBroker(jobs, AUTHKEY, manifest_file=manifest_file, poll_interval=0.1)
+            self.assertTrue(broker.finished)
+            broker.serve()
+
+            # A wrong key is rejected.
+            broker = JobBroker(jobs[:1], AUTHKEY, poll_interval=0.1)
+            broker.start()
+            with self.assertRaises(Exception):
+                run_worker(broker.address, b"wrong", job_runner)
+            thread = threading.Thread(target=run_worker, args=[broker.address, AUTHKEY, job_runner])
+            thread.start()
+            broker.serve()
+            thread.join()
+            self.assertEqual(broker.manifest.indices("done"), [0])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import os, shutil, unittest
+
+from stgem.catalog import ResultCatalog
+from stgem.generator import STGEM, Search
+from stgem.algorithm.random.algorithm import Random
+from stgem.algorithm.random.model import Uniform
+from stgem.objective import Minimize
+from stgem.sut.mo3d import MO3D
+
+class TestCatalog(unittest.TestCase):
+    def test_catalog(self):
+        path = "test-catalog"
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(os.path.join(path, "MO3D"))
+
+        def run(seed, file_name):
+            generator = STGEM(
+                description="mo3d-catalog",
+                sut=MO3D(),
+                objectives=[Minimize(selected=[0], scale=True),
+                            Minimize(selected=[1], scale=True)],
+                steps=[Search(budget_threshold={"executions": 10},
+                              algorithm=Random(model_factory=(lambda: Uniform())))]
+            )
+            r = generator.run(seed=seed)
+            r.dump_to_file(os.path.join(path, "MO3D", file_name))
+            return r
+
+        r1 = run(1, "A_1.pickle.gz")
+        run(2, "A_2.pickle")
+        run(3, "B_1.pickle")
+
+        catalog = ResultCatalog(path)
+        self.assertEqual(catalog.update(N_workers=2), 3)
+        self.assertTrue(os.path.exists(os.path.join(path, ResultCatalog.default_catalog_file)))
+
+        summaries = catalog.query("A")
+        self.assertEqual(len(summaries), 2)
+        summary = [s for s in summaries if s.seed == 1][0]
+        self.assertEqual(summary.tests, 10)
+        self.assertEqual(len(summary.min_curves), 2)
+        self.assertEqual(len(summary.min_curve), 10)
+        _, _, Y = r1.test_repository.get()
+        self.assertAlmostEqual(summary.min_curves[1][-1], min(y[1] for y in Y))
+        self.assertGreater(summary.total_time, 0)
+
+        # Only new files are summarized on update and removed files are
+        # dropped from a reloaded catalog.
+        run(4, "A_3.pickle")
+        os.remove(os.path.join(path, "MO3D", "B_1.pickle"))
+        catalog = ResultCatalog(path)
+        self.assertEqual(catalog.update(N_workers=1), 1)
+        self.assertEqual(len(catalog.query("A")), 3)
+        self.assertEqual(len(catalog.query("B")), 0)
+        self.assertEqual(len(catalog.query(subdirectory="MO3D")), 3)
+
+        shutil.rmtree(path)
+
+if __name__ == "__main__":
+    unittest.main()
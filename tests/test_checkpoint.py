@@ -0,0 +1,76 @@
+import os, unittest
+
+import numpy as np
+
+from stgem.generator import Search
+from stgem.algorithm.ogan.algorithm import OGAN
+from stgem.algorithm.ogan.model import OGAN_Model
+from stgem.objective_selector import ObjectiveSelectorMAB
+
+from generators import mo3d_generator
+
+class Preempted(Exception):
+    pass
+
+class TestCheckpoint(unittest.TestCase):
+    def get_generator(self, checkpoint_file=None, pipeline=False):
+        return mo3d_generator("mo3d-checkpoint",
+                              [Search(budget_threshold={"executions": 16},
+                                      pipeline=pipeline,
+                                      checkpoint_period=3,
+                                      algorithm=OGAN(model_factory=(lambda: OGAN_Model())))],
+                              warm_up=8,
+                              objective_selector=ObjectiveSelectorMAB(warm_up=10),
+                              checkpoint_file=checkpoint_file)
+
+    def check_resume(self, pipeline, preempt_after):
+        file_name = "mo3d_checkpoint.pickle"
+        if os.path.exists(file_name):
+            os.remove(file_name)
+
+        reference = self.get_generator(pipeline=pipeline).run(seed=3)
+
+        # Stop the generator after it has saved the given number of
+        # checkpoints.
+        generator = self.get_generator(checkpoint_file=file_name, pipeline=pipeline)
+        checkpoint = generator.checkpoint
+        saved = []
+        def preemptible_checkpoint(file_name):
+            checkpoint(file_name)
+            saved.append(file_name)
+            if len(saved) == preempt_after:
+                raise Preempted()
+        generator.checkpoint = preemptible_checkpoint
+        with self.assertRaises(Preempted):
+            generator.run(seed=3)
+
+        resumed = self.get_generator(checkpoint_file=file_name, pipeline=pipeline).resume(file_name)
+
+        self.assertEqual(resumed.seed, 3)
+        self.assertEqual(len(resumed.step_results), 2)
+        self.assertEqual(resumed.test_repository.tests, 16)
+        self.assertEqual(resumed.step_results[1].parameters["executed_tests"], list(range(8, 16)))
+        X1, _, Y1 = reference.test_repository.get()
+        X2, _, Y2 = resumed.test_repository.get()
+        self.assertTrue(np.array_equal([x.inputs for x in X1], [x.inputs for x in X2]))
+        self.assertTrue(np.array_equal(Y1, Y2))
+
+        os.remove(file_name)
+
+    def test_checkpoint(self):
+        # Preempt after the first step and in the middle of the second step.
+        self.check_resume(pipeline=False, preempt_after=1)
+        self.check_resume(pipeline=False, preempt_after=2)
+        self.check_resume(pipeline=True, preempt_after=3)
+
+    def test_wrong_generator(self):
+        file_name = "mo3d_checkpoint_wrong.pickle"
+        self.get_generator(checkpoint_file=file_name).run(seed=1)
+        generator = self.get_generator()
+        generator.description = "other"
+        with self.assertRaises(Exception):
+            generator.resume(file_name)
+        os.remove(file_name)
+
+if __name__ == "__main__":
+    unittest.main()
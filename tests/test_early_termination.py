@@ -0,0 +1,106 @@
+import unittest
+
+import numpy as np
+
+from stgem.generator import STGEM, Search
+from stgem.algorithm.random.algorithm import Random
+from stgem.algorithm.random.model import Uniform
+from stgem.objective import FalsifySTL, Minimize
+from stgem.sut import SUT, SUTOutput
+
+class RampSUT(SUT):
+    """A simulator whose output y(t) = 1 + 2xt/10 on [0, 10] is produced in
+    steps of 0.1 and reported after each step."""
+
+    def __init__(self, parameters=None):
+        super().__init__(parameters)
+        self.input_type = "vector"
+        self.output_type = "signal"
+        self.inputs = ["x"]
+        self.input_range = [[-1, 1]]
+        self.outputs = ["y"]
+        self.output_range = [[-1, 3]]
+        self.steps = 0
+
+    def _execute_test(self, test):
+        x = self.descale(test.inputs.reshape(1, -1), self.input_range).reshape(-1)[0]
+        test.input_denormalized = np.array([x])
+
+        timestamps = []
+        signal = []
+        for t in np.linspace(0, 10, 101):
+            self.steps += 1
+            timestamps.append(t)
+            signal.append(1 + 2*x*t/10)
+            output = SUTOutput(np.array([signal]), np.array(timestamps), None, None)
+            if self.report_partial_output(test, output):
+                break
+
+        return output
+
+class TestEarlyTermination(unittest.TestCase):
+    def test_minimize(self):
+        generator1, generator2 = [STGEM(
+            description="ramp",
+            sut=RampSUT(),
+            objectives=[Minimize(selected=[0])],
+            steps=[
+                Search(budget_threshold={"executions": 20},
+                       early_termination=early_termination,
+                       algorithm=Random(model_factory=(lambda: Uniform())))
+            ]
+        ) for early_termination in [False, True]]
+        r1 = generator1.run(seed=1)
+        r2 = generator2.run(seed=1)
+
+        # The objective values are the same, but falsifying executions are
+        # stopped as soon as the output reaches 0.
+        X1, Z1, Y1 = r1.test_repository.get()
+        X2, Z2, Y2 = r2.test_repository.get()
+        self.assertEqual(Y1, Y2)
+        self.assertTrue(any(y[0] == 0 for y in Y2))
+        for x, z1, z2 in zip(X2, Z1, Z2):
+            self.assertFalse(z1.truncated)
+            self.assertEqual(z2.truncated, x.input_denormalized[0] < -0.5)
+            if z2.truncated:
+                self.assertLess(len(z2.output_timestamps), 101)
+                self.assertLessEqual(z2.outputs[0, -1], 0)
+        self.assertLess(generator2.sut.steps, generator1.sut.steps)
+        self.assertTrue(r2.step_results[0].parameters["early_termination"])
+
+    def test_stl(self):
+        objective = lambda: FalsifySTL("always[0,10] y > 0", ranges={"y": [-1, 3]}, scale=True, strict_horizon_check=True)
+        generator = STGEM(
+            description="ramp",
+            sut=RampSUT(),
+            objectives=[objective()],
+            steps=[
+                Search(mode="stop_at_first_objective",
+                       budget_threshold={"executions": 20},
+                       early_termination=True,
+                       algorithm=Random(model_factory=(lambda: Uniform())))
+            ]
+        )
+        r = generator.run(seed=1)
+        X, Z, Y = r.test_repository.get()
+        self.assertEqual(Y[-1][0], 0)
+        self.assertTrue(Z[-1].truncated)
+        self.assertTrue(all(not z.truncated for z in Z[:-1]))
+
+        # A user predicate.
+        generator = STGEM(
+            description="ramp",
+            sut=RampSUT(),
+            objectives=[objective()],
+            steps=[
+                Search(budget_threshold={"executions": 20},
+                       early_termination=lambda test, output: output.output_timestamps[-1] >= 5,
+                       algorithm=Random(model_factory=(lambda: Uniform())))
+            ]
+        )
+        r = generator.run(seed=1)
+        _, Z, _ = r.test_repository.get()
+        self.assertTrue(all(z.truncated and z.output_timestamps[-1] == 5 for z in Z))
+
+if __name__ == "__main__":
+    unittest.main()
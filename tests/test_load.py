@@ -1,6 +1,7 @@
-import os, unittest
+import os, threading, unittest
 
 from stgem.generator import STGEM, Search, Load
+from stgem.storage import IndexedResultFile, open_indexed_result
 from stgem.algorithm.random.algorithm import Random
 from stgem.algorithm.random.model import Uniform
 from stgem.objective import Minimize
@@ -56,6 +57,70 @@ class TestLoad(unittest.TestCase):
         r = generator.run()
 
         os.remove(file_name)
+        os.remove(file_name + ".index")
+
+    def test_indexed_file(self):
+        generator = STGEM(
+            description="mo3d-indexed",
+            sut=MO3D(),
+            objectives=[Minimize(selected=[0, 1, 2], scale=True)],
+            steps=[Search(budget_threshold={"executions": 20},
+                          algorithm=Random(model_factory=(lambda: Uniform())))
+                  ]
+        )
+
+        file_name = "test-indexed.pickle"
+        r = generator.run(seed=1)
+        try:
+            os.remove(file_name)
+        except:
+            pass
+        r.dump_to_file(file_name)
+
+        # The index is built on the first access and cached afterwards.
+        indexed = open_indexed_result(file_name)
+        self.assertTrue(os.path.exists(file_name + ".index"))
+        self.assertIs(indexed, open_indexed_result(file_name))
+        self.assertEqual(indexed.tests, 20)
+        X1, Z1, Y1 = r.test_repository.get(7)
+        X2, Z2, Y2, performance = indexed.get(7)
+        self.assertTrue((X1.inputs == X2.inputs).all())
+        self.assertEqual(Y1, Y2)
+        self.assertEqual(performance.obtain("execution_time"), r.test_repository.performance(7).obtain("execution_time"))
+
+        # A file written directly in the indexed format can also be loaded.
+        indexed_file_name = "test-indexed.idx"
+        IndexedResultFile.write(r, indexed_file_name)
+        self.assertTrue(IndexedResultFile.is_indexed(indexed_file_name))
+        # The file has the permissions of a regular new file.
+        umask = os.umask(0)
+        os.umask(umask)
+        self.assertEqual(os.stat(indexed_file_name).st_mode & 0o777, 0o666 & ~umask)
+
+        generator = STGEM(
+            description="mo3d-indexed",
+            sut=MO3D(),
+            objectives=[Minimize(selected=[0, 1, 2], scale=True)],
+            steps=[Load(file_name=indexed_file_name,
+                        mode="random",
+                        load_range=10)
+                  ]
+        )
+        r2 = generator.run(seed=2)
+        self.assertEqual(r2.test_repository.tests, 10)
+
+        # Concurrent writers of the same file use their own temporary files.
+        threads = [threading.Thread(target=IndexedResultFile.write, args=(r, indexed_file_name)) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(IndexedResultFile(indexed_file_name).tests, 20)
+        self.assertEqual([f for f in os.listdir(".") if f.startswith(indexed_file_name + ".")], [])
+
+        os.remove(file_name)
+        os.remove(file_name + ".index")
+        os.remove(indexed_file_name)
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,94 @@
+import io, json, os, queue, tempfile, unittest
+from contextlib import redirect_stdout
+
+from stgem.experiment import Experiment
+from stgem.generator import STGEM, Search
+from stgem.algorithm.random.algorithm import Random
+from stgem.algorithm.random.model import Uniform
+from stgem.logger import Logger, JSONLinesSink, LogListener, QueueSink, DEBUG, WARNING
+from stgem.objective import Minimize
+from stgem.sut.mo3d import MO3D
+
+class ListSink:
+    def __init__(self):
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+    def close(self):
+        pass
+
+class TestLogger(unittest.TestCase):
+    def test_logger(self):
+        # The default logger prints as before.
+        logger = Logger()
+        with redirect_stdout(io.StringIO()) as output:
+            logger("step", "Message {}", 1)
+            logger("step", "Hidden", level=DEBUG)
+            logger.silent = True
+            logger("step", "Silent")
+        self.assertEqual(output.getvalue(), "step: Message 1\n")
+
+        # Messages are constructed only if they are emitted.
+        calls = []
+        def message():
+            calls.append(1)
+            return "Lazy"
+
+        sink = ListSink()
+        logger = Logger(level="warning", components={"algorithm": "debug", "model": None}, sink=sink)
+        logger("step", message)
+        logger("model", message, level=WARNING)
+        self.assertEqual(len(calls), 0)
+        self.assertFalse(logger.enabled("step"))
+        logger("algorithm", message, level=DEBUG, test=3)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sink.records[0]["message"], "Lazy")
+        self.assertEqual(sink.records[0]["level"], "debug")
+        self.assertEqual(sink.records[0]["test"], 3)
+
+        logger.set_level("info", component="model")
+        logger("model", "Model {}", 2)
+        self.assertEqual(sink.records[-1]["message"], "Model 2")
+
+        with self.assertRaises(Exception):
+            Logger(level="verbose")
+
+    def test_sinks(self):
+        with tempfile.TemporaryDirectory() as path:
+            file_name = os.path.join(path, "log.jsonl")
+
+            # Records pass through the queue into the file.
+            q = queue.Queue()
+            listener = LogListener(q, JSONLinesSink(file_name))
+            logger = Logger(sink=QueueSink(q))
+            for i in range(3):
+                logger("stgem", "Record {}", i)
+            listener.stop()
+
+            with open(file_name) as file:
+                records = [json.loads(line) for line in file]
+            self.assertEqual([record["message"] for record in records], ["Record {}".format(i) for i in range(3)])
+
+            # Log an experiment into a file.
+            def stgem_factory():
+                return STGEM(
+                    description="mo3d-logger",
+                    sut=MO3D(),
+                    objectives=[Minimize(selected=[0], scale=True)],
+                    steps=[Search(budget_threshold={"executions": 5},
+                                  algorithm=Random(model_factory=(lambda: Uniform())))]
+                )
+
+            seeds = iter(range(100))
+            file_name = os.path.join(path, "experiment.jsonl")
+            with redirect_stdout(io.StringIO()) as output:
+                Experiment(2, stgem_factory, lambda: next(seeds)).run(N_workers=1, log_file=file_name)
+            self.assertEqual(output.getvalue(), "")
+            with open(file_name) as file:
+                records = [json.loads(line) for line in file]
+            self.assertTrue(any(record["component"] == "step" for record in records))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,9 +1,5 @@
 import math, os, unittest
 
-# Avoid a CUDA-related crash in the case that a CUDA device is
-# available. The imports need to be done below.
-os.environ["CUDA_VISIBLE_DEVICES"] = ""
-
 c = 0
 
 class TestPython(unittest.TestCase):
@@ -68,6 +64,395 @@ class TestPython(unittest.TestCase):
             except:
                 pass
 
+    def test_worker_initializer(self):
+        from stgem.experiment import Experiment
+        from stgem.generator import STGEM, Search
+        from stgem.objective import Minimize
+        from stgem.sut.mo3d import MO3D
+        from stgem.algorithm.random.algorithm import Random
+        from stgem.algorithm.random.model import Uniform
+
+        class ResettableMO3D(MO3D):
+            """MO3D which records its identity and the number of resets into
+            its parameters."""
+
+            def reset(self):
+                super().reset()
+                self.parameters["resets"] = self.parameters.get("resets", 0) + 1
+
+        def worker_initializer():
+            sut = ResettableMO3D()
+            sut.parameters["instance"] = (os.getpid(), id(sut))
+            return sut
+
+        def stgem_factory(sut):
+            return STGEM(
+                description="mo3d-worker-initializer",
+                sut=sut,
+                objectives=[Minimize(selected=[0], scale=True),
+                            Minimize(selected=[1], scale=True),
+                            Minimize(selected=[2], scale=True)
+                            ],
+                steps=[
+                    Search(budget_threshold={"executions": 5},
+                           algorithm=Random(model_factory=(lambda: Uniform())))
+                ]
+            )
+
+        for N_workers, result_transfer in [(1, "queue"), (2, "queue"), (2, "shared")]:
+            results = {}
+            def result_callback(idx, r, done):
+                results[idx] = r
+
+            seeds = iter(range(4))
+            experiment = Experiment(4, stgem_factory, lambda: next(seeds), result_callback=result_callback, worker_initializer=worker_initializer)
+            experiment.garbage_collect = False
+            experiment.run(N_workers=N_workers, silent=True, result_transfer=result_transfer)
+
+            self.assertEqual(sorted(results), [0, 1, 2, 3])
+            self.assertEqual([results[idx].seed for idx in range(4)], [0, 1, 2, 3])
+            # Each worker built a single SUT which was reset for each replica.
+            resets = {}
+            for r in results.values():
+                resets.setdefault(r.sut_parameters["instance"], []).append(r.sut_parameters["resets"])
+            self.assertLessEqual(len(resets), N_workers)
+            for values in resets.values():
+                self.assertEqual(sorted(values), list(range(1, len(values) + 1)))
+
+    def test_fault_tolerance(self):
+        import json, tempfile, time
+        from stgem.experiment import Experiment
+        from stgem.generator import STGEM, Search
+        from stgem.objective import Minimize
+        from stgem.sut.mo3d import MO3D
+        from stgem.algorithm.random.algorithm import Random
+        from stgem.algorithm.random.model import Uniform
+
+        class FaultyMO3D(MO3D):
+            """MO3D which fails on its first execution if the marker file does
+            not exist."""
+
+            def __init__(self, marker, failure):
+                super().__init__()
+                self.marker = marker
+                self.failure = failure
+
+            def _execute_test(self, test):
+                if self.marker is not None and not os.path.exists(self.marker):
+                    open(self.marker, "w").close()
+                    if self.failure == "crash":
+                        os._exit(1)
+                    elif self.failure == "hang":
+                        time.sleep(600)
+                    else:
+                        raise Exception("Execution failed.")
+                return super()._execute_test(test)
+
+        with tempfile.TemporaryDirectory() as directory:
+            for N_workers, failure in [(1, "exception"), (2, "exception"), (2, "crash"), (2, "hang")]:
+                marker = os.path.join(directory, "{}_{}".format(N_workers, failure))
+                manifest_file = os.path.join(directory, "manifest_{}_{}.json".format(N_workers, failure))
+
+                def stgem_factory():
+                    return STGEM(
+                        description="mo3d-fault-tolerance",
+                        sut=FaultyMO3D(None, failure),
+                        objectives=[Minimize(selected=[0], scale=True)],
+                        steps=[
+                            Search(budget_threshold={"executions": 5},
+                                   algorithm=Random(model_factory=(lambda: Uniform())))
+                        ]
+                    )
+
+                def generator_callback(generator):
+                    # The second replica fails once.
+                    if generator.seed == 11:
+                        generator.sut.marker = marker
+
+                results = {}
+                def result_callback(idx, r, done):
+                    results[idx] = r
+
+                # Without retries, the failing replica is marked failed.
+                seeds = iter(range(10, 20))
+                experiment = Experiment(3, stgem_factory, lambda: next(seeds), generator_callback=generator_callback, result_callback=result_callback)
+                experiment.garbage_collect = False
+                with self.assertRaises(Exception):
+                    experiment.run(N_workers=N_workers, silent=True, manifest_file=manifest_file, replica_timeout=10, poll_interval=0.1)
+                self.assertEqual(sorted(results), [0, 2])
+                with open(manifest_file) as file:
+                    manifest = json.load(file)["replicas"]
+                self.assertEqual([manifest[str(idx)]["state"] for idx in range(3)], ["done", "failed", "done"])
+                self.assertEqual(manifest["1"]["seed"], 11)
+
+                # A resumed run executes only the failed replica.
+                results.clear()
+                seeds = iter(range(10, 20))
+                experiment = Experiment(3, stgem_factory, lambda: next(seeds), generator_callback=generator_callback, result_callback=result_callback)
+                experiment.garbage_collect = False
+                experiment.run(N_workers=N_workers, silent=True, manifest_file=manifest_file)
+                self.assertEqual(list(results), [1])
+                self.assertEqual(results[1].seed, 11)
+                self.assertEqual(experiment.manifest.indices("done"), [0, 1, 2])
+
+                # With a retry, the replica succeeds in a single run.
+                os.remove(marker)
+                results.clear()
+                seeds = iter(range(10, 20))
+                experiment = Experiment(3, stgem_factory, lambda: next(seeds), generator_callback=generator_callback, result_callback=result_callback)
+                experiment.garbage_collect = False
+                experiment.run(N_workers=N_workers, silent=True, retries=1, replica_timeout=10, poll_interval=0.1)
+                self.assertEqual(sorted(results), [0, 1, 2])
+                self.assertEqual(experiment.manifest[1]["attempts"], 2)
+
+    def test_thread_budget(self):
+        import torch
+        from stgem.experiment import Experiment, available_cores, thread_budget
+        from stgem.generator import STGEM, Search
+        from stgem.objective import Minimize
+        from stgem.sut.mo3d import MO3D
+        from stgem.algorithm.random.algorithm import Random
+        from stgem.algorithm.random.model import Uniform
+
+        self.assertEqual(thread_budget(4, 8), [(2, None)]*4)
+        self.assertEqual(thread_budget(4, 2), [(1, None)]*4)
+        cores = available_cores()
+        for threads, worker_cores in thread_budget(2, 2*len(cores), pin=True):
+            self.assertEqual(threads, len(cores))
+            self.assertEqual(worker_cores, cores)
+        with self.assertRaises(ValueError):
+            thread_budget(2, 0)
+
+        def stgem_factory():
+            return STGEM(
+                description="mo3d-thread-budget",
+                sut=MO3D(),
+                objectives=[Minimize(selected=[0], scale=True)],
+                steps=[
+                    Search(budget_threshold={"executions": 5},
+                           algorithm=Random(model_factory=(lambda: Uniform())))
+                ]
+            )
+
+        def generator_callback(generator):
+            # Report the thread count of the worker in the description.
+            generator.description = "threads-{}-{}".format(torch.get_num_threads(), os.environ["OMP_NUM_THREADS"])
+
+        descriptions = []
+        def result_callback(idx, r, done):
+            descriptions.append(r.description)
+
+        seeds = iter(range(2))
+        experiment = Experiment(2, stgem_factory, lambda: next(seeds), generator_callback=generator_callback, result_callback=result_callback)
+        experiment.garbage_collect = False
+        experiment.run(N_workers=2, silent=True, threads=2, pin_workers=True)
+        self.assertEqual(descriptions, ["threads-1-1"]*2)
+
+    def test_start_method(self):
+        from stgem.experiment import Experiment
+        from stgem.generator import STGEM, Search
+        from stgem.objective import Minimize
+        from stgem.sut.mo3d import MO3D
+        from stgem.algorithm.random.algorithm import Random
+        from stgem.algorithm.random.model import Uniform
+
+        def stgem_factory():
+            return STGEM(
+                description="mo3d-start-method",
+                sut=MO3D(),
+                objectives=[Minimize(selected=[0], scale=True)],
+                steps=[
+                    Search(budget_threshold={"executions": 5},
+                           algorithm=Random(model_factory=(lambda: Uniform())))
+                ]
+            )
+
+        def generator_callback(generator):
+            # Report the device and process of the worker in the description.
+            generator.description = "{}-{}".format(generator.device, os.getpid())
+
+        def run(start_method):
+            results = {}
+            def result_callback(idx, r, done):
+                results[idx] = r
+
+            seeds = iter(range(3))
+            experiment = Experiment(3, stgem_factory, lambda: next(seeds), generator_callback=generator_callback, result_callback=result_callback)
+            experiment.garbage_collect = False
+            experiment.run(N_workers=2, silent=True, start_method=start_method, devices=["cpu"])
+            return [results[idx] for idx in range(3)]
+
+        forked = run("fork")
+        spawned = run("spawn")
+        for r1, r2 in zip(forked, spawned):
+            self.assertTrue(r2.description.startswith("cpu-"))
+            self.assertNotEqual(r2.description, "cpu-{}".format(os.getpid()))
+            # The start method does not affect the results.
+            for x1, x2 in zip(r1.test_repository.get()[0], r2.test_repository.get()[0]):
+                self.assertTrue((x1.inputs == x2.inputs).all())
+
+        with self.assertRaises(ValueError):
+            Experiment(1, stgem_factory, lambda: 0).run(devices=[])
+
+    def test_metrics(self):
+        import json, tempfile
+        from stgem.experiment import Experiment
+        from stgem.experiment.metrics import phases
+        from stgem.generator import STGEM, Search
+        from stgem.objective import Minimize
+        from stgem.sut.mo3d import MO3D
+        from stgem.algorithm.random.algorithm import Random
+        from stgem.algorithm.random.model import Uniform
+
+        def stgem_factory():
+            return STGEM(
+                description="mo3d-metrics",
+                sut=MO3D(),
+                objectives=[Minimize(selected=[0], scale=True)],
+                steps=[
+                    Search(budget_threshold={"executions": 5},
+                           algorithm=Random(model_factory=(lambda: Uniform())))
+                ]
+            )
+
+        with tempfile.TemporaryDirectory() as directory:
+            for N_workers in [1, 2]:
+                metrics_file = os.path.join(directory, "metrics_{}.json".format(N_workers))
+                seeds = iter(range(4))
+                experiment = Experiment(4, stgem_factory, lambda: next(seeds))
+                experiment.garbage_collect = False
+                experiment.run(N_workers=N_workers, silent=True, metrics_file=metrics_file)
+
+                metrics = experiment.metrics
+                self.assertEqual(len(metrics.workers), N_workers)
+                self.assertEqual(sum(worker["replicas"] for worker in metrics.workers.values()), 4)
+                self.assertGreater(metrics.replicas_per_hour, 0)
+                for replica in metrics.replicas.values():
+                    self.assertEqual(replica["state"], "done")
+                    self.assertGreater(replica["phases"]["execution"], 0)
+                for worker_id in metrics.workers:
+                    summary = metrics.worker_summary(worker_id)
+                    self.assertLessEqual(summary["busy"], summary["lifetime"])
+                self.assertIn("replicas/hour", metrics.summary())
+
+                with open(metrics_file) as file:
+                    data = json.load(file)
+                self.assertEqual(len(data["replicas"]), 4)
+                self.assertEqual(set(data["mean_phases"]), set(phases))
+
+    def test_group(self):
+        import tempfile
+        from stgem.catalog import ResultCatalog
+        from stgem.experiment import Experiment
+        from stgem.experiment.group import ExperimentGroup, expected_duration
+        from stgem.generator import STGEM, Search
+        from stgem.objective import Minimize
+        from stgem.sut.mo3d import MO3D
+        from stgem.algorithm.random.algorithm import Random
+        from stgem.algorithm.random.model import Uniform
+
+        def get_stgem_factory(description, executions):
+            def stgem_factory():
+                return STGEM(
+                    description=description,
+                    sut=MO3D(),
+                    objectives=[Minimize(selected=[0], scale=True)],
+                    steps=[
+                        Search(budget_threshold={"executions": executions},
+                               algorithm=Random(model_factory=(lambda: Uniform())))
+                    ]
+                )
+
+            return stgem_factory
+
+        calls = []
+        def get_experiment(description, executions, init_seed):
+            seeds = iter(range(init_seed, init_seed + 2))
+            def result_callback(idx, r, done):
+                calls.append((r.description, idx, r.seed, sorted(done)))
+            return Experiment(2, get_stgem_factory(description, executions), lambda: next(seeds), result_callback=result_callback)
+
+        with tempfile.TemporaryDirectory() as directory:
+            # Estimate the durations from earlier results.
+            for description, executions in [("short", 2), ("long", 20)]:
+                r = get_stgem_factory(description, executions)().run(seed=0)
+                r.dump_to_file(os.path.join(directory, "{}_0.pickle".format(description)))
+            catalog = ResultCatalog(directory)
+            catalog.update(N_workers=1)
+            durations = [expected_duration(catalog, prefix="short_"), expected_duration(catalog, prefix="long_"), expected_duration(catalog, prefix="unknown_")]
+            self.assertLess(durations[0], durations[1])
+            self.assertIsNone(durations[2])
+
+            group = ExperimentGroup([get_experiment("short", 2, 0), get_experiment("long", 20, 10), get_experiment("unknown", 2, 20)], durations)
+            group.garbage_collect = False
+            self.assertEqual(group.order, [1, 2, 0])
+            group.run(N_workers=1, silent=True, manifest_file=os.path.join(directory, "manifest.json"))
+
+        # The longest replicas are run first and the callbacks see only the
+        # replicas of their own experiment.
+        self.assertEqual(calls, [("long", 0, 10, []), ("long", 1, 11, [0]),
+                                 ("unknown", 0, 20, []), ("unknown", 1, 21, [0]),
+                                 ("short", 0, 0, []), ("short", 1, 1, [0])])
+        self.assertEqual([group.manifest[idx]["seed"] for idx in range(6)], [0, 1, 10, 11, 20, 21])
+
+        calls.clear()
+        group = ExperimentGroup([get_experiment("short", 2, 0), get_experiment("long", 20, 10)])
+        group.garbage_collect = False
+        group.run(N_workers=2, silent=True)
+        self.assertEqual(sorted(call[:3] for call in calls), [("long", 0, 10), ("long", 1, 11), ("short", 0, 0), ("short", 1, 1)])
+
+        with self.assertRaises(ValueError):
+            ExperimentGroup([get_experiment("short", 2, 0)], [1.0, 2.0])
+
+    def test_preload(self):
+        import multiprocess
+        from stgem.experiment import Experiment, preloaded
+        from stgem.generator import STGEM, Search
+        from stgem.objective import Minimize
+        from stgem.sut.mo3d import MO3D
+        from stgem.algorithm.random.algorithm import Random
+        from stgem.algorithm.random.model import Uniform
+
+        loads = []
+        self.assertEqual(preloaded("test-preload", lambda: loads.append(1) or "data"), "data")
+        self.assertEqual(preloaded("test-preload", lambda: loads.append(1) or "other"), "data")
+        self.assertEqual(len(loads), 1)
+
+        if not "forkserver" in multiprocess.get_all_start_methods(): return
+
+        def stgem_factory():
+            return STGEM(
+                description="mo3d-preload",
+                sut=MO3D(),
+                objectives=[Minimize(selected=[0], scale=True)],
+                steps=[
+                    Search(budget_threshold={"executions": 5},
+                           algorithm=Random(model_factory=(lambda: Uniform())))
+                ]
+            )
+
+        def generator_callback(generator):
+            # Report the parent of the worker and if the preloaded module is
+            # available.
+            import sys
+            generator.description = "{}-{}".format(os.getppid(), "stgem.experiment.broker" in sys.modules)
+
+        descriptions = []
+        def result_callback(idx, r, done):
+            descriptions.append(r.description)
+
+        seeds = iter(range(2))
+        experiment = Experiment(2, stgem_factory, lambda: next(seeds), generator_callback=generator_callback, result_callback=result_callback)
+        experiment.garbage_collect = False
+        experiment.run(N_workers=2, silent=True, preload=["stgem.experiment.broker"])
+
+        # The workers are forked from the fork server.
+        self.assertEqual(len(descriptions), 2)
+        for description in descriptions:
+            ppid, loaded = description.split("-")
+            self.assertNotEqual(int(ppid), os.getpid())
+            self.assertEqual(loaded, "True")
+
 if __name__ == "__main__":
     unittest.main()
 
@@ -0,0 +1,91 @@
+import unittest
+
+import numpy as np
+
+from stgem.catalog import ReplicaSummary
+from stgem.generator import Search, MultiFidelitySearch
+from stgem.algorithm.random.algorithm import Random
+from stgem.algorithm.random.model import Uniform
+from stgem.sut import SUTOutput
+from stgem.sut.mo3d import MO3D
+
+from generators import mo3d_generator
+
+class CoarseMO3D(MO3D):
+    """MO3D with outputs rounded to one decimal."""
+
+    def _execute_test(self, test):
+        output = super()._execute_test(test)
+        return SUTOutput(np.round(output.outputs, 1), None, None, None)
+
+class FalsifyingMO3D(MO3D):
+    """MO3D whose outputs falsify every objective."""
+
+    def _execute_test(self, test):
+        return SUTOutput(np.full(3, -1000.0), None, None, None)
+
+class TestMultiFidelitySearch(unittest.TestCase):
+    def get_generator(self, record_low_fidelity):
+        return mo3d_generator("mo3d-multifidelity",
+                              [MultiFidelitySearch(budget_threshold={"executions": 12},
+                                                   low_fidelity_sut=CoarseMO3D(),
+                                                   screening_size=4,
+                                                   promote=1,
+                                                   low_fidelity_cost=0.25,
+                                                   record_low_fidelity=record_low_fidelity,
+                                                   algorithm=Random(model_factory=(lambda: Uniform())))])
+
+    def test_multifidelity(self):
+        generator = self.get_generator(True)
+        r = generator.run(seed=1)
+
+        # Each round costs 4*0.25 + 1 executions.
+        self.assertEqual(r.test_repository.tests, 30)
+        fidelities = [r.test_repository.performance(i).obtain("fidelity") for i in range(30)]
+        self.assertEqual(fidelities, (["low"]*4 + ["high"])*6)
+        self.assertEqual(generator.budget.quantities["low_fidelity_executions"], 24)
+        self.assertEqual(generator.budget.quantities["high_fidelity_executions"], 6)
+
+        # The promoted test is the best screened test.
+        X, _, Y = r.test_repository.get()
+        for k in range(6):
+            low = list(range(5*k, 5*k + 4))
+            best = min(low, key=lambda i: min(Y[i]))
+            self.assertTrue(np.array_equal(X[best].inputs, X[5*k + 4].inputs))
+
+        generator = self.get_generator(False)
+        r = generator.run(seed=1)
+        self.assertEqual(r.test_repository.tests, 6)
+        self.assertEqual(generator.budget.quantities["low_fidelity_executions"], 24)
+        self.assertGreater(r.test_repository.performance(0).obtain("screening_time"), 0)
+        self.assertEqual(r.step_results[0].parameters["screening_size"], 4)
+
+        with self.assertRaises(ValueError):
+            MultiFidelitySearch(budget_threshold={"executions": 12}, low_fidelity_sut=CoarseMO3D(), screening_size=2, promote=3, algorithm=Random(model_factory=(lambda: Uniform())))
+
+    def test_low_fidelity_falsification(self):
+        # A falsification found only on the low-fidelity SUT does not make
+        # the following step successful.
+        generator = mo3d_generator("mo3d-multifidelity",
+                                   [MultiFidelitySearch(budget_threshold={"executions": 4},
+                                                        low_fidelity_sut=FalsifyingMO3D(),
+                                                        screening_size=4,
+                                                        low_fidelity_cost=0.25,
+                                                        algorithm=Random(model_factory=(lambda: Uniform()))),
+                                    Search(budget_threshold={"executions": 8},
+                                           mode="stop_at_first_objective",
+                                           algorithm=Random(model_factory=(lambda: Uniform())))])
+        r = generator.run(seed=1)
+
+        _, _, Y = r.test_repository.get()
+        self.assertEqual(min(Y[0]), 0.0)
+        self.assertGreater(r.test_repository.minimum_objective, 0.0)
+        self.assertEqual([step.success for step in r.step_results], [False, False])
+        self.assertEqual(r.test_repository.tests, 10 + 4)
+
+        summary = ReplicaSummary.from_result(r)
+        self.assertIsNone(summary.first_falsification)
+        self.assertEqual(len(summary.min_curve), 6)
+
+if __name__ == "__main__":
+    unittest.main()
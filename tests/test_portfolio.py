@@ -0,0 +1,52 @@
+import unittest
+
+import numpy as np
+
+from stgem.generator import Portfolio, PortfolioSchedulerMAB
+from stgem.algorithm.ogan.algorithm import OGAN
+from stgem.algorithm.ogan.model import OGAN_Model
+from stgem.algorithm.random.algorithm import Random
+from stgem.algorithm.random.model import Uniform
+from stgem.sut.mo3d import MO3D
+
+from generators import mo3d_generator
+
+class TestPortfolio(unittest.TestCase):
+    def get_generator(self, sut_pool, executions=20):
+        return mo3d_generator("mo3d-portfolio",
+                              [Portfolio(budget_threshold={"executions": executions},
+                                         sut_pool=sut_pool,
+                                         scheduler=PortfolioSchedulerMAB(warm_up=2),
+                                         algorithms=[Random(model_factory=(lambda: Uniform())),
+                                                     OGAN(model_factory=(lambda: OGAN_Model()))])],
+                              warm_up=5)
+
+    def test_portfolio(self):
+        r1 = self.get_generator(lambda: MO3D()).run(seed=1)
+        self.assertEqual(r1.test_repository.tests, 20)
+
+        step = r1.step_results[1]
+        self.assertEqual(step.parameters["executed_tests"], list(range(5, 20)))
+        self.assertEqual(sum(step.parameters["algorithm_tests"]), 15)
+        self.assertTrue(all(n >= 2 for n in step.parameters["algorithm_tests"]))
+        algorithms = [r1.test_repository.performance(i).obtain("portfolio_algorithm") for i in range(5, 20)]
+        self.assertEqual(algorithms[:4], [0, 1, 0, 1])
+        self.assertEqual(step.parameters["algorithm_tests"], [algorithms.count(0), algorithms.count(1)])
+
+        # The run is deterministic although the tests are executed
+        # concurrently.
+        r2 = self.get_generator(lambda: MO3D()).run(seed=1)
+        X1, _, Y1 = r1.test_repository.get()
+        X2, _, Y2 = r2.test_repository.get()
+        self.assertTrue(np.allclose([x.inputs for x in X1], [x.inputs for x in X2]))
+        self.assertTrue(np.allclose(Y1, Y2))
+
+        # Without a pool, the tests are executed one by one.
+        r3 = self.get_generator(None).run(seed=1)
+        self.assertEqual(r3.test_repository.tests, 20)
+
+        with self.assertRaises(ValueError):
+            Portfolio(budget_threshold={"executions": 10}, algorithms=[])
+
+if __name__ == "__main__":
+    unittest.main()
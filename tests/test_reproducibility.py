@@ -0,0 +1,90 @@
+import unittest
+
+import numpy as np
+import torch
+
+from stgem.generator import STGEM, Search, PortfolioSchedulerMAB
+from stgem.algorithm.ogan.algorithm import OGAN
+from stgem.algorithm.ogan.model import OGAN_Model
+from stgem.objective import Minimize
+from stgem.objective_selector import ObjectiveSelectorMAB
+from stgem.sut.mo3d import MO3D
+
+from generators import mo3d_generator
+
+class TestReproducibility(unittest.TestCase):
+    def get_generator(self, reproducibility="fast"):
+        return mo3d_generator("mo3d-reproducibility",
+                              [Search(budget_threshold={"executions": 10},
+                                      algorithm=OGAN(model_factory=(lambda: OGAN_Model())))],
+                              warm_up=5,
+                              objective_selector=ObjectiveSelectorMAB(warm_up=5),
+                              reproducibility=reproducibility)
+
+    def get_inputs(self, result):
+        X, _, _ = result.test_repository.get()
+        return np.array([x.inputs for x in X])
+
+    def test_fast(self):
+        # Deterministic algorithms left enabled by an earlier strict run are
+        # disabled.
+        torch.use_deterministic_algorithms(mode=True)
+        r1 = self.get_generator().run(seed=7)
+        self.assertFalse(torch.are_deterministic_algorithms_enabled())
+
+        # The models have their own random streams, so other users of the
+        # global torch RNG do not change the results.
+        generator = self.get_generator()
+        generator.setup(seed=7)
+        torch.rand(100)
+        r2 = generator._run()
+        self.assertTrue(np.array_equal(self.get_inputs(r1), self.get_inputs(r2)))
+
+        models = generator.steps[1].algorithm.models
+        self.assertIsNotNone(models[0].torch_rng)
+        self.assertIsNot(models[0].torch_rng, models[1].torch_rng)
+        self.assertIsNotNone(generator.objective_selector.rng)
+
+        r3 = self.get_generator().run(seed=8)
+        self.assertFalse(np.array_equal(self.get_inputs(r1), self.get_inputs(r3)))
+
+    def test_strict(self):
+        r1 = self.get_generator("strict").run(seed=7)
+        self.assertTrue(torch.are_deterministic_algorithms_enabled())
+        r2 = self.get_generator("strict").run(seed=7)
+        self.assertTrue(np.array_equal(self.get_inputs(r1), self.get_inputs(r2)))
+        torch.use_deterministic_algorithms(mode=False)
+
+        with self.assertRaises(Exception):
+            self.get_generator("unknown")
+
+    def test_default(self):
+        generator = self.get_generator(reproducibility="strict")
+        self.assertEqual(STGEM("default", sut=MO3D(), objectives=[Minimize(selected=[0])], steps=[]).reproducibility, "strict")
+        generator.setup(seed=7)
+        self.assertIsNone(generator.objective_selector.rng)
+        torch.use_deterministic_algorithms(mode=False)
+
+    def test_selector_state(self):
+        generator = self.get_generator()
+        generator.setup(seed=7)
+
+        # The objective selector and the portfolio scheduler restore their
+        # random streams from their states.
+        selector = generator.objective_selector
+        selector.total_calls = 10
+        selector.model_successes = [5, 3, 2]
+        state = selector.get_state()
+        s1 = [selector.select() for _ in range(20)]
+        selector.set_state(state)
+        self.assertEqual(s1, [selector.select() for _ in range(20)])
+
+        scheduler = PortfolioSchedulerMAB(warm_up=0)
+        scheduler.setup(3, rng=generator.search_space.numpy_generator())
+        state = scheduler.get_state()
+        s1 = [scheduler.select([0, 1, 2]) for _ in range(20)]
+        scheduler.set_state(state)
+        self.assertEqual(s1, [scheduler.select([0, 1, 2]) for _ in range(20)])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+import os, shutil, unittest
+
+from stgem.experiment import Experiment
+from stgem.generator import STGEM, Search, STGEMResult
+from stgem.algorithm.random.algorithm import Random
+from stgem.algorithm.random.model import Uniform
+from stgem.objective import Minimize
+from stgem.result_writer import ResultWriter
+from stgem.sut.mo3d import MO3D
+
+class TestResultWriter(unittest.TestCase):
+    def test_result_writer(self):
+        path = "test-result-writer"
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path)
+
+        def stgem_factory():
+            return STGEM(
+                description="mo3d-result-writer",
+                sut=MO3D(),
+                objectives=[Minimize(selected=[0], scale=True)],
+                steps=[Search(budget_threshold={"executions": 20},
+                              algorithm=Random(model_factory=(lambda: Uniform())))]
+            )
+
+        seeds = iter(range(100))
+        for codec in ["none", "gzip", "bz2", "xz"]:
+            # A small chunk size forces the result to be compressed in several
+            # chunks.
+            result_writer = ResultWriter(codec=codec, max_pending=1, compression_threads=2, chunk_size=1000)
+            file_names = {}
+
+            def result_callback(idx, result, done):
+                file_name = os.path.join(path, "{}_{}{}".format(codec, idx, result_writer.file_extension))
+                file_names[file_name] = result
+                result_writer.submit(result, file_name)
+
+            experiment = Experiment(3, stgem_factory, lambda: next(seeds), result_callback=result_callback, result_writer=result_writer)
+            experiment.run(N_workers=1, silent=True)
+
+            self.assertEqual(result_writer.files_written, 3)
+            for file_name, result in file_names.items():
+                self.assertTrue(os.path.exists(file_name))
+                restored = STGEMResult.restore_from_file(file_name)
+                self.assertEqual(restored.seed, result.seed)
+                self.assertEqual(restored.test_repository.get()[2], result.test_repository.get()[2])
+
+                # Existing files are not overwritten.
+                with self.assertRaises(FileExistsError):
+                    result_writer.submit(result, file_name)
+
+            result_writer.close()
+            with self.assertRaises(Exception):
+                result_writer.submit(result, os.path.join(path, "closed.pickle"))
+
+        # A file with a pending result is not overwritten either.
+        first, second = list(file_names.values())[:2]
+        self.assertNotEqual(first.seed, second.seed)
+        with ResultWriter() as result_writer:
+            file_name = os.path.join(path, "pending.pickle.gz")
+            result_writer.submit(first, file_name)
+            with self.assertRaises(FileExistsError):
+                result_writer.submit(second, file_name)
+            result_writer.flush()
+            self.assertEqual(result_writer.files_written, 1)
+            self.assertEqual(STGEMResult.restore_from_file(file_name).seed, first.seed)
+            self.assertEqual([f for f in os.listdir(path) if f.endswith(".tmp")], [])
+
+        # Errors in the background are raised on flush.
+        with ResultWriter() as result_writer:
+            result_writer.submit(result, os.path.join(path, "missing", "result.pickle.gz"))
+            with self.assertRaises(Exception):
+                result_writer.flush()
+
+        shutil.rmtree(path)
+
+if __name__ == "__main__":
+    unittest.main()
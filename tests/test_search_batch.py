@@ -0,0 +1,129 @@
+import threading, unittest
+
+import numpy as np
+import torch
+
+from stgem.generator import Search
+from stgem.algorithm.ogan.algorithm import OGAN
+from stgem.algorithm.ogan.model import OGAN_Model
+from stgem.algorithm.random.algorithm import Random
+from stgem.algorithm.random.model import Uniform
+from stgem.sut.mo3d import MO3D
+
+from generators import mo3d_generator
+
+class RecordingMO3D(MO3D):
+    """MO3D which records the threads executing it and the number of times it
+    has been set up."""
+
+    def __init__(self, parameters=None):
+        super().__init__(parameters)
+        self.threads = set()
+        self.setups = 0
+
+    def setup(self):
+        super().setup()
+        self.setups += 1
+
+    def _execute_test(self, test):
+        self.threads.add(threading.get_ident())
+        return super()._execute_test(test)
+
+class TestSearchBatch(unittest.TestCase):
+    def get_generator(self, batch_size, sut_pool, executions=10, sut=None, **kwargs):
+        return mo3d_generator("mo3d-batch",
+                              [Search(budget_threshold={"executions": executions},
+                                      batch_size=batch_size,
+                                      sut_pool=sut_pool,
+                                      algorithm=OGAN(model_factory=(lambda: OGAN_Model())),
+                                      **kwargs)],
+                              warm_up=8,
+                              sut=sut)
+
+    def test_batch(self):
+        pool = [RecordingMO3D() for _ in range(3)]
+        r1 = self.get_generator(3, pool, executions=15).run(seed=1)
+
+        # The budget is not exceeded although it is not divisible by the batch
+        # size, and the pool SUTs were used.
+        self.assertEqual(r1.test_repository.tests, 15)
+        self.assertEqual(r1.step_results[1].parameters["executed_tests"], list(range(8, 15)))
+        self.assertTrue(all(len(sut.threads) > 0 for sut in pool))
+        self.assertTrue(all(sut.setups == 1 for sut in pool))
+
+        # Only the first test of a batch records training time and the
+        # generation time is shared.
+        training_times = [r1.test_repository.performance(i).obtain("training_time") for i in range(8, 15)]
+        self.assertEqual([t > 0 for t in training_times], [True, False, False, True, False, False, True])
+        generation_times = [r1.test_repository.performance(i).obtain("generation_time") for i in range(8, 11)]
+        self.assertEqual(len(set(generation_times)), 1)
+
+        # The results do not depend on how the tests are executed.
+        r2 = self.get_generator(3, None, executions=15).run(seed=1)
+        r3 = self.get_generator(3, lambda: MO3D(), executions=15).run(seed=1)
+        X1, _, Y1 = r1.test_repository.get()
+        for r in [r2, r3]:
+            X, _, Y = r.test_repository.get()
+            self.assertTrue(np.allclose([x.inputs for x in X1], [x.inputs for x in X]))
+            self.assertTrue(np.allclose(Y1, Y))
+
+        # Without a pool, the SUT of the generator is set up only once.
+        sut = RecordingMO3D()
+        self.get_generator(3, None, executions=15, sut=sut).run(seed=1)
+        self.assertEqual(sut.setups, 1)
+
+        with self.assertRaises(ValueError):
+            Search(budget_threshold={"executions": 10}, batch_size=0, algorithm=Random(model_factory=(lambda: Uniform())))
+
+    def test_pipeline(self):
+        # Pipelined search is deterministic.
+        r1 = self.get_generator(1, None, executions=14, pipeline=True).run(seed=2)
+        r2 = self.get_generator(1, None, executions=14, pipeline=True).run(seed=2)
+        self.assertEqual(r1.test_repository.tests, 14)
+        self.assertTrue(r1.step_results[1].parameters["pipeline"])
+        X1, _, Y1 = r1.test_repository.get()
+        X2, _, Y2 = r2.test_repository.get()
+        self.assertTrue(np.allclose([x.inputs for x in X1], [x.inputs for x in X2]))
+        self.assertTrue(np.allclose(Y1, Y2))
+        for i in range(8, 14):
+            performance = r1.test_repository.performance(i)
+            for key in ["training_time", "generation_time", "execution_time"]:
+                performance.obtain(key)
+
+        # The regeneration policy is consulted after each batch and
+        # regeneration does not break the budget accounting.
+        calls = []
+        def regenerate(test_repository, idx):
+            calls.append(idx)
+            return len(calls) % 2 == 0
+
+        r = self.get_generator(2, [MO3D(), MO3D()], executions=15, pipeline=True, regenerate=regenerate).run(seed=2)
+        self.assertEqual(r.test_repository.tests, 15)
+        self.assertEqual(sum(calls, []), list(range(8, 15)))
+
+        r = self.get_generator(1, None, executions=12, pipeline=True, regenerate="improvement").run(seed=2)
+        self.assertEqual(r.test_repository.tests, 12)
+
+        with self.assertRaises(Exception):
+            Search(budget_threshold={"executions": 10}, regenerate="sometimes", algorithm=Random(model_factory=(lambda: Uniform())))
+
+    def test_pipeline_models(self):
+        # The models are saved before the background thread trains them
+        # again, so the saved skeletons are consistent and deterministic.
+        results = [self.get_generator(1, None, executions=14, pipeline=True, results_include_models=True).run(seed=2) for _ in range(2)]
+        models = [r.step_results[1].models for r in results]
+        self.assertEqual(len(models[0]), 6)
+        for round1, round2 in zip(*models):
+            for skeleton1, skeleton2 in zip(round1, round2):
+                for p1, p2 in zip(skeleton1.modelD.parameters(), skeleton2.modelD.parameters()):
+                    self.assertTrue(torch.equal(p1, p2))
+                skeleton1.generate_test(1)
+
+        # The models of the first round are those trained on the tests of the
+        # first step only.
+        first = [p.detach().clone() for p in models[0][0][0].modelD.parameters()]
+        last = list(models[0][-1][0].modelD.parameters())
+        self.assertFalse(all(torch.equal(p1, p2) for p1, p2 in zip(first, last)))
+
+if __name__ == "__main__":
+    unittest.main()
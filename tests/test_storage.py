@@ -0,0 +1,177 @@
+import os, unittest
+
+import dill as pickle
+import numpy as np
+
+from stgem.generator import STGEM, Search
+from stgem.algorithm.ogan.algorithm import OGAN
+from stgem.algorithm.ogan.model import OGAN_Model
+from stgem.algorithm.random.algorithm import Random
+from stgem.algorithm.random.model import Uniform
+from stgem.objective import Minimize
+from stgem.storage import CompressedArray, RunLengthArray, SpillFile, attach_shared, export_shared
+from stgem.sut import SUTInput, SUTOutput
+from stgem.sut.mo3d import MO3D
+from stgem.test_repository import TestRepository
+
+class TestStorage(unittest.TestCase):
+    def test_codecs(self):
+        rng = np.random.RandomState(0)
+
+        # Smooth signals with special values.
+        signals = np.cumsum(rng.uniform(-1, 1, size=(3, 1000)), axis=1)
+        signals[0, 10] = np.nan
+        signals[1, 20] = np.inf
+        signals[2, 30] = -0.0
+        decoded = CompressedArray(signals).decode()
+        self.assertEqual(decoded.dtype, signals.dtype)
+        self.assertEqual(signals.tobytes(), decoded.tobytes())
+
+        # Integer and single precision arrays.
+        for array in [rng.randint(-100, 100, size=500), rng.uniform(size=(2, 50)).astype(np.float32)]:
+            self.assertEqual(array.tobytes(), CompressedArray(array).decode().tobytes())
+
+        # Piecewise constant signals.
+        pieces = rng.uniform(0, 100, size=(2, 6))
+        signals = np.repeat(pieces, 500, axis=1)
+        self.assertTrue(RunLengthArray.is_beneficial(signals))
+        encoded = RunLengthArray(signals)
+        self.assertEqual(len(encoded.values), 12)
+        self.assertTrue((signals == encoded.decode()).all())
+
+        # Signed zeros and NaNs are preserved.
+        signals = np.repeat([[0.0, -0.0, np.nan, 1.0]], 100, axis=1)
+        encoded = RunLengthArray(signals)
+        self.assertEqual(len(encoded.values), 4)
+        self.assertEqual(signals.tobytes(), encoded.decode().tobytes())
+
+    def test_repository(self):
+        timestamps = np.linspace(0, 30, 3001)
+        pieces = np.random.uniform(0, 100, size=(2, 6))
+
+        def populate(repository):
+            for i in range(10):
+                repository.new_record()
+                # Each test gets its own copy of the same timestamps.
+                sut_input = SUTInput(pieces.reshape(-1), np.repeat(pieces, 501, axis=1)[:, :3001], timestamps.copy())
+                outputs = np.vstack([np.sin(timestamps + i), np.cos(timestamps + i)])
+                sut_output = SUTOutput(outputs, timestamps.copy(), None, None)
+                repository.record_input(sut_input)
+                repository.record_output(sut_output)
+                repository.record_objectives([i])
+                repository.finalize_record()
+
+        repository = TestRepository({"compact_inputs": True, "compress_outputs": True})
+        populate(repository)
+        plain = TestRepository({"intern_timestamps": False})
+        populate(plain)
+
+        # The timestamps are interned.
+        X, Z, _ = repository.get()
+        self.assertTrue(all(x.input_timestamps is X[0].input_timestamps for x in X))
+        self.assertTrue(all(z.output_timestamps is X[0].input_timestamps for z in Z))
+
+        data = pickle.dumps(repository)
+        self.assertLess(len(data), len(pickle.dumps(plain)) / 2)
+
+        restored = pickle.loads(data)
+        X2, Z2, Y2 = restored.get()
+        for x1, x2, z1, z2 in zip(X, X2, Z, Z2):
+            self.assertTrue((x1.input_denormalized == x2.input_denormalized).all())
+            self.assertTrue((x1.input_timestamps == x2.input_timestamps).all())
+            self.assertTrue((z1.outputs == z2.outputs).all())
+            self.assertTrue((z1.output_timestamps == z2.output_timestamps).all())
+        self.assertEqual(Y2, [[i] for i in range(10)])
+
+    def test_memory_budget(self):
+        timestamps = np.linspace(0, 10, 1001)
+        signals = [np.vstack([np.sin(timestamps + i), np.cos(timestamps + i)]) for i in range(10)]
+        budget = 3*signals[0].nbytes
+
+        repository = TestRepository({"memory_budget": budget, "spill_cache_size": 2})
+        for i in range(10):
+            repository.new_record()
+            repository.record_input(SUTInput(np.array([i]), None, None))
+            repository.record_output(SUTOutput(signals[i].copy(), timestamps.copy(), None, None))
+            repository.record_objectives([i])
+            repository.finalize_record()
+            resident, _ = repository.memory_usage
+            self.assertLessEqual(resident, budget)
+
+        self.assertEqual(repository.memory_usage, (budget, 7))
+
+        # Spilled signals are reloaded transparently and the timestamps stay
+        # resident as they are interned.
+        _, Z, Y = repository.get()
+        self.assertEqual(Y, [[i] for i in range(10)])
+        for i in range(10):
+            self.assertTrue((Z[i].outputs == signals[i]).all())
+            self.assertTrue(Z[i].output_timestamps is Z[0].output_timestamps)
+        self.assertLessEqual(len(repository._reloaded), 2)
+
+        # Pickling includes the spilled signals.
+        restored = pickle.loads(pickle.dumps(repository))
+        _, Z, _ = restored.get()
+        for i in range(10):
+            self.assertTrue((Z[i].outputs == signals[i]).all())
+        self.assertEqual(restored.memory_usage, (budget, 7))
+
+    def test_spilled_training(self):
+        # Training needs only the inputs and the objectives, so spilled
+        # outputs are never reloaded.
+        loads = []
+        original_load = SpillFile.load
+        def load(spill_file, offset, length):
+            loads.append(offset)
+            return original_load(spill_file, offset, length)
+
+        generator = STGEM(
+            description="mo3d-spilled",
+            sut=MO3D(),
+            objectives=[Minimize(selected=[0, 1, 2], scale=True)],
+            steps=[
+                Search(budget_threshold={"executions": 10},
+                       algorithm=Random(model_factory=(lambda: Uniform()))),
+                Search(budget_threshold={"executions": 15},
+                       algorithm=OGAN(model_factory=(lambda: OGAN_Model()),
+                                      parameters={"duplicate_distance": 0.01}))
+            ],
+            test_repository_parameters={"memory_budget": 0}
+        )
+        SpillFile.load = load
+        try:
+            r = generator.run(seed=1)
+        finally:
+            SpillFile.load = original_load
+
+        self.assertEqual(r.test_repository.memory_usage[1], 15)
+        self.assertEqual(loads, [])
+
+    def test_shared(self):
+        timestamps = np.linspace(0, 30, 3001)
+        repository = TestRepository({"intern_timestamps": True})
+        for i in range(5):
+            repository.new_record()
+            repository.record_input(SUTInput(np.array([i]), None, None))
+            repository.record_output(SUTOutput(np.vstack([np.sin(timestamps + i), np.cos(timestamps + i)]), timestamps.copy(), None, None))
+            repository.record_objectives([i])
+            repository.finalize_record()
+
+        file_name = export_shared(repository)
+        restored = attach_shared(file_name)
+        self.assertFalse(os.path.exists(file_name))
+
+        _, Z, _ = repository.get()
+        _, Z2, Y2 = restored.get()
+        for z1, z2 in zip(Z, Z2):
+            self.assertTrue((z1.outputs == z2.outputs).all())
+            # The signals refer to the mapped file and are writable copies on
+            # write.
+            self.assertFalse(z2.outputs.flags.owndata)
+            self.assertTrue(z2.outputs.flags.writeable)
+        # Shared timestamps remain shared.
+        self.assertTrue(all(z.output_timestamps is Z2[0].output_timestamps for z in Z2))
+        self.assertEqual(Y2, [[i] for i in range(5)])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,135 @@
+import os, tempfile, unittest
+
+import numpy as np
+
+from stgem.generator import Search
+from stgem.algorithm.random.algorithm import Random
+from stgem.algorithm.random.model import Uniform
+from stgem.sut import SUT, SUTInput, SUTOutput
+from stgem.sut.cache import CachedSUT, SUTCache
+from stgem.sut.mo3d import MO3D
+
+from generators import mo3d_generator
+
+class CountingMO3D(MO3D):
+    """MO3D which counts its executions."""
+
+    def __init__(self, parameters=None):
+        super().__init__(parameters)
+        self.executions = 0
+
+    def _execute_test(self, test):
+        self.executions += 1
+        return super()._execute_test(test)
+
+class SignalSUT(SUT):
+    """A SUT which sets the input timestamps of a signal input on execution
+    like the Matlab SUTs do."""
+
+    def __init__(self, parameters=None):
+        super().__init__(parameters)
+        self.idim = 2
+        self.odim = 1
+        self.executions = 0
+
+    def _execute_test(self, test):
+        self.executions += 1
+        test.input_denormalized = 10*test.inputs
+        test.input_timestamps = np.linspace(0, 1, test.inputs.shape[-1])
+        return SUTOutput(test.inputs.sum(axis=0, keepdims=True), test.input_timestamps, None, None)
+
+class TestSUTCache(unittest.TestCase):
+    def get_generator(self, sut, executions=10):
+        return mo3d_generator("mo3d-cache",
+                              [Search(budget_threshold={"executions": executions},
+                                      algorithm=Random(model_factory=(lambda: Uniform())))],
+                              sut=sut)
+
+    def test_cache(self):
+        sut = CountingMO3D()
+        cache = SUTCache()
+        cached_sut = CachedSUT(sut, cache)
+        r1 = self.get_generator(cached_sut).run(seed=1)
+        self.assertEqual(sut.executions, 10)
+        self.assertEqual(cache.statistics["misses"], 10)
+
+        # A repeated run is served from the cache and gives identical results.
+        r2 = self.get_generator(cached_sut).run(seed=1)
+        self.assertEqual(sut.executions, 10)
+        self.assertEqual(cache.statistics["hits"], 10)
+        X1, Z1, Y1 = r1.test_repository.get()
+        X2, Z2, Y2 = r2.test_repository.get()
+        self.assertTrue(np.array_equal([x.input_denormalized for x in X1], [x.input_denormalized for x in X2]))
+        self.assertTrue(np.array_equal([z.outputs for z in Z1], [z.outputs for z in Z2]))
+        self.assertTrue(np.array_equal(Y1, Y2))
+
+        # With half cost hits, the 10 cached tests use half of the budget.
+        cached_sut = CachedSUT(sut, cache, parameters={"hit_cost": 0.5})
+        r3 = self.get_generator(cached_sut).run(seed=1)
+        self.assertEqual(r3.test_repository.tests, 15)
+        self.assertEqual(sut.executions, 15)
+
+        # Attributes are those of the wrapped SUT.
+        self.assertEqual(cached_sut.idim, 3)
+        self.assertEqual(cached_sut.input_type, "vector")
+
+        with self.assertRaises(Exception):
+            CachedSUT(sut, parameters={"hit_cost": 2})
+
+    def test_quantization(self):
+        sut = CachedSUT(CountingMO3D(), parameters={"quantum": 1e-6})
+        sut.setup()
+        x = np.array([0.1, 0.2, 0.3])
+        sut.execute_test(SUTInput(x, None, None))
+        sut.execute_test(SUTInput(x + 1e-9, None, None))
+        sut.execute_test(SUTInput(x + 1e-3, None, None))
+        self.assertEqual(sut.sut.executions, 2)
+
+        # Different SUT parameters give different keys.
+        other = CachedSUT(MO3D(parameters={"input_range": [[-10, 10], [-10, 10], [-10, 10]]}))
+        self.assertNotEqual(sut.key(SUTInput(x, None, None)), other.key(SUTInput(x, None, None)))
+
+    def test_signal_input(self):
+        sut = CachedSUT(SignalSUT())
+        sut.setup()
+        signals = np.array([[0.1, 0.2, 0.3], [0.4, 0.5, 0.6]])
+        first = SUTInput(signals, None, None)
+        sut.execute_test(first)
+
+        # A hit restores the timestamps set by the execution.
+        test = SUTInput(signals.copy(), None, None)
+        output = sut.execute_test(test)
+        self.assertEqual(sut.sut.executions, 1)
+        self.assertTrue(np.array_equal(test.input_timestamps, first.input_timestamps))
+        self.assertTrue(np.array_equal(test.input_denormalized, first.input_denormalized))
+        self.assertTrue(np.allclose(output.outputs, [[0.5, 0.7, 0.9]]))
+
+        # An executed input hits the entry of a fresh input.
+        self.assertEqual(sut.key(first), sut.key(SUTInput(signals, None, None)))
+        sut.execute_test(first)
+        self.assertEqual(sut.sut.executions, 1)
+
+    def test_eviction(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = SUTCache({"memory_size": 2, "directory": directory, "disk_size": 3})
+            for i in range(5):
+                cache.put(str(i), i)
+            self.assertEqual(len(cache), 2)
+            self.assertEqual(len(os.listdir(directory)), 3)
+
+            # Memory hit, disk hit, and a miss.
+            self.assertEqual(cache.get("4"), 4)
+            self.assertEqual(cache.get("2"), 2)
+            self.assertIsNone(cache.get("0"))
+            statistics = cache.statistics
+            self.assertEqual((statistics["hits"], statistics["disk_hits"], statistics["misses"]), (2, 1, 1))
+
+            # The disk tier is shared by a new cache.
+            self.assertEqual(SUTCache({"directory": directory}).get("3"), 3)
+
+            cache.clear(disk=True)
+            self.assertEqual(len(cache), 0)
+            self.assertEqual(len(os.listdir(directory)), 0)
+
+if __name__ == "__main__":
+    unittest.main()
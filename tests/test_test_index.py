@@ -0,0 +1,79 @@
+import unittest
+
+import numpy as np
+
+from stgem.algorithm.test_index import TestIndex
+from stgem.generator import Search
+from stgem.algorithm.ogan.algorithm import OGAN
+from stgem.algorithm.ogan.model import OGAN_Model
+from stgem.sut import SUTInput, SUTOutput
+from stgem.test_repository import TestRepository
+
+from generators import mo3d_generator
+
+class TestTestIndex(unittest.TestCase):
+    def test_distances(self):
+        rng = np.random.default_rng(1)
+        index = TestIndex(buffer_size=4)
+        points = rng.uniform(-1, 1, size=(101, 3))
+        queries = rng.uniform(-1, 1, size=(20, 3))
+        self.assertTrue(np.all(np.isinf(index.distances(queries))))
+
+        for n, point in enumerate(points):
+            index.add(point)
+            if n % 10 == 0:
+                correct = np.linalg.norm(queries[:, np.newaxis, :] - points[np.newaxis, :n + 1, :], axis=2).min(axis=1)
+                self.assertTrue(np.allclose(index.distances(queries), correct))
+
+        # The trees have sizes 4*2^k for distinct k.
+        self.assertEqual(len(index), 101)
+        self.assertEqual(len(index.buffer), 1)
+        sizes = [len(level[0]) for level in index.levels if level is not None]
+        self.assertEqual(sorted(sizes), [4, 32, 64])
+
+    def test_duplicate_suppression(self):
+        def get_generator(parameters):
+            return mo3d_generator("mo3d-duplicates",
+                                  [Search(budget_threshold={"executions": 15},
+                                          algorithm=OGAN(model_factory=(lambda: OGAN_Model()), parameters=parameters))],
+                                  warm_up=10)
+
+        for policy in ["reject", "penalize"]:
+            r = get_generator({"duplicate_distance": 0.3, "duplicate_policy": policy}).run(seed=1)
+            X, _, _ = r.test_repository.get()
+            X = np.asarray([x.inputs for x in X])
+            N_duplicate = [r.test_repository.performance(i).obtain("N_duplicate_tests_generated") for i in range(10, 15)]
+            self.assertGreater(sum(N_duplicate), 0)
+            if policy == "reject":
+                for i in range(10, 15):
+                    self.assertTrue(np.linalg.norm(X[:i] - X[i], axis=1).min() >= 0.3)
+
+    def test_filter_duplicates(self):
+        test_repository = TestRepository()
+        test_repository.new_record()
+        test_repository.record_input(SUTInput(np.zeros(3), None, None))
+        test_repository.record_output(SUTOutput(np.zeros(3), None, None, None))
+        test_repository.record_objectives([0.5])
+        test_repository.finalize_record()
+
+        candidates = np.array([[0.01, 0, 0], [0.9, 0, 0]])
+        for policy, N_remaining in [("reject", 1), ("penalize", 2)]:
+            algorithm = OGAN(model_factory=(lambda: OGAN_Model()), parameters={"duplicate_distance": 0.1, "duplicate_policy": policy})
+            algorithm.test_index = TestIndex()
+            tests, penalty, N_duplicate = algorithm.filter_duplicates(candidates, test_repository)
+            self.assertEqual(tests.shape[0], N_remaining)
+            self.assertEqual(N_duplicate, 1)
+
+        # With equal predictions, the penalized near duplicate ranks below
+        # the distant candidate.
+        self.assertTrue(np.allclose(penalty, [0.9, 0]))
+        predicted = np.minimum(1.0, np.full((2, 1), 0.5) + penalty.reshape(-1, 1))
+        self.assertEqual(np.argmin(predicted[:, 0]), 1)
+
+        algorithm = OGAN(model_factory=(lambda: OGAN_Model()), parameters={"duplicate_distance": 0.1, "duplicate_policy": "unknown"})
+        algorithm.test_index = TestIndex()
+        with self.assertRaises(Exception):
+            algorithm.filter_duplicates(candidates, test_repository)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+
+from stgem.generator import STGEM, Search, TrainingCadence
+from stgem.algorithm.ogan.algorithm import OGAN
+from stgem.algorithm.ogan.model import OGAN_Model
+from stgem.algorithm.random.algorithm import Random
+from stgem.algorithm.random.model import Uniform
+from stgem.objective import Minimize
+from stgem.sut.mo3d import MO3D
+
+class TestTrainingCadence(unittest.TestCase):
+    def test_cadence(self):
+        # Training takes 1s with full effort and an execution takes 0.1s, so
+        # with ratio 1 training can happen after every tenth test only.
+        cadence = TrainingCadence({"ratio": 1.0, "max_interval": 5, "min_effort": 0.25})
+        trainings = []
+        for i in range(60):
+            if cadence.should_train():
+                trainings.append(i)
+                cadence.trained(i, 1.0*cadence.effort)
+            cadence.executed(0.1)
+
+        # The interval forces training and the effort is reduced.
+        self.assertEqual(trainings[:2], [0, 5])
+        self.assertEqual([entry["effort"] for entry in cadence.schedule[:4]], [1.0, 1.0, 0.5, 0.25])
+        self.assertLessEqual(cadence.training_time, 2.0*cadence.execution_time)
+
+        # Cheap training happens after every test with full effort.
+        cadence = TrainingCadence({"ratio": 1.0, "max_interval": 5, "min_effort": 0.25})
+        cadence.effort = 0.25
+        for i in range(10):
+            self.assertTrue(cadence.should_train())
+            cadence.trained(i, 0.01*cadence.effort)
+            cadence.executed(0.1)
+        self.assertEqual(cadence.effort, 1.0)
+
+        with self.assertRaises(ValueError):
+            TrainingCadence({"ratio": 0})
+
+    def test_search(self):
+        generator = STGEM(
+            description="mo3d-training-cadence",
+            sut=MO3D(),
+            objectives=[Minimize(selected=[0], scale=True),
+                        Minimize(selected=[1], scale=True),
+                        Minimize(selected=[2], scale=True)],
+            steps=[
+                Search(budget_threshold={"executions": 10},
+                       algorithm=Random(model_factory=(lambda: Uniform()))),
+                Search(budget_threshold={"executions": 25},
+                       training_ratio=TrainingCadence({"ratio": 0.01, "max_interval": 5}),
+                       algorithm=OGAN(model_factory=(lambda: OGAN_Model())))
+            ]
+        )
+
+        r = generator.run(seed=1)
+        self.assertEqual(r.test_repository.tests, 25)
+        parameters = r.step_results[1].parameters
+        schedule = parameters["training_schedule"]
+        self.assertEqual(parameters["training_cadence"]["ratio"], 0.01)
+
+        # MO3D is much faster than training, so the models are trained every
+        # fifth test with halved effort after each forced training.
+        self.assertEqual([entry["tests"] for entry in schedule], [10, 15, 20])
+        self.assertEqual([entry["effort"] for entry in schedule], [1.0, 1.0, 0.5])
+
+        with self.assertRaises(Exception):
+            Search(budget_threshold={"executions": 25}, pipeline=True, training_ratio=1.0, algorithm=Random(model_factory=(lambda: Uniform())))
+
+if __name__ == "__main__":
+    unittest.main()